@@ -40,13 +40,23 @@ MIDDLEWARE = [
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Serves static files via Gunicorn
     'corsheaders.middleware.CorsMiddleware',  # CORS middleware
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'orders.routers.ReplicaPinMiddleware',  # Read-your-writes for replica reads
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'orders.profiling.ProfilingMiddleware',  # Admin-requested and sampled view profiles
 ]
 
+# Development only: print each request's duplicate, repeated (N+1) and slow queries
+# with the code that ran them (see orders.querylog)
+QUERY_LOG = DEBUG and os.getenv('QUERY_LOG', 'False') == 'True'
+QUERY_LOG_SLOW_MS = float(os.getenv('QUERY_LOG_SLOW_MS', '100'))
+QUERY_LOG_REPEAT_THRESHOLD = int(os.getenv('QUERY_LOG_REPEAT_THRESHOLD', '5'))
+if QUERY_LOG:
+    MIDDLEWARE.insert(0, 'orders.querylog.QueryLogMiddleware')
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:8000",
@@ -61,8 +71,15 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compile each template once per process (templates are re-read on
+            # change by the autoreloader during development)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -75,18 +92,70 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'anand_ice_cream.wsgi.application'
 
-# Database - PostgreSQL
+# Caches (per process); order_fragments holds the rendered order cards of the admin pages
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'default',
+    },
+    'order_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'order-fragments',
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('ORDER_FRAGMENT_CACHE_ENTRIES', '20000')),
+        },
+    },
+}
+ORDER_FRAGMENT_CACHE_SECONDS = int(os.getenv('ORDER_FRAGMENT_CACHE_SECONDS', str(24 * 60 * 60)))
+
+# Database - PostgreSQL (orders.backends.postgresql adds connection metrics and pooling)
+# Connections are kept open for DB_CONN_MAX_AGE seconds per worker thread and
+# checked before reuse, or with DB_POOL_MAX_SIZE set, shared by the threads of
+# each worker process and returned to the pool after every request.
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '0'))
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'orders.backends.postgresql',
         'NAME': os.getenv('DB_NAME', 'anand_ice_cream'),
         'USER': os.getenv('DB_USER', 'postgres'),
         'PASSWORD': os.getenv('DB_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', 'localhost'),
         'PORT': os.getenv('DB_PORT', '5432'),
+        'CONN_MAX_AGE': 0 if DB_POOL_MAX_SIZE else int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
+        'POOL': {
+            'MAX_SIZE': DB_POOL_MAX_SIZE,
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+        },
     }
 }
 
+# Read replicas of the default database, comma separated host[:port][/name]
+# (e.g. "replica1,replica2:5433"); name defaults to DB_NAME. Read-only views
+# (see orders.routers) read from them, everything else uses the primary.
+DATABASE_REPLICAS = []
+for number, replica in enumerate(filter(None, os.getenv('DB_REPLICAS', '').split(',')), start=1):
+    address, _, name = replica.strip().partition('/')
+    host, _, port = address.partition(':')
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'NAME': name or DATABASES['default']['NAME'],
+        'OPTIONS': {'connect_timeout': int(os.getenv('DB_REPLICA_CONNECT_TIMEOUT', '2'))},
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['orders.routers.ReplicaRouter']
+# A replica further behind the primary than this is skipped
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', '5'))
+# How often each worker re-checks a replica's availability and lag
+REPLICA_CHECK_SECONDS = float(os.getenv('REPLICA_CHECK_SECONDS', '10'))
+# After a write, a browser reads from the primary for this long (read-your-writes)
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '15'))
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -117,7 +186,9 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 # WhiteNoise: serve compressed & cached static files in production
 STORAGES = {
     "staticfiles": {
-        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
+        # WhiteNoise's CompressedManifestStaticFilesStorage plus responsive image
+        # variants and video renditions (see orders.media)
+        "BACKEND": "orders.storage.MediaVariantsStaticFilesStorage",
     },
     "default": {
         "BACKEND": "django.core.files.storage.FileSystemStorage",
@@ -128,6 +199,9 @@ STORAGES = {
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Files only served through permission-checked views (payment screenshots)
+PRIVATE_MEDIA_ROOT = Path(os.getenv('PRIVATE_MEDIA_ROOT', str(BASE_DIR / 'private_media')))
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -141,13 +215,149 @@ EMAIL_HOST_PASSWORD = os.getenv('EMAIL_PASSWORD', '')
 DEFAULT_FROM_EMAIL = os.getenv('EMAIL_USER', '')
 ADMIN_EMAIL = os.getenv('ADMIN_EMAIL', '')
 
+# Health check: deep probe results are cached for this many seconds per worker
+HEALTH_CHECK_CACHE_SECONDS = int(os.getenv('HEALTH_CHECK_CACHE_SECONDS', '30'))
+HEALTH_CHECK_PROBE_TIMEOUT = float(os.getenv('HEALTH_CHECK_PROBE_TIMEOUT', '3'))
+
+# Order archival: delivered/cancelled orders untouched for this many days move to the archive table
+ORDER_ARCHIVE_AFTER_DAYS = int(os.getenv('ORDER_ARCHIVE_AFTER_DAYS', '90'))
+ORDER_ARCHIVE_BATCH_SIZE = int(os.getenv('ORDER_ARCHIVE_BATCH_SIZE', '500'))
+
+# Order export: rows fetched per server-side cursor round trip
+ORDER_EXPORT_CHUNK_SIZE = int(os.getenv('ORDER_EXPORT_CHUNK_SIZE', '2000'))
+
+# Sales analytics rollups (refresh_analytics): order events folded in per transaction
+ANALYTICS_REFRESH_BATCH_SIZE = int(os.getenv('ANALYTICS_REFRESH_BATCH_SIZE', '2000'))
+
+# In-process snapshots (pincode index, ...) re-check their version at most this often
+CACHE_VERSION_CHECK_SECONDS = int(os.getenv('CACHE_VERSION_CHECK_SECONDS', '10'))
+
+# What create_order does with a pincode outside every delivery zone: 'reject' or 'flag'
+# (no effect until at least one serviceable pincode is configured)
+PINCODE_UNSERVICEABLE_ACTION = os.getenv('PINCODE_UNSERVICEABLE_ACTION', 'reject')
+
+# What create_order does with items or totals that do not match the catalog: 'reject' or 'flag'
+# (no effect until the catalog has at least one flavor)
+CATALOG_PRICE_MISMATCH_ACTION = os.getenv('CATALOG_PRICE_MISMATCH_ACTION', 'reject')
+
+# Browser caching of the storefront menu (/api/catalog/menu.json); revalidation is a cheap ETag check
+CATALOG_MENU_MAX_AGE = int(os.getenv('CATALOG_MENU_MAX_AGE', '60'))
+CATALOG_MENU_STALE_SECONDS = int(os.getenv('CATALOG_MENU_STALE_SECONDS', '86400'))
+
+# Responsive variants written by collectstatic (orders/media.py), by static path prefix
+MEDIA_IMAGE_VARIANTS = {
+    'asset/icimg/': {'widths': [320, 640], 'quality': 80},
+    # QR codes must stay pixel-exact to scan reliably
+    'asset/QR/': {'widths': [], 'lossless': True},
+}
+
+# Lower-bitrate H.264 renditions of storefront videos, largest first; a rendition
+# with min_width is only used on screens at least that wide (requires ffmpeg)
+MEDIA_VIDEO_RENDITIONS = [
+    {'height': 720, 'bitrate': '1500k', 'min_width': 900},
+    {'height': 480, 'bitrate': '700k'},
+]
+MEDIA_FFMPEG_BINARY = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+MEDIA_FFMPEG_TIMEOUT = int(os.getenv('FFMPEG_TIMEOUT', '600'))
+
+# Payment screenshots are validated, stripped of metadata and downscaled at upload
+SCREENSHOT_MAX_BYTES = int(os.getenv('SCREENSHOT_MAX_BYTES', str(10 * 1024 * 1024)))
+# JSON order bodies (older payment pages send the screenshot base64 encoded, 4/3 of
+# its size) above this are refused from Content-Length, before anything is read
+ORDER_JSON_MAX_BYTES = int(os.getenv('ORDER_JSON_MAX_BYTES', str(SCREENSHOT_MAX_BYTES * 4 // 3 + 1024 * 1024)))
+SCREENSHOT_MAX_PIXELS = int(os.getenv('SCREENSHOT_MAX_PIXELS', str(40 * 1000 * 1000)))
+SCREENSHOT_MAX_DIMENSION = int(os.getenv('SCREENSHOT_MAX_DIMENSION', '1600'))
+SCREENSHOT_THUMBNAIL_SIZE = int(os.getenv('SCREENSHOT_THUMBNAIL_SIZE', '320'))
+
+# Reused payment screenshots are flagged when at least SCREENSHOT_MATCH_FRACTION of
+# their distinctive bands differ from an earlier screenshot's in at most
+# SCREENSHOT_MATCH_DISTANCE of 64 bits; bands seen on more than
+# SCREENSHOT_COMMON_BAND_LIMIT screenshots are app layout and do not count
+SCREENSHOT_MATCH_DISTANCE = int(os.getenv('SCREENSHOT_MATCH_DISTANCE', '2'))
+SCREENSHOT_MATCH_FRACTION = float(os.getenv('SCREENSHOT_MATCH_FRACTION', '0.8'))
+SCREENSHOT_COMMON_BAND_LIMIT = int(os.getenv('SCREENSHOT_COMMON_BAND_LIMIT', '50'))
+SCREENSHOT_MATCH_LIMIT = int(os.getenv('SCREENSHOT_MATCH_LIMIT', '5'))
+# Screenshot pks skipped by the index (still uncommitted) are looked for again for this long
+SCREENSHOT_INDEX_GAP_SECONDS = int(os.getenv('SCREENSHOT_INDEX_GAP_SECONDS', '120'))
+
+# New order emails to ADMIN_EMAIL: 'order' sends one per order; 'digest' queues them
+# and sends one summary with a merged screenshot PDF once ADMIN_DIGEST_MAX_ORDERS are
+# waiting or the oldest has waited ADMIN_DIGEST_INTERVAL_MINUTES (needs run_jobs)
+ADMIN_NOTIFICATION_MODE = os.getenv('ADMIN_NOTIFICATION_MODE', 'order')
+ADMIN_DIGEST_INTERVAL_MINUTES = int(os.getenv('ADMIN_DIGEST_INTERVAL_MINUTES', '15'))
+ADMIN_DIGEST_MAX_ORDERS = int(os.getenv('ADMIN_DIGEST_MAX_ORDERS', '20'))
+
+# Admission control for create_order, shared by all workers through the database:
+# each client IP may place ORDER_RATE_IP_BURST orders at once and then one more every
+# ORDER_RATE_IP_SECONDS (likewise per phone number and per email with the CUSTOMER
+# settings), and at most ORDER_MAX_IN_FLIGHT orders are processed at once. 0 disables a limit.
+ORDER_RATE_IP_BURST = int(os.getenv('ORDER_RATE_IP_BURST', '20'))
+ORDER_RATE_IP_SECONDS = float(os.getenv('ORDER_RATE_IP_SECONDS', '3'))
+ORDER_RATE_CUSTOMER_BURST = int(os.getenv('ORDER_RATE_CUSTOMER_BURST', '5'))
+ORDER_RATE_CUSTOMER_SECONDS = float(os.getenv('ORDER_RATE_CUSTOMER_SECONDS', '360'))
+ORDER_MAX_IN_FLIGHT = int(os.getenv('ORDER_MAX_IN_FLIGHT', '8'))
+# A slot held longer than this (e.g. by a killed worker) is freed; keep it above gunicorn --timeout
+ORDER_IN_FLIGHT_LEASE_SECONDS = int(os.getenv('ORDER_IN_FLIGHT_LEASE_SECONDS', '150'))
+ORDER_BUSY_RETRY_AFTER = int(os.getenv('ORDER_BUSY_RETRY_AFTER', '5'))
+
+# Order event change feed (/api/orders/events/): most events per response, and an
+# optional bearer token letting downstream systems read it without an admin session
+ORDER_EVENT_FEED_LIMIT = int(os.getenv('ORDER_EVENT_FEED_LIMIT', '500'))
+ORDER_FEED_TOKEN = os.getenv('ORDER_FEED_TOKEN', '')
+
+# Most orders per page of the customer history (/api/customers/history/)
+CUSTOMER_HISTORY_PAGE_SIZE = int(os.getenv('CUSTOMER_HISTORY_PAGE_SIZE', '50'))
+
+# Request profiling (see orders.profiling): admins add ?profile=1 (or =memory) or an
+# X-Profile header; PROFILE_SAMPLE_RATE profiles that fraction of all requests too.
+# The newest PROFILE_KEEP profiles are kept on the private media volume
+PROFILE_DIR = Path(os.getenv('PROFILE_DIR', str(PRIVATE_MEDIA_ROOT / 'profiles')))
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_SAMPLE_MEMORY = os.getenv('PROFILE_SAMPLE_MEMORY', 'False') == 'True'
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', '200'))
+PROFILE_TOP_FUNCTIONS = int(os.getenv('PROFILE_TOP_FUNCTIONS', '25'))
+
+# Invoice PDFs are regenerated on download when missing, so the prune_invoices job
+# gzips them after INVOICE_COMPRESS_AFTER_DAYS and deletes them after
+# INVOICE_RETENTION_DAYS (0 disables either)
+INVOICE_COMPRESS_AFTER_DAYS = int(os.getenv('INVOICE_COMPRESS_AFTER_DAYS', '30'))
+INVOICE_RETENTION_DAYS = int(os.getenv('INVOICE_RETENTION_DAYS', '365'))
+
+# Periodic jobs run by `python manage.py run_jobs` (the "jobs" docker-compose service)
+SCHEDULED_JOBS = {
+    'archive_orders': {
+        'command': 'archive_orders',
+        'interval': int(os.getenv('ORDER_ARCHIVE_INTERVAL_SECONDS', str(24 * 60 * 60))),
+    },
+    'refresh_analytics': {
+        'command': 'refresh_analytics',
+        'interval': int(os.getenv('ANALYTICS_REFRESH_INTERVAL_SECONDS', '300')),
+    },
+    'send_admin_digest': {
+        'command': 'send_admin_digest',
+        'interval': int(os.getenv('ADMIN_DIGEST_CHECK_INTERVAL_SECONDS', '60')),
+    },
+    'prune_rate_limits': {
+        'command': 'prune_rate_limits',
+        'interval': int(os.getenv('RATE_LIMIT_PRUNE_INTERVAL_SECONDS', str(60 * 60))),
+    },
+    'prune_invoices': {
+        'command': 'prune_invoices',
+        'interval': int(os.getenv('INVOICE_PRUNE_INTERVAL_SECONDS', str(24 * 60 * 60))),
+    },
+}
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        # orjson-backed JSONRenderer, the stock one when orjson is not installed
+        'orders.renderers.FastJSONRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
         'rest_framework.parsers.JSONParser',
     ],
+    # Reverse proxies in front of the app; client IPs are read from X-Forwarded-For
+    # accordingly (0 trusts no proxy and uses REMOTE_ADDR)
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '0')),
 }
 
@@ -23,6 +23,7 @@ urlpatterns = [
     path('admin-logout/', order_views.admin_logout_view, name='admin_logout'),
     path('pending-orders.html', order_views.pending_orders_view, name='pending_orders'),  # Pending orders management
     path('confirmed-orders.html', order_views.confirmed_orders_view, name='confirmed_orders'),  # Confirmed orders management
+    path('admin-profiles.html', order_views.admin_profiles_view, name='admin_profiles'),  # Request profiles
 ]
 
 # Serve static and media files in development
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'anand_ice_cream.settings')
 
 application = get_wsgi_application()
+
+# Load in-process lookup tables (pincode index, ...) when the worker starts
+from orders.snapshots import warm_snapshots  # noqa: E402
+
+warm_snapshots()
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Order
+from .models import Order, ArchivedOrder, OrderItem, OrderEvent, CustomerSummary, DeliveryZone, ServiceablePincode, Product, Flavor, PaymentScreenshot
+from .events import get_admin_actor, record_created, record_status_change
+from .customers import refresh_customer_summaries
 
 
 @admin.register(Order)
@@ -32,3 +34,128 @@ class OrderAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Keep the normalized line items in step with an edited items JSON
+        if not change or 'items' in form.changed_data:
+            OrderItem.sync_order(obj)
+        # Includes the previous customer when the phone or email was edited
+        refresh_customer_summaries([obj, {'phone': form.initial.get('phone'), 'email': form.initial.get('email')}])
+        # The admin saves inside a transaction, so the event commits with the change
+        if not change:
+            record_created([obj], actor=get_admin_actor(request))
+        elif 'status' in form.changed_data or 'payment_status' in form.changed_data:
+            record_status_change(obj, form.initial['status'], form.initial['payment_status'], get_admin_actor(request))
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    """Read-only admin interface for archived orders"""
+    
+    list_display = [
+        'order_id', 'full_name', 'email', 'phone',
+        'total_amount', 'status', 'created_at', 'archived_at'
+    ]
+    list_filter = ['status', 'created_at']
+    search_fields = ['order_id', 'full_name', 'email', 'phone']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class ServiceablePincodeInline(admin.TabularInline):
+    model = ServiceablePincode
+    extra = 1
+
+
+@admin.register(DeliveryZone)
+class DeliveryZoneAdmin(admin.ModelAdmin):
+    """Admin interface for delivery zones and their pincodes"""
+    
+    list_display = ['name', 'sort_order', 'is_active']
+    list_editable = ['sort_order', 'is_active']
+    inlines = [ServiceablePincodeInline]
+
+
+@admin.register(ServiceablePincode)
+class ServiceablePincodeAdmin(admin.ModelAdmin):
+    """Admin interface for serviceable pincodes"""
+    
+    list_display = ['pincode', 'zone', 'is_active']
+    list_filter = ['zone', 'is_active']
+    search_fields = ['pincode']
+
+
+class FlavorInline(admin.TabularInline):
+    model = Flavor
+    extra = 1
+
+
+@admin.register(Product)
+class ProductAdmin(admin.ModelAdmin):
+    """Admin interface for menu products and their flavor prices"""
+    
+    list_display = ['name', 'sort_order', 'is_available']
+    list_editable = ['sort_order', 'is_available']
+    inlines = [FlavorInline]
+
+
+@admin.register(Flavor)
+class FlavorAdmin(admin.ModelAdmin):
+    """Admin interface for flavors and prices"""
+    
+    list_display = ['name', 'product', 'price', 'is_available']
+    list_editable = ['price', 'is_available']
+    list_filter = ['product', 'is_available']
+    search_fields = ['name', 'product__name']
+
+
+@admin.register(PaymentScreenshot)
+class PaymentScreenshotAdmin(admin.ModelAdmin):
+    """Read-only admin interface for processed payment screenshots"""
+    
+    list_display = ['order', 'width', 'height', 'original_size', 'similar_orders', 'created_at']
+    search_fields = ['order__order_id', 'original_sha256']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(OrderEvent)
+class OrderEventAdmin(admin.ModelAdmin):
+    """Read-only admin interface for the append-only order event log"""
+    
+    list_display = ['seq', 'order_id', 'kind', 'actor', 'old_status', 'new_status', 'new_payment_status', 'created_at']
+    list_filter = ['kind', 'new_status']
+    search_fields = ['order_id', 'actor']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(CustomerSummary)
+class CustomerSummaryAdmin(admin.ModelAdmin):
+    """Read-only admin interface for the cached per-customer order totals"""
+    
+    list_display = ['kind', 'value', 'order_count', 'lifetime_value', 'last_order_id', 'last_order_at', 'updated_at']
+    list_filter = ['kind']
+    search_fields = ['value', 'last_order_id']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,314 @@
+"""
+Sales analytics served from incrementally maintained rollup tables
+
+Rollups count orders that reached a confirmed state (COUNTED_STATUSES), in
+the bucket of the time they were placed. refresh_rollups() follows the order
+event log (orders.events) from its watermark: an order is added when it is
+created in, or moves into, a counted status, and subtracted when it moves out
+again (e.g. a confirmed order that is cancelled). Analytics queries only ever
+read a handful of pre-aggregated rows.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+from .export import start_of_day
+from .models import (
+    Order, ArchivedOrder, OrderItem, OrderEvent,
+    SalesRollup, ProductSalesRollup, PincodeSalesRollup, RollupWatermark,
+)
+
+
+WATERMARK_NAME = 'sales'
+
+# Orders in these states are sales; pending orders are not yet verified and
+# cancelled (including rejected) ones never were
+COUNTED_STATUSES = {'confirmed', 'processing', 'delivered'}
+
+
+def get_buckets(created_at):
+    """Start of the hour, day and week (Monday) containing created_at, in local time"""
+    local = timezone.localtime(created_at)
+    hour = local.replace(minute=0, second=0, microsecond=0)
+    day = hour.replace(hour=0)
+    week = day - timedelta(days=day.weekday())
+    return {'hour': hour, 'day': day, 'week': week}
+
+
+def merge_totals(model, totals, key_fields, value_fields, lookup):
+    """
+    Add totals onto existing rollup rows, creating missing ones
+
+    Args:
+        model: Rollup model
+        totals: Dictionary mapping key tuples to lists of values to add
+        key_fields: Field names making up the key tuples
+        value_fields: Field names of the values
+        lookup: Filter selecting (a superset of) the rows that may already exist
+    """
+    if not totals:
+        return
+    rows = {
+        tuple(getattr(row, field) for field in key_fields): row
+        for row in model.objects.select_for_update().filter(**lookup)
+    }
+    created, changed = [], []
+    for key, values in totals.items():
+        row = rows.get(key)
+        if row is None:
+            created.append(model(**dict(zip(key_fields, key)), **dict(zip(value_fields, values))))
+        else:
+            for field, value in zip(value_fields, values):
+                setattr(row, field, getattr(row, field) + value)
+            changed.append(row)
+    model.objects.bulk_create(created)
+    model.objects.bulk_update(changed, value_fields)
+
+
+def add_orders(orders):
+    """
+    Add orders to (or with sign -1, subtract them from) the rollup tables
+
+    Args:
+        orders: List of (pk, created_at, total_amount, pincode, sign)
+    """
+    if not orders:
+        return
+    order_buckets = {pk: (get_buckets(created_at), sign) for pk, created_at, _, _, sign in orders}
+    line_items = OrderItem.objects.filter(order_id__in=order_buckets).values_list(
+        'order_id', 'product', 'flavor', 'quantity', 'price'
+    )
+
+    sales = defaultdict(lambda: [0, 0, Decimal('0')])
+    products = defaultdict(lambda: [0, Decimal('0')])
+    pincodes = defaultdict(lambda: [0, Decimal('0')])
+
+    for pk, _, total_amount, pincode, sign in orders:
+        buckets = order_buckets[pk][0]
+        for period, bucket in buckets.items():
+            sales[(period, bucket)][0] += sign
+            sales[(period, bucket)][2] += sign * total_amount
+        day = buckets['day'].date()
+        pincodes[(day, pincode)][0] += sign
+        pincodes[(day, pincode)][1] += sign * total_amount
+
+    for order_pk, product, flavor, quantity, price in line_items:
+        buckets, sign = order_buckets[order_pk]
+        for period, bucket in buckets.items():
+            sales[(period, bucket)][1] += sign * quantity
+        day = buckets['day'].date()
+        products[(day, product, flavor)][0] += sign * quantity
+        products[(day, product, flavor)][1] += sign * quantity * price
+
+    merge_totals(
+        SalesRollup, sales, ['period', 'bucket_start'], ['order_count', 'item_count', 'revenue'],
+        {'bucket_start__in': {bucket for _, bucket in sales}}
+    )
+    merge_totals(
+        ProductSalesRollup, products, ['day', 'product', 'flavor'], ['quantity', 'revenue'],
+        {'day__in': {day for day, _, _ in products}}
+    )
+    merge_totals(
+        PincodeSalesRollup, pincodes, ['day', 'pincode'], ['order_count', 'revenue'],
+        {'day__in': {day for day, _ in pincodes}}
+    )
+
+
+def get_sign(kind, old_status, new_status):
+    """+1 when an event puts an order into the rollups, -1 when it takes it out, else 0"""
+    counted = new_status in COUNTED_STATUSES
+    if kind == 'created':
+        return int(counted)
+    if kind == 'status_changed':
+        return int(counted) - int(old_status in COUNTED_STATUSES)
+    return 0
+
+
+def apply_events(events):
+    """
+    Fold a batch of order events into the rollup tables
+
+    Args:
+        events: List of (order_id, kind, old_status, new_status), oldest first
+
+    Returns:
+        Number of orders added or subtracted
+    """
+    signs = defaultdict(int)
+    for order_id, kind, old_status, new_status in events:
+        signs[order_id] += get_sign(kind, old_status, new_status)
+    signs = {order_id: sign for order_id, sign in signs.items() if sign}
+
+    orders = []
+    for model in [Order, ArchivedOrder]:
+        rows = model.objects.filter(order_id__in=signs).values_list(
+            'order_id', 'pk', 'created_at', 'total_amount', 'pincode'
+        )
+        orders += [(pk, created_at, total_amount, pincode, signs[order_id]) for order_id, pk, created_at, total_amount, pincode in rows]
+    add_orders(orders)
+    return len(orders)
+
+
+@contextmanager
+def consistent_snapshot():
+    """
+    Transaction in which every query sees the database as of its first one
+
+    PostgreSQL runs it at REPEATABLE READ (unless it is nested in another
+    transaction); SQLite transactions are serializable anyway.
+    """
+    outermost = not connection.in_atomic_block
+    with transaction.atomic():
+        if outermost and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        yield
+
+
+def rebuild_rollups(batch_size):
+    """
+    Recompute all rollups from the current state of live and archived orders
+
+    The orders and the last event are read from one snapshot, so the events
+    after the new watermark are exactly the changes the rebuild did not see.
+
+    Returns:
+        Number of orders added
+    """
+    processed = 0
+    with consistent_snapshot():
+        watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(name=WATERMARK_NAME)
+        SalesRollup.objects.all().delete()
+        ProductSalesRollup.objects.all().delete()
+        PincodeSalesRollup.objects.all().delete()
+        last_seq = OrderEvent.objects.aggregate(last=Max('seq'))['last'] or 0
+
+        for model in [Order, ArchivedOrder]:
+            rows = model.objects.filter(status__in=COUNTED_STATUSES).order_by('pk').values_list(
+                'pk', 'created_at', 'total_amount', 'pincode'
+            )
+            last_pk = 0
+            while True:
+                orders = [(*row, 1) for row in rows.filter(pk__gt=last_pk)[:batch_size]]
+                if not orders:
+                    break
+                last_pk = orders[-1][0]
+                add_orders(orders)
+                processed += len(orders)
+
+        watermark.processed_seq = last_seq
+        watermark.save()
+    return processed
+
+
+def refresh_rollups(rebuild=False):
+    """
+    Bring the rollup tables up to date
+
+    Events after the watermark are processed ANALYTICS_REFRESH_BATCH_SIZE at a
+    time, each batch in its own transaction together with the watermark, so an
+    interrupted run resumes where it stopped. Events become visible in
+    sequence order, so none is ever skipped. Without a watermark (first run,
+    or after a migration that changed how rollups are computed) the rollups
+    are rebuilt first.
+
+    Args:
+        rebuild: Drop all rollups and recompute them from live and archived orders
+
+    Returns:
+        Number of orders added to or subtracted from the rollups
+    """
+    batch_size = settings.ANALYTICS_REFRESH_BATCH_SIZE
+    watermark = RollupWatermark.objects.filter(name=WATERMARK_NAME).first()
+    processed = 0
+    if rebuild or watermark is None or watermark.processed_seq is None:
+        processed += rebuild_rollups(batch_size)
+
+    while True:
+        with transaction.atomic():
+            # Locking the watermark serializes concurrent refreshes
+            watermark = RollupWatermark.objects.select_for_update().get(name=WATERMARK_NAME)
+            events = list(
+                OrderEvent.objects
+                .filter(seq__gt=watermark.processed_seq)
+                .order_by('seq')
+                .values_list('seq', 'order_id', 'kind', 'old_status', 'new_status')[:batch_size]
+            )
+            if not events:
+                break
+            processed += apply_events([event[1:] for event in events])
+            watermark.processed_seq = events[-1][0]
+            watermark.save()
+
+    return processed
+
+
+def get_sales_timeseries(period, start, end):
+    """Order count, item count, revenue and average basket per bucket between two dates"""
+    rows = SalesRollup.objects.filter(
+        period=period,
+        bucket_start__gte=start_of_day(start),
+        bucket_start__lt=start_of_day(end + timedelta(days=1))
+    ).order_by('bucket_start')
+    return [
+        {
+            'bucket': row.bucket_start,
+            'orders': row.order_count,
+            'items': row.item_count,
+            'revenue': float(row.revenue),
+            'averageBasket': float(row.revenue / row.order_count) if row.order_count else 0,
+        }
+        for row in rows
+    ]
+
+
+def get_top_products(start, end, field='product', limit=10):
+    """Best sellers by revenue between two dates, grouped by product or flavor"""
+    rows = (
+        ProductSalesRollup.objects
+        .filter(day__gte=start, day__lte=end)
+        .values(field)
+        .annotate(total_quantity=Sum('quantity'), total_revenue=Sum('revenue'))
+        .order_by('-total_revenue')[:limit]
+    )
+    return [
+        {'name': row[field], 'quantity': row['total_quantity'], 'revenue': float(row['total_revenue'])}
+        for row in rows
+    ]
+
+
+def get_revenue_by_pincode(start, end, limit=20):
+    """Order count and revenue per pincode between two dates"""
+    rows = (
+        PincodeSalesRollup.objects
+        .filter(day__gte=start, day__lte=end)
+        .values('pincode')
+        .annotate(total_orders=Sum('order_count'), total_revenue=Sum('revenue'))
+        .order_by('-total_revenue')[:limit]
+    )
+    return [
+        {'pincode': row['pincode'], 'orders': row['total_orders'], 'revenue': float(row['total_revenue'])}
+        for row in rows
+    ]
+
+
+def get_summary(start, end):
+    """Totals and average basket size between two dates"""
+    totals = SalesRollup.objects.filter(
+        period='day',
+        bucket_start__gte=start_of_day(start),
+        bucket_start__lt=start_of_day(end + timedelta(days=1))
+    ).aggregate(orders=Sum('order_count'), items=Sum('item_count'), revenue=Sum('revenue'))
+    orders = totals['orders'] or 0
+    revenue = totals['revenue'] or Decimal('0')
+    items = totals['items'] or 0
+    return {
+        'orders': orders,
+        'revenue': float(revenue),
+        'averageBasketValue': float(revenue / orders) if orders else 0,
+        'averageBasketItems': round(items / orders, 2) if orders else 0,
+    }
@@ -0,0 +1,119 @@
+"""
+Archival of completed orders out of the hot orders table
+"""
+from datetime import timedelta
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import Order, ArchivedOrder
+from .events import record_archived
+
+
+def get_table_stats(model):
+    """
+    Report row count and on-disk size of a model's table
+
+    Returns:
+        Dictionary with 'rows' and 'bytes' (bytes is None when the database
+        cannot report relation sizes, i.e. anything but PostgreSQL)
+    """
+    size = None
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_total_relation_size(%s)", [model._meta.db_table])
+            size = cursor.fetchone()[0]
+    return {'rows': model.objects.count(), 'bytes': size}
+
+
+def archivable_orders(older_than_days):
+    """Orders in a terminal state that have not changed for older_than_days"""
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    return Order.objects.filter(
+        status__in=Order.TERMINAL_STATUSES,
+        updated_at__lt=cutoff
+    )
+
+
+def archive_batch(order_ids, older_than_days):
+    """
+    Move one batch of orders into the archive table in a single transaction
+
+    Orders that stopped being archivable since their ids were read (e.g. a
+    status change) are left alone. An order that already has an archived copy
+    makes the insert fail, so the batch is rolled back rather than losing
+    either copy.
+
+    Args:
+        order_ids: Primary keys of the orders to move
+        older_than_days: Same as for archivable_orders
+
+    Returns:
+        Number of orders archived
+    """
+    field_names = [field.attname for field in Order._meta.concrete_fields]
+    with transaction.atomic():
+        # Lock the rows so a concurrent status update cannot slip in between copy and delete
+        rows = list(
+            archivable_orders(older_than_days)
+            .select_for_update()
+            .filter(pk__in=order_ids)
+            .values(*field_names)
+        )
+        if not rows:
+            return 0
+        ArchivedOrder.objects.bulk_create([ArchivedOrder(**row) for row in rows])
+        copied = [row[Order._meta.pk.attname] for row in rows]
+        _, deleted = Order.objects.filter(pk__in=copied).delete()
+        if deleted.get(Order._meta.label, 0) != len(copied):
+            raise RuntimeError(f"Archived {len(copied)} orders but deleted {deleted.get(Order._meta.label, 0)}")
+        record_archived(rows)
+    return len(copied)
+
+
+def archive_orders(older_than_days, batch_size=500):
+    """
+    Move every archivable order into the archive table, batch by batch
+
+    Returns:
+        Number of orders archived
+    """
+    total = 0
+    while True:
+        order_ids = list(
+            archivable_orders(older_than_days)
+            .order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not order_ids:
+            break
+        total += archive_batch(order_ids, older_than_days)
+    return total
+
+
+def find_order(order_id):
+    """
+    Look up an order by order_id in the live table, then in the archive
+
+    Raises:
+        Order.DoesNotExist: if the order is in neither table
+    """
+    try:
+        return Order.objects.get(order_id=order_id)
+    except Order.DoesNotExist:
+        try:
+            return ArchivedOrder.objects.get(order_id=order_id)
+        except ArchivedOrder.DoesNotExist:
+            raise Order.DoesNotExist(f'No order found with ID: {order_id}')
+
+
+def find_order_row(order_id, fields):
+    """
+    Like find_order, but the values() row of the given fields
+
+    Raises:
+        Order.DoesNotExist: if the order is in neither table
+    """
+    for model in (Order, ArchivedOrder):
+        row = model.objects.filter(order_id=order_id).values(*fields).first()
+        if row is not None:
+            return row
+    raise Order.DoesNotExist(f'No order found with ID: {order_id}')
@@ -0,0 +1,63 @@
+"""
+PostgreSQL backend with connection metrics and an optional connection pool
+
+Same as django.db.backends.postgresql, plus:
+- every new connection is counted and its connect time recorded (see
+  orders.dbpool.get_connection_metrics);
+- with POOL = {'MAX_SIZE': n, 'TIMEOUT': seconds} in the database settings,
+  connections come from a per-process pool of n connections and go back to
+  it when Django closes them (use CONN_MAX_AGE = 0 so that happens at the
+  end of every request). With CONN_HEALTH_CHECKS, a pooled connection is
+  checked with SELECT 1 before it is handed out.
+"""
+import time
+from django.db.backends.postgresql import base
+from orders.dbpool import PoolTimeout, get_metrics, get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    @property
+    def pool(self):
+        options = self.settings_dict.get('POOL') or {}
+        if not options.get('MAX_SIZE'):
+            return None
+        return get_pool(self.alias, options['MAX_SIZE'], options.get('TIMEOUT', 10))
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            started = time.perf_counter()
+            connection = super().get_new_connection(conn_params)
+            get_metrics(self.alias).record_acquire(time.perf_counter() - started, opened=1)
+            return connection
+
+        is_usable = pooled_connection_is_usable if self.settings_dict['CONN_HEALTH_CHECKS'] else None
+        try:
+            return pool.acquire(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params), is_usable)
+        except PoolTimeout as e:
+            # Surfaces as django.db.OperationalError
+            raise self.Database.OperationalError(str(e))
+
+    def _close(self):
+        if self.connection is None:
+            return
+        pool = self.pool
+        if pool is None:
+            try:
+                return super()._close()
+            finally:
+                get_metrics(self.alias).record_release(closed=1)
+
+        # The pool rolls back a connection left mid-transaction and restores
+        # autocommit; a connection where that fails is not reused
+        pool.release(self.connection)
+
+
+def pooled_connection_is_usable(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        return True
+    except base.Database.Error:
+        return False
@@ -0,0 +1,148 @@
+"""
+In-memory product catalog used to price and verify orders
+"""
+import gzip
+import hashlib
+import json
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+from .models import Product, Flavor
+from .snapshots import VersionedSnapshot
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is always available
+    brotli = None
+
+
+CatalogPrice = namedtuple('CatalogPrice', ['price', 'is_available'])
+
+# The menu JSON serialized and compressed once per catalog version
+MenuDocument = namedtuple('MenuDocument', ['etag', 'encodings'])
+
+Catalog = namedtuple('Catalog', ['products', 'prices', 'document'])
+
+
+def build_menu_document(products):
+    """
+    Serialize the menu once and precompress it
+
+    Returns:
+        MenuDocument whose 'encodings' maps a Content-Encoding ('identity',
+        'gzip' and, when the brotli package is installed, 'br') to the body
+    """
+    body = json.dumps({'products': products}, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    # Derived from the content, so every worker hands out the same ETag
+    etag = 'W/"%s"' % hashlib.sha256(body).hexdigest()[:32]
+    encodings = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        encodings['br'] = brotli.compress(body)
+    return MenuDocument(etag, encodings)
+
+
+def load_catalog():
+    """
+    Build the catalog from the database
+
+    Returns:
+        Catalog whose 'products' is the API representation of the menu,
+        whose 'prices' maps (product name, flavor name) to a CatalogPrice and
+        whose 'document' is the storefront menu JSON
+    """
+    products = {
+        product_id: {'name': name, 'available': is_available, 'flavors': []}
+        for product_id, name, is_available in Product.objects.values_list('id', 'name', 'is_available')
+    }
+    prices = {}
+    flavors = Flavor.objects.order_by('sort_order', 'name').values_list(
+        'product_id', 'name', 'price', 'is_available'
+    )
+    for product_id, name, price, is_available in flavors:
+        product = products[product_id]
+        available = is_available and product['available']
+        product['flavors'].append({'name': name, 'price': float(price), 'available': available})
+        prices[(product['name'], name)] = CatalogPrice(price, available)
+    products = tuple(products.values())
+    return Catalog(products, prices, build_menu_document(products))
+
+
+catalog = VersionedSnapshot('catalog', load_catalog)
+
+
+def choose_encoding(accept_encoding, encodings):
+    """Best available Content-Encoding for an Accept-Encoding header"""
+    accepted = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ('br', 'gzip'):
+        if encoding in encodings and accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return 'identity'
+
+
+def is_catalog_enabled():
+    """Price checks only apply once the catalog has at least one flavor"""
+    return bool(catalog.get().prices)
+
+
+def to_decimal(value):
+    """Decimal from a JSON number or string, or None if it is not a number"""
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+
+
+def check_order_prices(items, total_amount):
+    """
+    Recompute an order's line totals and total from catalog prices
+
+    Args:
+        items: Order items as sent by the storefront
+        total_amount: Total the customer was shown
+
+    Returns:
+        Tuple of (expected total, list of problem descriptions); no problems
+        means the order matches the catalog
+    """
+    prices = catalog.get().prices
+    expected_total = Decimal('0')
+    problems = []
+
+    for item in items:
+        product = item.get('product') or item.get('name') or ''
+        flavor = item.get('flavor') or ''
+        label = f"{product} ({flavor})"
+
+        entry = prices.get((product, flavor))
+        if entry is None:
+            problems.append(f"{label} is not on the menu")
+            continue
+        if not entry.is_available:
+            problems.append(f"{label} is currently unavailable")
+            continue
+
+        quantity = item.get('quantity', 1)
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+            problems.append(f"{label} has an invalid quantity")
+            continue
+
+        # The storefront sends the line total as 'price' and the unit price as 'unitPrice'
+        line_total = entry.price * quantity
+        expected_total += line_total
+        if to_decimal(item.get('price')) != line_total:
+            problems.append(f"{label} x{quantity} costs ₹{line_total}, not ₹{item.get('price')}")
+        elif item.get('unitPrice') is not None and to_decimal(item['unitPrice']) != entry.price:
+            problems.append(f"{label} costs ₹{entry.price} each, not ₹{item['unitPrice']}")
+
+    if not problems and to_decimal(total_amount) != expected_total:
+        problems.append(f"Order total is ₹{expected_total}, not ₹{total_amount}")
+
+    return expected_total, problems
@@ -0,0 +1,180 @@
+"""
+Customer order history
+
+A customer is a normalized phone number or a lowercased email. Their orders
+are read newest first from the live and archive tables through the
+(phone_normalized, created_at) and (LOWER(email), created_at) indexes, a page
+at a time with keyset pagination: the cursor is the (created_at, order_id) of
+the last order on the previous page, so a page costs the same however deep it
+is. Totals come from CustomerSummary, which is recomputed whenever one of the
+customer's orders is created or changes status.
+"""
+import base64
+import binascii
+import json
+from decimal import Decimal
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.functions import Lower
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import ArchivedOrder, CustomerSummary, Order, normalize_phone
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def customer_keys(phone, email):
+    """(kind, value) of the summaries an order with this phone and email belongs to"""
+    keys = [('phone', normalize_phone(phone)), ('email', (email or '').strip().lower())]
+    return [(kind, value) for kind, value in keys if value]
+
+
+KEY_EXPRESSIONS = {
+    'phone': F('phone_normalized'),
+    'email': Lower('email'),
+}
+
+
+def customer_orders(model, kind, values):
+    """Orders of model belonging to any of the given customers of one kind"""
+    return model.objects.alias(customer=KEY_EXPRESSIONS[kind]).filter(customer__in=values)
+
+
+def refresh_customer_summaries(orders):
+    """
+    Recompute the summaries of the customers of orders (Order instances or row
+    dictionaries); call inside the transaction that changed them
+
+    Works a kind at a time with grouped queries, so refreshing a whole import
+    chunk costs the same few queries as a single order. Summary rows are
+    locked in (kind, value) order, so two transactions refreshing the same
+    customers cannot deadlock.
+    """
+    keys = {
+        key
+        for order in orders
+        for key in customer_keys(get_field(order, 'phone'), get_field(order, 'email'))
+    }
+    for kind in ['phone', 'email']:
+        values = sorted(value for key_kind, value in keys if key_kind == kind)
+        if values:
+            refresh_kind(kind, values)
+
+
+def refresh_kind(kind, values):
+    now = timezone.now()
+    CustomerSummary.objects.bulk_create(
+        [CustomerSummary(kind=kind, value=value) for value in values],
+        ignore_conflicts=True
+    )
+    summaries = {
+        summary.value: summary
+        for summary in CustomerSummary.objects.select_for_update().filter(kind=kind, value__in=values).order_by('value')
+    }
+    for summary in summaries.values():
+        summary.order_count = 0
+        summary.lifetime_value = Decimal('0')
+        summary.last_order_id, summary.last_order_at = '', None
+        # bulk_update does not apply auto_now
+        summary.updated_at = now
+
+    for model in (Order, ArchivedOrder):
+        totals = (
+            model.objects
+            .annotate(customer=KEY_EXPRESSIONS[kind])
+            .filter(customer__in=values)
+            .values('customer')
+            .annotate(
+                count=Count('pk'),
+                value=Sum('total_amount', filter=~Q(status='cancelled')),
+                last_at=Max('created_at')
+            )
+            .order_by()
+        )
+        last_orders = Q()
+        for row in totals:
+            summary = summaries[row['customer']]
+            summary.order_count += row['count']
+            summary.lifetime_value += row['value'] or 0
+            last_orders |= Q(customer=row['customer'], created_at=row['last_at'])
+        if not last_orders:
+            continue
+        latest = (
+            model.objects.annotate(customer=KEY_EXPRESSIONS[kind])
+            .filter(last_orders)
+            .values_list('customer', 'order_id', 'created_at')
+        )
+        for customer, order_id, created_at in latest:
+            summary = summaries[customer]
+            if summary.last_order_at is None or (created_at, order_id) > (summary.last_order_at, summary.last_order_id):
+                summary.last_order_id, summary.last_order_at = order_id, created_at
+
+    CustomerSummary.objects.bulk_update(
+        list(summaries.values()),
+        ['order_count', 'lifetime_value', 'last_order_id', 'last_order_at', 'updated_at']
+    )
+
+
+def get_field(order, name):
+    return order[name] if isinstance(order, dict) else getattr(order, name)
+
+
+def encode_cursor(row):
+    data = json.dumps([row['created_at'].isoformat(), row['order_id']])
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Raises:
+        InvalidCursor: if the cursor was not made by encode_cursor
+    """
+    try:
+        created_at, order_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        created_at = parse_datetime(created_at)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+    if created_at is None or not isinstance(order_id, str):
+        raise InvalidCursor('Invalid cursor')
+    return created_at, order_id
+
+
+def get_customer_history(kind, value, fields, limit, cursor=None):
+    """
+    One page of a customer's orders, newest first, live and archived together
+
+    Returns:
+        Tuple of (up to limit values() rows of fields plus 'archived', cursor
+        of the next page or None)
+
+    Raises:
+        InvalidCursor: if cursor is not one this function returned
+    """
+    after = None
+    if cursor:
+        created_at, order_id = decode_cursor(cursor)
+        after = Q(created_at__lt=created_at) | Q(created_at=created_at, order_id__lt=order_id)
+
+    rows = []
+    for model, archived in ((Order, False), (ArchivedOrder, True)):
+        orders = customer_orders(model, kind, [value])
+        if after is not None:
+            orders = orders.filter(after)
+        page = orders.order_by('-created_at', '-order_id').values(*fields)[:limit + 1]
+        rows.extend(dict(row, archived=archived) for row in page)
+
+    rows.sort(key=lambda row: (row['created_at'], row['order_id']), reverse=True)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1]) if has_more else None
+
+
+def get_customer_summary(kind, value):
+    """Cached totals of a customer as a dictionary, or None if they have no orders"""
+    return (
+        CustomerSummary.objects
+        .filter(kind=kind, value=value)
+        .values('order_count', 'lifetime_value', 'last_order_id', 'last_order_at', 'updated_at')
+        .first()
+    )
@@ -0,0 +1,226 @@
+"""
+Database connection pool and connection metrics
+
+Used by the orders.backends.postgresql database backend. With POOL MAX_SIZE
+set on a database, each worker process keeps up to that many open
+connections and hands them to its threads: a request takes one the first
+time it queries and gives it back when Django closes its connection at the
+end of the request. Threads wait up to POOL TIMEOUT seconds for a free one.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+
+# Acquire latencies kept per database for the percentiles
+LATENCY_SAMPLES = 2048
+
+# (alias, pid) -> ConnectionPool; a forked worker never uses its parent's pool
+_pools = {}
+_pools_lock = threading.Lock()
+
+# alias -> ConnectionMetrics
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+class PoolTimeout(Exception):
+    """No pooled connection became free in time"""
+
+
+class ConnectionMetrics:
+    """Counters for one database in this process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.opened = 0
+        self.closed = 0
+        self.acquired = 0
+        self.timeouts = 0
+        self.in_use = 0
+        self.acquire_seconds = deque(maxlen=LATENCY_SAMPLES)
+
+    def record_acquire(self, seconds, opened):
+        with self.lock:
+            self.acquired += 1
+            self.in_use += 1
+            self.opened += opened
+            self.acquire_seconds.append(seconds)
+
+    def record_release(self, closed):
+        with self.lock:
+            self.in_use -= 1
+            self.closed += closed
+
+    def record_closed(self, count=1):
+        with self.lock:
+            self.closed += count
+
+    def record_timeout(self):
+        with self.lock:
+            self.timeouts += 1
+
+    def snapshot(self):
+        with self.lock:
+            latencies = sorted(self.acquire_seconds)
+            result = {
+                'open': self.opened - self.closed,
+                'in_use': self.in_use,
+                'opened': self.opened,
+                'acquired': self.acquired,
+                'timeouts': self.timeouts,
+            }
+        if latencies:
+            result['acquire_ms_p50'] = round(latencies[len(latencies) // 2] * 1000, 3)
+            result['acquire_ms_p99'] = round(latencies[int(len(latencies) * 0.99)] * 1000, 3)
+        return result
+
+
+def get_metrics(alias):
+    with _metrics_lock:
+        if alias not in _metrics:
+            _metrics[alias] = ConnectionMetrics()
+        return _metrics[alias]
+
+
+def get_connection_metrics():
+    """
+    Connection counters of every database used by this process
+
+    Returns:
+        Dictionary mapping database alias to open/in-use connection counts,
+        totals and acquire latency percentiles (plus pool size when pooled)
+    """
+    with _metrics_lock:
+        aliases = list(_metrics)
+    result = {}
+    for alias in aliases:
+        result[alias] = get_metrics(alias).snapshot()
+        pool = _pools.get((alias, os.getpid()))
+        if pool is not None:
+            result[alias]['pool_size'] = pool.max_size
+            result[alias]['idle'] = len(pool.idle)
+    return result
+
+
+def reset_connection_metrics():
+    with _metrics_lock:
+        _metrics.clear()
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of open DB-API connections to one database
+
+    Args:
+        alias: Database alias, for the metrics
+        max_size: Most connections open at once
+        timeout: Seconds to wait for a free connection
+    """
+
+    def __init__(self, alias, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.metrics = get_metrics(alias)
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def acquire(self, connect, is_usable=None):
+        """
+        Take an idle connection, or open one with connect()
+
+        Idle connections failing is_usable() are closed and skipped.
+        """
+        started = time.perf_counter()
+        if not self.slots.acquire(timeout=self.timeout):
+            self.metrics.record_timeout()
+            raise PoolTimeout(f"No database connection free after {self.timeout}s ({self.max_size} in use)")
+        try:
+            while True:
+                with self.lock:
+                    connection = self.idle.pop() if self.idle else None
+                if connection is None:
+                    connection = connect()
+                    self.metrics.record_acquire(time.perf_counter() - started, opened=1)
+                    return connection
+                if not connection.closed and (is_usable is None or is_usable(connection)):
+                    self.metrics.record_acquire(time.perf_counter() - started, opened=0)
+                    return connection
+                close_quietly(connection)
+                self.metrics.record_closed()
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def release(self, connection, reusable=True):
+        """
+        Give a connection back; it is closed instead unless reusable
+
+        A connection left in a transaction or with autocommit turned off is
+        rolled back and put back in autocommit mode first, and closed if
+        either fails.
+        """
+        try:
+            if reusable and reset_connection(connection):
+                with self.lock:
+                    self.idle.append(connection)
+                self.metrics.record_release(closed=0)
+            else:
+                close_quietly(connection)
+                self.metrics.record_release(closed=1)
+        finally:
+            self.slots.release()
+
+    def close(self):
+        """Close every idle connection"""
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for connection in idle:
+            close_quietly(connection)
+        self.metrics.record_closed(len(idle))
+        return len(idle)
+
+
+def reset_connection(connection):
+    """Roll back and turn autocommit back on; False if the connection cannot be reused"""
+    if connection.closed:
+        return False
+    try:
+        connection.rollback()
+        if not connection.autocommit:
+            connection.autocommit = True
+    except Exception:
+        return False
+    return not connection.closed
+
+
+def close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+def get_pool(alias, max_size, timeout):
+    """This process's pool for a database, created on first use"""
+    key = (alias, os.getpid())
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(alias, max_size, timeout)
+        return _pools[key]
+
+
+def close_pools():
+    """Close the idle connections of every pool in this process and forget the pools"""
+    pid = os.getpid()
+    with _pools_lock:
+        pools = [pool for (_, pool_pid), pool in _pools.items() if pool_pid == pid]
+        for key in [key for key in _pools if key[1] == pid]:
+            del _pools[key]
+    closed = 0
+    for pool in pools:
+        closed += pool.close()
+    return closed
+
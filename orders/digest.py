@@ -0,0 +1,193 @@
+"""
+Admin digest emails: one summary of several new orders instead of an email per order
+
+With ADMIN_NOTIFICATION_MODE = 'digest', create_order queues an
+AdminDigestEntry instead of emailing the admin. The send_admin_digest job
+(run by run_jobs) sends the queue as one email with a table of the orders and
+a single PDF of their payment screenshots as soon as ADMIN_DIGEST_MAX_ORDERS
+are waiting, or the oldest has waited ADMIN_DIGEST_INTERVAL_MINUTES.
+"""
+from collections import defaultdict
+from contextlib import ExitStack
+from datetime import timedelta
+from html import escape
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db import transaction
+from django.utils import timezone
+from .models import AdminDigestEntry, ArchivedOrder, Order, OrderItem, PaymentScreenshot
+from .utils import get_order_warnings, merge_images_to_pdf
+
+
+def is_digest_enabled():
+    return settings.ADMIN_NOTIFICATION_MODE == 'digest'
+
+
+def queue_for_digest(order, order_data):
+    """Queue a new order for the next digest (call inside the order's transaction)"""
+    return AdminDigestEntry.objects.create(
+        order_id=order.pk,
+        delivery_zone=order_data.get('deliveryZone') or '',
+        warnings=get_order_warnings(order_data)
+    )
+
+
+def is_digest_due(entries, now):
+    """A full batch, or a batch whose oldest order has waited long enough"""
+    waited = now - entries[0].created_at
+    return (
+        len(entries) >= settings.ADMIN_DIGEST_MAX_ORDERS
+        or waited >= timedelta(minutes=settings.ADMIN_DIGEST_INTERVAL_MINUTES)
+    )
+
+
+def get_digest_orders(entries):
+    """Queued orders (live or already archived) in queue order"""
+    pks = [entry.order_id for entry in entries]
+    orders = Order.objects.in_bulk(pks)
+    missing = [pk for pk in pks if pk not in orders]
+    if missing:
+        orders.update(ArchivedOrder.objects.in_bulk(missing))
+    return orders
+
+
+def build_digest_html(entries, orders, line_items):
+    """Summary table of the queued orders"""
+    rows = []
+    total = 0
+    for entry in entries:
+        order = orders.get(entry.order_id)
+        if order is None:
+            continue
+        total += order.total_amount
+        items = '<br>'.join(
+            escape(f"{item.product} ({item.flavor}) x{item.quantity} - ₹{item.amount}")
+            for item in line_items[order.pk]
+        )
+        warnings = ''.join(
+            f'<div style="color: #e84393;"><strong>⚠️ {escape(warning)}</strong></div>'
+            for warning in entry.warnings
+        )
+        address = escape(f"{order.delivery_address}, {order.pincode}")
+        if entry.delivery_zone:
+            address += f"<br><em>{escape(entry.delivery_zone)}</em>"
+        rows.append(f"""
+                <tr style="border-bottom: 1px solid #eee; vertical-align: top;">
+                    <td style="padding: 8px;"><strong>{escape(order.order_id)}</strong><br>{timezone.localtime(order.created_at):%d %b %H:%M}</td>
+                    <td style="padding: 8px;">{escape(order.full_name)}<br>{escape(order.phone)}<br>{escape(order.email)}</td>
+                    <td style="padding: 8px;">{address}</td>
+                    <td style="padding: 8px;">{items}</td>
+                    <td style="padding: 8px; text-align: right;">₹{order.total_amount}</td>
+                    <td style="padding: 8px;">{escape(order.get_payment_status_display())}{warnings}</td>
+                </tr>""")
+
+    return f"""
+        <div style="font-family: Arial, sans-serif; max-width: 1000px; margin: 0 auto;">
+            <h2 style="color: #ff6b9d;">🍦 {len(rows)} New Order{'s' if len(rows) != 1 else ''} - ₹{total}</h2>
+            <table style="width: 100%; border-collapse: collapse; font-size: 14px;">
+                <tr style="background: #f8f9fa; text-align: left;">
+                    <th style="padding: 8px;">Order</th>
+                    <th style="padding: 8px;">Customer</th>
+                    <th style="padding: 8px;">Delivery</th>
+                    <th style="padding: 8px;">Items</th>
+                    <th style="padding: 8px;">Total</th>
+                    <th style="padding: 8px;">Payment</th>
+                </tr>{''.join(rows)}
+            </table>
+            <p style="color: #666; font-size: 14px;">Payment screenshots are attached as one PDF, one page per order.</p>
+            <div style="margin-top: 30px; padding-top: 20px; border-top: 2px solid #ddd; color: #666; font-size: 12px;">
+                <p>This is an automated email from Anand Ice Cream ordering system.</p>
+            </div>
+        </div>
+        """
+
+
+def send_digest_email(entries):
+    """Email one batch of queued orders to ADMIN_EMAIL"""
+    orders = get_digest_orders(entries)
+    line_items = defaultdict(list)
+    for item in OrderItem.objects.filter(order_id__in=orders.keys()):
+        line_items[item.order_id].append(item)
+    screenshots = PaymentScreenshot.objects.in_bulk(
+        [entry.order_id for entry in entries],
+        field_name='order_id'
+    )
+
+    email = EmailMessage(
+        subject=f"🍦 {len(orders)} New Order{'s' if len(orders) != 1 else ''} - Anand Ice Cream",
+        body=build_digest_html(entries, orders, line_items),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[settings.ADMIN_EMAIL],
+    )
+    email.content_subtype = 'html'
+
+    # The stored screenshots are JPEGs, so the PDF embeds them without decoding
+    with ExitStack() as stack:
+        pages = [
+            (orders[pk].order_id, stack.enter_context(screenshots[pk].image.open('rb')))
+            for pk in (entry.order_id for entry in entries)
+            if pk in orders and pk in screenshots
+        ]
+        if pages:
+            email.attach(
+                f"payment-screenshots-{timezone.localtime():%Y%m%d-%H%M}.pdf",
+                merge_images_to_pdf(pages).read(),
+                'application/pdf'
+            )
+    email.send()
+
+
+def claim_digest_batch(force):
+    """
+    Take the next due batch off the queue (see send_admin_digest)
+
+    Returns:
+        The claimed entries, empty if no batch is due
+    """
+    with transaction.atomic():
+        entries = list(
+            AdminDigestEntry.objects
+            .select_for_update(skip_locked=True)
+            .order_by('created_at')[:settings.ADMIN_DIGEST_MAX_ORDERS]
+        )
+        if not entries or not (force or is_digest_due(entries, timezone.now())):
+            return []
+        AdminDigestEntry.objects.filter(pk__in=[entry.pk for entry in entries]).delete()
+    return entries
+
+
+def requeue_digest_batch(entries):
+    """Put a batch whose email failed back on the queue with its original times"""
+    created_at = [entry.created_at for entry in entries]
+    with transaction.atomic():
+        # bulk_create stamps auto_now_add fields with the current time
+        AdminDigestEntry.objects.bulk_create(entries)
+        for entry, queued_at in zip(entries, created_at):
+            entry.created_at = queued_at
+        AdminDigestEntry.objects.bulk_update(entries, ['created_at'])
+
+
+def send_admin_digest(force=False):
+    """
+    Email queued orders in batches of ADMIN_DIGEST_MAX_ORDERS, as long as a
+    batch is due (see is_digest_due) or force is set
+
+    Each batch is deleted from the queue in a short transaction before its
+    email is sent, so a slow SMTP server holds no row locks, and put back if
+    sending fails. A worker that dies mid-send loses that batch's email.
+
+    Returns:
+        Number of orders sent
+    """
+    sent = 0
+    while True:
+        entries = claim_digest_batch(force)
+        if not entries:
+            return sent
+        try:
+            send_digest_email(entries)
+        except Exception:
+            requeue_digest_batch(entries)
+            raise
+        sent += len(entries)
+        print(f"[SUCCESS] Admin digest sent with {len(entries)} orders")
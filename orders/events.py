@@ -0,0 +1,117 @@
+"""
+Order event log
+
+Every change to an order appends an OrderEvent in the same transaction as
+the change. Sequence numbers come from the 'order_events' CacheVersion row,
+which stays locked until the writing transaction commits, so events become
+visible in sequence order and a reader polling with ?since=<seq> never skips
+one that commits late.
+"""
+from django.db import connection, transaction
+from django.db.models import F
+from .models import CacheVersion, OrderEvent
+
+
+EVENT_SEQUENCE = 'order_events'
+
+
+def reserve_sequence(count):
+    """
+    Reserve count consecutive sequence numbers (call inside a transaction)
+
+    Returns:
+        The first reserved number
+    """
+    if not connection.in_atomic_block:
+        raise RuntimeError("Order events must be recorded inside the transaction that changes the order")
+    updated = CacheVersion.objects.filter(name=EVENT_SEQUENCE).update(version=F('version') + count)
+    if not updated:
+        CacheVersion.objects.get_or_create(name=EVENT_SEQUENCE, defaults={'version': 0})
+        CacheVersion.objects.filter(name=EVENT_SEQUENCE).update(version=F('version') + count)
+    last = CacheVersion.objects.filter(name=EVENT_SEQUENCE).values_list('version', flat=True).get()
+    return last - count + 1
+
+
+def record_events(events):
+    """Number and store unsaved OrderEvents"""
+    if not events:
+        return []
+    first = reserve_sequence(len(events))
+    for offset, event in enumerate(events):
+        event.seq = first + offset
+    return OrderEvent.objects.bulk_create(events)
+
+
+def record_created(orders, actor):
+    """Record the creation of orders (Order instances or row dictionaries)"""
+    return record_events([
+        OrderEvent(
+            order_id=get_field(order, 'order_id'),
+            kind='created',
+            actor=actor,
+            new_status=get_field(order, 'status'),
+            new_payment_status=get_field(order, 'payment_status'),
+        )
+        for order in orders
+    ])
+
+
+def record_status_change(order, old_status, old_payment_status, actor):
+    """Record a status and/or payment status change of a saved order"""
+    if order.status == old_status and order.payment_status == old_payment_status:
+        return None
+    return record_events([OrderEvent(
+        order_id=order.order_id,
+        kind='status_changed',
+        actor=actor,
+        old_status=old_status,
+        new_status=order.status,
+        old_payment_status=old_payment_status,
+        new_payment_status=order.payment_status,
+    )])[0]
+
+
+def record_archived(rows, actor='system'):
+    """Record that orders (row dictionaries) moved to the archive table"""
+    return record_events([
+        OrderEvent(
+            order_id=row['order_id'],
+            kind='archived',
+            actor=actor,
+            old_status=row['status'],
+            new_status=row['status'],
+            old_payment_status=row['payment_status'],
+            new_payment_status=row['payment_status'],
+        )
+        for row in rows
+    ])
+
+
+def get_field(order, name):
+    return order[name] if isinstance(order, dict) else getattr(order, name)
+
+
+def get_admin_actor(request):
+    """Actor name of the admin behind a request"""
+    if request.session.get('is_admin'):
+        return f"admin:{request.session.get('admin_username', 'admin')}"
+    return f"admin:{request.user.get_username()}"
+
+
+def get_events_since(since, limit):
+    """
+    Events after sequence number since, oldest first
+
+    Returns:
+        Tuple of (up to limit events as dictionaries, whether more are waiting)
+    """
+    events = list(
+        OrderEvent.objects
+        .filter(seq__gt=since)
+        .order_by('seq')
+        .values(
+            'seq', 'order_id', 'kind', 'actor', 'old_status', 'new_status',
+            'old_payment_status', 'new_payment_status', 'created_at'
+        )[:limit + 1]
+    )
+    return events[:limit], len(events) > limit
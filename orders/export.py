@@ -0,0 +1,121 @@
+"""
+Streaming CSV/NDJSON export of orders
+"""
+import csv
+import json
+from datetime import datetime, time, timedelta
+from itertools import chain
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from .models import Order, ArchivedOrder, OrderItem
+
+
+EXPORT_FORMATS = ['csv', 'ndjson']
+
+ORDER_COLUMNS = [
+    'order_id', 'created_at', 'order_date', 'status', 'payment_status',
+    'full_name', 'email', 'phone', 'alternate_phone',
+    'delivery_address', 'pincode', 'total_amount',
+]
+
+ITEM_COLUMNS = ['product', 'flavor', 'quantity', 'unit_price', 'amount']
+
+
+class Echo:
+    """File-like object whose write() returns the value, for streaming csv.writer output"""
+
+    def write(self, value):
+        return value
+
+
+def start_of_day(day):
+    """Midnight at the start of a date in the current time zone"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def get_export_queryset(model, start=None, end=None, statuses=None):
+    """
+    Rows of one order table matching the export filters
+
+    Only the exported columns are fetched (never the screenshot), and rows are
+    read through iterator() so PostgreSQL streams them from a server-side cursor.
+    The dates are turned into datetime bounds, so the created_at index is used.
+    """
+    queryset = model.objects.order_by('created_at', 'pk')
+    if start:
+        queryset = queryset.filter(created_at__gte=start_of_day(start))
+    if end:
+        queryset = queryset.filter(created_at__lt=start_of_day(end + timedelta(days=1)))
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+    return queryset.values(*ORDER_COLUMNS, 'items').iterator(chunk_size=settings.ORDER_EXPORT_CHUNK_SIZE)
+
+
+def iter_order_rows(start=None, end=None, statuses=None, per='order', include_archived=True):
+    """
+    Yield one dictionary per order (per='order') or per line item (per='item')
+
+    Live orders come first, then archived ones, each in created_at order.
+    """
+    models = [Order, ArchivedOrder] if include_archived else [Order]
+    rows = chain.from_iterable(get_export_queryset(model, start, end, statuses) for model in models)
+
+    for row in rows:
+        items = row.pop('items') or []
+        if per == 'item':
+            for item in items:
+                line_item = OrderItem.from_json(item)
+                yield {
+                    **row,
+                    'product': line_item.product,
+                    'flavor': line_item.flavor,
+                    'quantity': line_item.quantity,
+                    'unit_price': line_item.price,
+                    'amount': line_item.amount,
+                }
+        else:
+            row['item_count'] = sum(item.get('quantity', 1) for item in items)
+            row['items'] = items
+            yield row
+
+
+def get_export_columns(per='order'):
+    """Column order for a CSV export"""
+    if per == 'item':
+        return ORDER_COLUMNS + ITEM_COLUMNS
+    return ORDER_COLUMNS + ['item_count', 'items']
+
+
+def stream_csv(rows, per='order'):
+    """Yield CSV lines (header first) for the given rows"""
+    columns = get_export_columns(per)
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        if 'items' in row:
+            row['items'] = json.dumps(row['items'], cls=DjangoJSONEncoder)
+        yield writer.writerow([row.get(column) for column in columns])
+
+
+def stream_ndjson(rows):
+    """Yield one JSON document per line for the given rows"""
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+def stream_export(export_format, **filters):
+    """
+    Lazily render an order export
+
+    Args:
+        export_format: 'csv' or 'ndjson'
+        **filters: start, end, statuses, per and include_archived for iter_order_rows
+
+    Returns:
+        Generator of text chunks
+    """
+    rows = iter_order_rows(**filters)
+    if export_format == 'csv':
+        return stream_csv(rows, filters.get('per', 'order'))
+    return stream_ndjson(rows)
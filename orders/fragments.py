@@ -0,0 +1,50 @@
+"""
+Cached HTML of order cards on the pending/confirmed admin pages
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+from django.db.models import BooleanField, Exists, ExpressionWrapper, JSONField, OuterRef, Q, Subquery
+from .models import PaymentScreenshot
+
+
+# {% cache %} fragment names used by the order card templates
+ORDER_CARD_FRAGMENTS = ['pending_order_card', 'confirmed_order_card']
+
+
+def with_card_fields(queryset):
+    """
+    Orders with only what an order card needs
+
+    Cards only show whether there is a payment screenshot (a processed
+    PaymentScreenshot, or base64 data on orders from before those existed)
+    and which earlier orders it matched, so the possibly large base64 column
+    is never loaded.
+    """
+    has_legacy_screenshot = ~Q(payment_screenshot__isnull=True) & ~Q(payment_screenshot='')
+    screenshots = PaymentScreenshot.objects.filter(order_id=OuterRef('pk'))
+    return queryset.defer('payment_screenshot').annotate(
+        has_screenshot=ExpressionWrapper(
+            Q(Exists(screenshots)) | has_legacy_screenshot,
+            output_field=BooleanField()
+        ),
+        similar_orders=Subquery(screenshots.values('similar_orders')[:1], output_field=JSONField())
+    )
+
+
+def get_card_context():
+    """Template context needed by the cached order cards"""
+    return {'fragment_cache_seconds': settings.ORDER_FRAGMENT_CACHE_SECONDS}
+
+
+def invalidate_order_cards(order):
+    """
+    Drop an order's cached cards before it is changed
+
+    Cards are keyed by order_id and updated_at, so a saved order never hits an
+    outdated card anyway; this frees the old entries right away.
+    """
+    caches['order_fragments'].delete_many([
+        make_template_fragment_key(name, [order.order_id, order.updated_at])
+        for name in ORDER_CARD_FRAGMENTS
+    ])
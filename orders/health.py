@@ -0,0 +1,115 @@
+"""
+Dependency probes for the health check endpoint
+"""
+import os
+import socket
+import tempfile
+import threading
+import time
+from django.conf import settings
+from django.db import connection
+
+
+# Cached result of the last deep probe, shared by every request in this worker
+_cache = {
+    'checks': None,
+    'checked_at': 0.0,
+}
+_cache_lock = threading.Lock()
+_refreshing = threading.Event()
+
+
+def probe_database():
+    """Run a trivial query against the default database"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+
+
+def probe_smtp():
+    """Open (and immediately close) a TCP connection to the SMTP server"""
+    timeout = settings.HEALTH_CHECK_PROBE_TIMEOUT
+    with socket.create_connection((settings.EMAIL_HOST, settings.EMAIL_PORT), timeout=timeout):
+        pass
+
+
+def probe_storage():
+    """Check that MEDIA_ROOT exists and is writable"""
+    os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=settings.MEDIA_ROOT, prefix='.health-'):
+        pass
+
+
+# name -> (probe function, whether a failure makes the service unhealthy)
+PROBES = {
+    'database': (probe_database, True),
+    'smtp': (probe_smtp, False),
+    'storage': (probe_storage, False),
+}
+
+
+def run_probes():
+    """
+    Run every dependency probe once
+
+    Returns:
+        Dictionary mapping dependency name to its status and latency
+    """
+    checks = {}
+    for name, (probe, critical) in PROBES.items():
+        started = time.perf_counter()
+        try:
+            probe()
+            result = {'status': 'OK'}
+        except Exception as e:
+            result = {'status': 'ERROR', 'error': str(e)}
+        result['latency_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        result['critical'] = critical
+        checks[name] = result
+
+    with _cache_lock:
+        _cache['checks'] = checks
+        _cache['checked_at'] = time.time()
+    return checks
+
+
+def _refresh_in_background():
+    """Re-run the probes in a daemon thread unless a refresh is already running"""
+    with _cache_lock:
+        if _refreshing.is_set():
+            return
+        _refreshing.set()
+
+    def worker():
+        try:
+            run_probes()
+        finally:
+            # The thread's database connection is not managed by the request cycle
+            connection.close()
+            _refreshing.clear()
+
+    threading.Thread(target=worker, name='health-probe', daemon=True).start()
+
+
+def get_cached_checks():
+    """
+    Return the last probe results, refreshing them when they are stale
+
+    The first call in a worker probes synchronously. After that, a stale
+    result is served as-is while a background thread refreshes it, so the
+    endpoint's latency never depends on the dependencies' latency.
+
+    Returns:
+        Tuple of (checks dictionary, age of the result in seconds)
+    """
+    with _cache_lock:
+        checks = _cache['checks']
+        checked_at = _cache['checked_at']
+
+    if checks is None:
+        checks = run_probes()
+        return checks, 0.0
+
+    age = time.time() - checked_at
+    if age >= settings.HEALTH_CHECK_CACHE_SECONDS:
+        _refresh_in_background()
+    return checks, round(age, 2)
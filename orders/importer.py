@@ -0,0 +1,237 @@
+"""
+Bulk import of historical orders (old Node.js system, offline sales)
+
+Rows are validated with OrderCreateSerializer, inserted a chunk at a time and
+never trigger any notification.
+"""
+import csv
+import io
+import json
+from itertools import islice
+from django.db import connection, transaction
+from django.db.models import F
+from rest_framework import serializers
+from django.utils import timezone
+from .models import Order, ArchivedOrder, OrderItem, normalize_phone
+from .serializers import OrderCreateSerializer
+from .events import record_created
+from .customers import refresh_customer_summaries
+from .utils import generate_order_ids
+
+
+# Columns written by COPY, in order (everything but the primary key)
+COPY_COLUMNS = [
+    'order_id', 'full_name', 'email', 'phone', 'delivery_address', 'pincode',
+    'alternate_phone', 'items', 'total_amount', 'payment_screenshot',
+    'payment_status', 'order_date', 'status', 'created_at', 'updated_at',
+    'phone_normalized',
+]
+
+
+def read_rows(path, file_format):
+    """
+    Yield raw rows from a CSV or NDJSON file
+
+    CSV files use the export_orders column names, with 'items' holding a JSON list.
+    """
+    with open(path, newline='', encoding='utf-8') as handle:
+        if file_format == 'csv':
+            for row in csv.DictReader(handle):
+                if row.get('items'):
+                    row['items'] = json.loads(row['items'])
+                yield row
+        else:
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def row_to_payload(row):
+    """
+    Convert a row to the create_order request shape
+
+    Accepts both the frontend shape (customerInfo, totalAmount, ...) and the
+    flat export_orders shape (full_name, total_amount, ...).
+    """
+    if 'customerInfo' in row:
+        return row
+
+    customer_info = {
+        'fullName': row.get('full_name'),
+        'email': row.get('email'),
+        'phone': row.get('phone'),
+        'deliveryAddress': row.get('delivery_address'),
+        'pincode': row.get('pincode'),
+    }
+    if row.get('alternate_phone'):
+        customer_info['alternatePhone'] = row['alternate_phone']
+
+    payload = {
+        'customerInfo': {key: value for key, value in customer_info.items() if value is not None},
+        'items': row.get('items'),
+        'totalAmount': row.get('total_amount'),
+        'paymentStatus': row.get('payment_status') or 'pending',
+        'status': row.get('status') or 'pending',
+    }
+    if row.get('order_date'):
+        payload['orderDate'] = row['order_date']
+    if row.get('order_id'):
+        payload['orderId'] = row['order_id']
+    return payload
+
+
+def validate_chunk(rows, first_row):
+    """
+    Validate a chunk of rows
+
+    Returns:
+        Tuple of (list of (order_id or None, validated data), list of (row number, errors))
+    """
+    # One serializer instance validates every row, so its fields are only built once
+    serializer = OrderCreateSerializer()
+    valid, errors = [], []
+    for number, row in enumerate(rows, start=first_row):
+        payload = row_to_payload(row)
+        try:
+            valid.append((payload.get('orderId'), serializer.run_validation(payload)))
+        except serializers.ValidationError as e:
+            errors.append((number, e.detail))
+    return valid, errors
+
+
+def assign_order_ids(valid):
+    """
+    Give every row an order ID, skipping rows whose ID already exists
+
+    Returns:
+        Tuple of (list of (order_id, validated data), number of skipped duplicates)
+    """
+    given = [order_id for order_id, _ in valid if order_id]
+    existing = set(Order.objects.filter(order_id__in=given).values_list('order_id', flat=True))
+    existing |= set(ArchivedOrder.objects.filter(order_id__in=given).values_list('order_id', flat=True))
+
+    # Generate IDs for the remaining rows, avoiding anything already stored or in the file
+    missing = sum(1 for order_id, _ in valid if not order_id)
+    taken = set(given)
+    new_ids = []
+    while len(new_ids) < missing:
+        candidates = set(generate_order_ids(missing - len(new_ids))) - taken
+        candidates -= set(Order.objects.filter(order_id__in=candidates).values_list('order_id', flat=True))
+        candidates -= set(ArchivedOrder.objects.filter(order_id__in=candidates).values_list('order_id', flat=True))
+        new_ids.extend(candidates)
+        taken |= candidates
+    new_ids = iter(new_ids)
+
+    assigned, skipped, seen = [], 0, set()
+    for order_id, data in valid:
+        if order_id and (order_id in existing or order_id in seen):
+            skipped += 1
+            continue
+        order_id = order_id or next(new_ids)
+        seen.add(order_id)
+        assigned.append((order_id, data))
+    return assigned, skipped
+
+
+def build_row(order_id, data):
+    """Column values for one order, in COPY_COLUMNS order"""
+    customer_info = data['customerInfo']
+    order_date = data.get('orderDate') or timezone.now()
+    return {
+        'order_id': order_id,
+        'full_name': customer_info['fullName'],
+        'email': customer_info['email'],
+        'phone': customer_info['phone'],
+        'phone_normalized': normalize_phone(customer_info['phone']),
+        'delivery_address': customer_info['deliveryAddress'],
+        'pincode': customer_info['pincode'],
+        'alternate_phone': customer_info.get('alternatePhone', ''),
+        'items': data['items'],
+        'total_amount': data['totalAmount'],
+        'payment_screenshot': data.get('paymentScreenshot', ''),
+        'payment_status': data.get('paymentStatus', 'pending'),
+        'order_date': order_date,
+        'status': data.get('status', 'pending'),
+        # Historical orders keep their original date instead of the import time
+        'created_at': order_date,
+        'updated_at': order_date,
+    }
+
+
+def insert_with_bulk_create(rows):
+    """Insert rows through the ORM"""
+    with transaction.atomic():
+        orders = Order.objects.bulk_create([Order(**row) for row in rows])
+        # created_at/updated_at are auto fields and get overwritten on insert,
+        # so restore the historical dates (equal to order_date) in one statement
+        Order.objects.filter(order_id__in=[row['order_id'] for row in rows]).update(
+            created_at=F('order_date'),
+            updated_at=F('order_date')
+        )
+        insert_line_items(orders)
+        refresh_customer_summaries(rows)
+        record_created(rows, actor='import')
+
+
+def insert_with_copy(rows):
+    """Insert rows with PostgreSQL COPY, which is much faster than INSERT"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+    for row in rows:
+        values = dict(row, items=json.dumps(row['items']))
+        writer.writerow([
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in (values[column] for column in COPY_COLUMNS)
+        ])
+    buffer.seek(0)
+
+    sql = f"COPY {Order._meta.db_table} ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.cursor.copy_expert(sql, buffer)
+        # COPY does not return primary keys, so read them back for the line items
+        orders = Order.objects.filter(order_id__in=[row['order_id'] for row in rows]).only('pk', 'items')
+        insert_line_items(orders)
+        refresh_customer_summaries(rows)
+        record_created(rows, actor='import')
+
+
+def insert_line_items(orders):
+    """Create the normalized line items of freshly inserted orders"""
+    OrderItem.objects.bulk_create([
+        line_item
+        for order in orders
+        for line_item in OrderItem.build_for_order(order)
+    ])
+
+
+def import_orders(rows, chunk_size=1000, use_copy=True, dry_run=False):
+    """
+    Validate and insert orders a chunk at a time
+
+    Args:
+        rows: Iterable of raw row dictionaries
+        chunk_size: Rows validated and inserted per transaction
+        use_copy: Use PostgreSQL COPY when the database supports it
+        dry_run: Validate only
+
+    Yields:
+        Progress dictionary after each chunk (imported, skipped, errors)
+    """
+    use_copy = use_copy and connection.vendor == 'postgresql'
+    insert = insert_with_copy if use_copy else insert_with_bulk_create
+    rows = iter(rows)
+    row_number = 1
+
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+
+        valid, errors = validate_chunk(chunk, row_number)
+        row_number += len(chunk)
+        assigned, skipped = assign_order_ids(valid)
+        if assigned and not dry_run:
+            insert([build_row(order_id, data) for order_id, data in assigned])
+
+        yield {'imported': len(assigned), 'skipped': skipped, 'errors': errors}
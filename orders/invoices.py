@@ -0,0 +1,195 @@
+"""
+Invoice files and media disk usage
+
+Invoices are stored as MEDIA_ROOT/invoices/<aa>/<bb>/INV-<order id>.pdf, where
+aa and bb are the first hex digits of the SHA-1 of the order id, so no
+directory grows past a few hundred files however many orders there are
+(earlier releases wrote them all straight into MEDIA_ROOT/invoices/; see
+move_flat_invoices). An invoice can be regenerated from its order at any time,
+so prune_invoices gzips old ones and deletes the oldest.
+"""
+import gzip
+import hashlib
+import io
+import os
+import shutil
+import time
+from django.conf import settings
+
+
+INVOICE_DIR = 'invoices'
+
+COMPRESSED_SUFFIX = '.gz'
+
+
+def get_invoice_root():
+    return os.path.join(settings.MEDIA_ROOT, INVOICE_DIR)
+
+
+def invoice_filename(order_id):
+    return f"INV-{order_id}.pdf"
+
+
+def invoice_path(order_id):
+    """Where the invoice of an order is written"""
+    digest = hashlib.sha1(order_id.encode()).hexdigest()
+    return os.path.join(get_invoice_root(), digest[:2], digest[2:4], invoice_filename(order_id))
+
+
+def find_invoice(order_id):
+    """
+    Stored invoice of an order
+
+    Returns:
+        Tuple of (path, whether it is gzipped), or None if it was never
+        generated or has been pruned
+    """
+    path = invoice_path(order_id)
+    legacy_path = os.path.join(get_invoice_root(), invoice_filename(order_id))
+    for candidate, compressed in [(path, False), (path + COMPRESSED_SUFFIX, True), (legacy_path, False)]:
+        if os.path.exists(candidate):
+            return candidate, compressed
+    return None
+
+
+def open_invoice(order_id):
+    """Binary file of the stored PDF of an order (decompressed if gzipped), or None"""
+    found = find_invoice(order_id)
+    if found is None:
+        return None
+    path, compressed = found
+    if not compressed:
+        return open(path, 'rb')
+    # In memory: invoices are small, and a GzipFile would report the compressed size
+    with gzip.open(path, 'rb') as invoice:
+        return io.BytesIO(invoice.read())
+
+
+def iter_invoice_files():
+    """Paths of every stored invoice, flat or sharded, plain or gzipped"""
+    for directory, _, filenames in os.walk(get_invoice_root()):
+        for filename in filenames:
+            if filename.startswith('INV-') and filename.endswith(('.pdf', '.pdf' + COMPRESSED_SUFFIX)):
+                yield os.path.join(directory, filename)
+
+
+def move_flat_invoices(dry_run=False):
+    """
+    Move invoices from the old flat MEDIA_ROOT/invoices/ directory into their shards
+
+    A sharded copy that already exists was generated later, so it is kept
+    and the flat file is deleted.
+
+    Returns:
+        Number of invoices moved
+    """
+    root = get_invoice_root()
+    if not os.path.isdir(root):
+        return 0
+    moved = 0
+    with os.scandir(root) as entries:
+        flat = [entry.name for entry in entries if entry.is_file() and entry.name.startswith('INV-') and entry.name.endswith('.pdf')]
+    for filename in flat:
+        source = os.path.join(root, filename)
+        target = invoice_path(filename[len('INV-'):-len('.pdf')])
+        if dry_run:
+            moved += 1
+            continue
+        if os.path.exists(target) or os.path.exists(target + COMPRESSED_SUFFIX):
+            os.remove(source)
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Same volume, so an atomic rename rather than a copy
+        os.replace(source, target)
+        moved += 1
+    return moved
+
+
+def compress_invoice(path):
+    """
+    Gzip an invoice in place (INV-x.pdf -> INV-x.pdf.gz), keeping its
+    modification time so retention still counts from when it was generated
+
+    Returns:
+        Bytes saved
+    """
+    compressed_path = path + COMPRESSED_SUFFIX
+    temporary_path = compressed_path + '.tmp'
+    stat = os.stat(path)
+    with open(path, 'rb') as source, gzip.open(temporary_path, 'wb', compresslevel=9) as target:
+        shutil.copyfileobj(source, target)
+    os.utime(temporary_path, (stat.st_atime, stat.st_mtime))
+    os.replace(temporary_path, compressed_path)
+    os.remove(path)
+    return stat.st_size - os.path.getsize(compressed_path)
+
+
+def prune_invoices(compress_after_days, delete_after_days, dry_run=False):
+    """
+    Gzip invoices older than compress_after_days and delete those older than
+    delete_after_days (0 disables either step)
+
+    Returns:
+        Dictionary of how many invoices were compressed and deleted, and the
+        bytes freed
+    """
+    now = time.time()
+    result = {'compressed': 0, 'deleted': 0, 'bytes_freed': 0}
+    for path in list(iter_invoice_files()):
+        stat = os.stat(path)
+        age_days = (now - stat.st_mtime) / (24 * 60 * 60)
+        if delete_after_days and age_days >= delete_after_days:
+            result['deleted'] += 1
+            result['bytes_freed'] += stat.st_size
+            if not dry_run:
+                os.remove(path)
+        elif compress_after_days and age_days >= compress_after_days and not path.endswith(COMPRESSED_SUFFIX):
+            result['compressed'] += 1
+            if not dry_run:
+                result['bytes_freed'] += compress_invoice(path)
+    return result
+
+
+def get_directory_usage(path):
+    """(number of files, total bytes) under a directory"""
+    files = size = 0
+    for directory, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                size += os.path.getsize(os.path.join(directory, filename))
+            except FileNotFoundError:  # removed while walking
+                continue
+            files += 1
+    return files, size
+
+
+def get_media_usage():
+    """
+    Disk usage of the media volumes by category: invoices split into sharded,
+    gzipped and not yet moved (flat), then every other top-level directory of
+    MEDIA_ROOT and PRIVATE_MEDIA_ROOT
+
+    Returns:
+        List of (category, number of files, total bytes)
+    """
+    invoices = {'invoices': [0, 0], 'invoices (gzipped)': [0, 0], 'invoices (flat)': [0, 0]}
+    root = get_invoice_root()
+    for path in iter_invoice_files():
+        if os.path.dirname(path) == root:
+            category = 'invoices (flat)'
+        elif path.endswith(COMPRESSED_SUFFIX):
+            category = 'invoices (gzipped)'
+        else:
+            category = 'invoices'
+        invoices[category][0] += 1
+        invoices[category][1] += os.path.getsize(path)
+    usage = [(category, files, size) for category, (files, size) in invoices.items()]
+
+    for label, base in [('media', settings.MEDIA_ROOT), ('private', settings.PRIVATE_MEDIA_ROOT)]:
+        if not os.path.isdir(base):
+            continue
+        with os.scandir(base) as entries:
+            for entry in sorted(entries, key=lambda entry: entry.name):
+                if entry.is_dir() and not (label == 'media' and entry.name == INVOICE_DIR):
+                    usage.append((f"{label}/{entry.name}", *get_directory_usage(entry.path)))
+    return usage
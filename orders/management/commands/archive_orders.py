@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from orders.archive import archivable_orders, archive_orders, get_table_stats
+from orders.models import Order
+
+
+def format_bytes(size):
+    """Human readable size, or 'n/a' when the database cannot report it"""
+    if size is None:
+        return 'n/a'
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+class Command(BaseCommand):
+    help = 'Move delivered/cancelled orders older than a given age into the archive table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days', type=int, default=settings.ORDER_ARCHIVE_AFTER_DAYS,
+            help='Only archive orders whose last update is older than this many days'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.ORDER_ARCHIVE_BATCH_SIZE,
+            help='Number of orders moved per transaction'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many orders would be archived')
+        parser.add_argument(
+            '--vacuum', action='store_true',
+            help='Run VACUUM ANALYZE on the orders table afterwards (PostgreSQL only)'
+        )
+
+    def handle(self, *args, **options):
+        older_than_days = options['older_than_days']
+
+        if options['dry_run']:
+            count = archivable_orders(older_than_days).count()
+            self.stdout.write(f"{count} orders older than {older_than_days} days would be archived")
+            return
+
+        before = get_table_stats(Order)
+        archived = archive_orders(older_than_days, options['batch_size'])
+
+        if options['vacuum'] and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f"VACUUM ANALYZE {Order._meta.db_table}")
+
+        after = get_table_stats(Order)
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} orders older than {older_than_days} days"))
+        self.stdout.write(
+            f"Hot table: {before['rows']} -> {after['rows']} rows, "
+            f"{format_bytes(before['bytes'])} -> {format_bytes(after['bytes'])}"
+        )
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from orders.models import Order, ArchivedOrder, OrderItem
+
+
+class Command(BaseCommand):
+    help = 'Create OrderItem rows from the items JSON of live and archived orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Orders processed per transaction')
+        parser.add_argument('--rebuild', action='store_true', help='Recreate line items even for orders that already have them')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        for model in [Order, ArchivedOrder]:
+            queryset = model.objects.order_by('pk').only('pk', 'items')
+            if not options['rebuild']:
+                queryset = queryset.exclude(pk__in=OrderItem.objects.values('order_id'))
+
+            processed = created = 0
+            last_pk = 0
+            while True:
+                orders = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+                if not orders:
+                    break
+                last_pk = orders[-1].pk
+
+                with transaction.atomic():
+                    if options['rebuild']:
+                        OrderItem.objects.filter(order_id__in=[order.pk for order in orders]).delete()
+                    line_items = OrderItem.objects.bulk_create([
+                        line_item
+                        for order in orders
+                        for line_item in OrderItem.build_for_order(order)
+                    ])
+                processed += len(orders)
+                created += len(line_items)
+
+            self.stdout.write(self.style.SUCCESS(
+                f"{model._meta.verbose_name_plural}: {created} line items created for {processed} orders"
+            ))
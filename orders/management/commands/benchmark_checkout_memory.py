@@ -0,0 +1,139 @@
+import gc
+import io
+import json
+import tracemalloc
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.request import Request
+from orders.models import PaymentScreenshot
+from orders.screenshots import ScreenshotUploadHandler, get_max_request_bytes, process_screenshot
+from orders.serializers import OrderCreateSerializer
+from orders.utils import send_order_email
+from orders.views import create_order
+from .benchmark_screenshot_upload import PATHS, Rollback, build_body, build_request, make_screenshot
+
+
+MB = 1024 * 1024
+
+
+class StageTracker:
+    """Peak and retained Python allocations of each stage of a request, above what was allocated before it started"""
+
+    def __init__(self):
+        self.baseline = tracemalloc.get_traced_memory()[0]
+        self.stages = []
+
+    def run(self, name, function, *args):
+        tracemalloc.reset_peak()
+        result = function(*args)
+        current, peak = tracemalloc.get_traced_memory()
+        self.stages.append((name, (peak - self.baseline) / MB, (current - self.baseline) / MB))
+        return result
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the peak Python memory (tracemalloc) of each stage of create_order - parsing the body, '
+        'validating it, processing the screenshot and building the admin email - and of the whole request, '
+        'for screenshots of several sizes sent as base64 JSON and as multipart (orders are rolled back)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes-kb', type=int, nargs='+', default=[100, 500, 1000, 2500, 5000, 10000],
+            help='Screenshot file sizes to measure (larger than SCREENSHOT_MAX_BYTES to see a rejection)'
+        )
+        parser.add_argument('--paths', nargs='+', choices=PATHS, default=PATHS)
+
+    @override_settings(
+        EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+        CATALOG_PRICE_MISMATCH_ACTION='flag',
+        ORDER_RATE_IP_BURST=0,
+        ORDER_RATE_CUSTOMER_BURST=0,
+        ORDER_MAX_IN_FLIGHT=0,
+        ADMIN_NOTIFICATION_MODE='immediate',
+    )
+    def handle(self, *args, **options):
+        # A small order first, so imports and caches are not counted
+        for path in options['paths']:
+            self.measure_request(path, make_screenshot(10000))
+
+        self.stdout.write(
+            "Peak MB is the most memory the request held at once during a stage; "
+            "held MB is what it still held afterwards"
+        )
+        self.stdout.write(
+            f"{'path':>9} {'screenshot':>10} {'body MB':>8} {'stage':>11} {'peak MB':>8} {'held MB':>8}"
+        )
+        for size_kb in options['sizes_kb']:
+            screenshot = make_screenshot(size_kb * 1024)
+            for path in options['paths']:
+                content_type, body = build_body(path, screenshot)
+                label = f"{path:>9} {len(screenshot) / MB:>8.2f}MB {len(body) / MB:>8.2f}"
+                if len(body) > get_max_request_bytes(content_type) or len(screenshot) > settings.SCREENSHOT_MAX_BYTES:
+                    status, peak = self.measure_request(path, screenshot)
+                    self.stdout.write(f"{label} {'request':>11} {peak:>8.1f} {'':>8} (status {status}, rejected)")
+                    continue
+                for name, peak, held in self.measure_stages(content_type, body):
+                    self.stdout.write(f"{label} {name:>11} {peak:>8.1f} {held:>8.1f}")
+                status, peak = self.measure_request(path, screenshot)
+                self.stdout.write(f"{label} {'request':>11} {peak:>8.1f} {'':>8} (status {status})")
+
+    def measure_stages(self, content_type, body):
+        """The stages of create_order, run one by one on a request read from a stream"""
+        request = build_request(content_type, io.BytesIO(body), len(body))
+        del body
+        gc.collect()
+        tracemalloc.start()
+        try:
+            tracker = StageTracker()
+            request.upload_handlers = [ScreenshotUploadHandler(request)]
+            request = Request(request, parsers=[JSONParser(), MultiPartParser()])
+
+            def parse():
+                if content_type.startswith('multipart/form-data'):
+                    return json.loads(request.data['order']), request.FILES['paymentScreenshot']
+                return request.data, None
+
+            order_data, upload = tracker.run('parse', parse)
+            serializer = OrderCreateSerializer(data=order_data)
+            tracker.run('validate', serializer.is_valid)
+            data = serializer.validated_data
+            screenshot = tracker.run('screenshot', process_screenshot, upload or data['paymentScreenshot'])
+            notification = {
+                'customerInfo': data['customerInfo'],
+                'totalAmount': str(data['totalAmount']),
+                'paymentScreenshot': screenshot,
+                'items': data['items'],
+            }
+            tracker.run('email', send_order_email, notification, 'ORD-BENCHMARK')
+            return tracker.stages
+        finally:
+            tracemalloc.stop()
+
+    def measure_request(self, path, screenshot):
+        """Status and peak MB of a whole create_order request"""
+        content_type, body = build_body(path, screenshot)
+        request = build_request(content_type, io.BytesIO(body), len(body))
+        del body
+        gc.collect()
+        tracemalloc.start()
+        try:
+            baseline = tracemalloc.get_traced_memory()[0]
+            try:
+                with transaction.atomic():
+                    response = create_order(request)
+                    # Screenshot files are not part of the transaction
+                    for payment_screenshot in PaymentScreenshot.objects.filter(order__order_id=response.data.get('orderId')):
+                        payment_screenshot.image.delete(save=False)
+                        payment_screenshot.thumbnail.delete(save=False)
+                    raise Rollback
+            except Rollback:
+                pass
+            peak = (tracemalloc.get_traced_memory()[1] - baseline) / MB
+        finally:
+            tracemalloc.stop()
+        return response.status_code, peak
@@ -0,0 +1,100 @@
+import statistics
+import threading
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from orders.dbpool import close_pools, get_connection_metrics, reset_connection_metrics
+from orders.models import Order
+
+
+# name -> (CONN_MAX_AGE, use the pool)
+MODES = {
+    'new': (0, False),
+    'persistent': (60, False),
+    'pooled': (0, True),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare a new connection per request, persistent connections and the connection pool '
+        'on the default PostgreSQL database (simulated requests in threads; nothing is written)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent request threads (like gunicorn --threads)')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per thread')
+        parser.add_argument('--queries', type=int, default=3, help='Queries per request')
+        parser.add_argument('--pool-size', type=int, default=4, help='Pool size of the pooled mode')
+        parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+
+    def handle(self, *args, **options):
+        settings_dict = connections.settings[DEFAULT_DB_ALIAS]
+        if not settings_dict['ENGINE'].endswith('postgresql'):
+            raise CommandError(f"[ERROR] Needs a PostgreSQL default database, not {settings_dict['ENGINE']}")
+        try:
+            connections[DEFAULT_DB_ALIAS].ensure_connection()
+        except OperationalError as e:
+            raise CommandError(f"[ERROR] Cannot connect to the database: {e}")
+        original = (settings_dict['CONN_MAX_AGE'], settings_dict.get('POOL'))
+
+        self.stdout.write(
+            f"{options['threads']} threads x {options['requests']} requests, "
+            f"{options['queries']} queries each"
+        )
+        self.stdout.write(
+            f"{'mode':>11} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'opened':>7} "
+            f"{'max open':>9} {'acquire p50':>12} {'acquire p99':>12}"
+        )
+        try:
+            for mode in options['modes']:
+                max_age, pooled = MODES[mode]
+                settings_dict['CONN_MAX_AGE'] = max_age
+                settings_dict['POOL'] = {'MAX_SIZE': options['pool_size'] if pooled else 0, 'TIMEOUT': 30}
+                connections.close_all()
+                close_pools()
+                reset_connection_metrics()
+                self.run_mode(mode, options)
+        finally:
+            settings_dict['CONN_MAX_AGE'], settings_dict['POOL'] = original
+            close_pools()
+
+    def run_mode(self, mode, options):
+        timings = []
+        timings_lock = threading.Lock()
+        max_open = [0]
+
+        def worker():
+            local = []
+            try:
+                for _ in range(options['requests']):
+                    started = time.perf_counter()
+                    # What Django's handler does around every request
+                    request_started.send(sender=self.__class__)
+                    for _ in range(options['queries']):
+                        Order.objects.filter(pk=0).exists()
+                    request_finished.send(sender=self.__class__)
+                    local.append(time.perf_counter() - started)
+                    open_now = get_connection_metrics()[DEFAULT_DB_ALIAS]['open']
+                    max_open[0] = max(max_open[0], open_now)
+            finally:
+                connections.close_all()
+                with timings_lock:
+                    timings.extend(local)
+
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        metrics = get_connection_metrics()[DEFAULT_DB_ALIAS]
+        timings.sort()
+        self.stdout.write(
+            f"{mode:>11} {len(timings) / elapsed:>8.0f} {statistics.median(timings) * 1000:>8.2f} "
+            f"{timings[int(len(timings) * 0.99)] * 1000:>8.2f} {metrics['opened']:>7} {max_open[0]:>9} "
+            f"{metrics.get('acquire_ms_p50', 0):>12.3f} {metrics.get('acquire_ms_p99', 0):>12.3f}"
+        )
@@ -0,0 +1,85 @@
+import statistics
+import time
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from orders.models import Order
+from orders.utils import generate_order_ids
+from orders.views import pending_orders_view
+
+
+class Rollback(Exception):
+    """Raised to discard the benchmark orders"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure pending orders page render time with a cold and a warm order card cache '
+        '(benchmark orders are created and rolled back in one transaction)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--counts', type=int, nargs='+', default=[50, 500, 5000], help='Numbers of pending orders to render')
+        parser.add_argument('--repeat', type=int, default=5, help='Renders per measurement (the median is reported)')
+
+    def handle(self, *args, **options):
+        request = RequestFactory().get('/pending-orders.html')
+        request.session = {'is_admin': True, 'admin_username': 'benchmark'}
+        request.user = AnonymousUser()
+
+        self.stdout.write(f"{'orders':>8} {'cold ms':>10} {'warm ms':>10} {'speedup':>8} {'queries':>8} {'page KB':>8}")
+        for count in options['counts']:
+            try:
+                with transaction.atomic():
+                    self.create_orders(count)
+                    cold = self.measure(request, options['repeat'], clear_cache=True)
+                    warm = self.measure(request, options['repeat'], clear_cache=False)
+                    raise Rollback
+            except Rollback:
+                pass
+
+            self.stdout.write(
+                f"{count:>8} {cold['ms']:>10.1f} {warm['ms']:>10.1f} {cold['ms'] / warm['ms']:>7.1f}x "
+                f"{warm['queries']:>8} {warm['bytes'] / 1024:>8.0f}"
+            )
+
+    def create_orders(self, count):
+        """Pending orders shaped like storefront orders, inside the caller's transaction"""
+        Order.objects.filter(status='pending').delete()
+        now = timezone.now()
+        items = [
+            {'product': 'Kulfi', 'flavor': 'Badam', 'quantity': 2, 'unitPrice': 30, 'price': 60},
+            {'product': 'Cone', 'flavor': 'Chocolate', 'quantity': 1, 'unitPrice': 45, 'price': 45},
+        ]
+        Order.objects.bulk_create([
+            Order(
+                order_id=order_id,
+                full_name='Benchmark Customer',
+                email='benchmark@example.com',
+                phone='9876543210',
+                delivery_address='12 Example Street, Mumbai',
+                pincode='400001',
+                items=items,
+                total_amount=105,
+                payment_screenshot='data:image/png;base64,' + 'A' * 20000,
+                payment_status='pending_verification',
+                order_date=now,
+            )
+            for order_id in generate_order_ids(count)
+        ], batch_size=1000)
+
+    def measure(self, request, repeat, clear_cache):
+        """Median render time of the pending orders page"""
+        timings = []
+        for _ in range(repeat):
+            if clear_cache:
+                caches['order_fragments'].clear()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = pending_orders_view(request)
+                timings.append((time.perf_counter() - started) * 1000)
+        return {'ms': statistics.median(timings), 'queries': len(queries), 'bytes': len(response.content)}
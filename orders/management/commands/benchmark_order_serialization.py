@@ -0,0 +1,119 @@
+import json
+import statistics
+import time
+import tracemalloc
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from orders.models import Order
+from orders.renderers import FastJSONRenderer, orjson
+from orders.serializers import OrderRowSerializer, OrderSerializer
+from orders.utils import generate_order_ids
+
+
+class Rollback(Exception):
+    """Raised to discard the benchmark orders"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare serialize+render time and allocations of the order list with OrderSerializer '
+        'and OrderRowSerializer, and with the stock and orjson renderers '
+        '(benchmark orders are created and rolled back in one transaction)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--counts', type=int, nargs='+', default=[1000, 10000], help='Numbers of orders to serialize')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement (the median is reported)')
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write('[WARNING] orjson is not installed, FastJSONRenderer falls back to the stock renderer')
+
+        paths = [
+            ('OrderSerializer + JSONRenderer', self.model_serializer, JSONRenderer()),
+            ('OrderSerializer + FastJSONRenderer', self.model_serializer, FastJSONRenderer()),
+            ('OrderRowSerializer + JSONRenderer', self.row_serializer, JSONRenderer()),
+            ('OrderRowSerializer + FastJSONRenderer', self.row_serializer, FastJSONRenderer()),
+        ]
+
+        for count in options['counts']:
+            self.stdout.write(f"\n{count} orders")
+            self.stdout.write(f"{'path':>40} {'ms':>9} {'speedup':>8} {'peak MB':>8} {'blocks':>9}")
+            try:
+                with transaction.atomic():
+                    self.create_orders(count)
+                    baseline = None
+                    reference = None
+                    for name, serialize, renderer in paths:
+                        content = renderer.render({'orders': serialize()})
+                        # Every path must produce the same document
+                        if reference is None:
+                            reference = json.loads(content)
+                        elif json.loads(content) != reference:
+                            self.stdout.write(f"[ERROR] {name} does not match OrderSerializer output")
+
+                        ms = self.measure(serialize, renderer, options['repeat'])
+                        peak, blocks = self.measure_allocations(serialize, renderer)
+                        baseline = baseline or ms
+                        self.stdout.write(
+                            f"{name:>40} {ms:>9.1f} {baseline / ms:>7.1f}x "
+                            f"{peak / (1024 * 1024):>8.1f} {blocks:>9}"
+                        )
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def model_serializer(self):
+        return OrderSerializer(Order.objects.all(), many=True).data
+
+    def row_serializer(self):
+        return OrderRowSerializer(Order.objects.all(), many=True).data
+
+    def create_orders(self, count):
+        """Orders shaped like storefront orders, inside the caller's transaction"""
+        Order.objects.all().delete()
+        now = timezone.now()
+        items = [
+            {'product': 'Kulfi', 'flavor': 'Badam', 'quantity': 2, 'unitPrice': 30, 'price': 60},
+            {'product': 'Cone', 'flavor': 'Chocolate', 'quantity': 1, 'unitPrice': 45, 'price': 45},
+        ]
+        Order.objects.bulk_create([
+            Order(
+                order_id=order_id,
+                full_name='Benchmark Customer',
+                email='benchmark@example.com',
+                phone='9876543210',
+                delivery_address='12 Example Street, Mumbai',
+                pincode='400001',
+                items=items,
+                total_amount=105,
+                payment_screenshot='',
+                payment_status='pending_verification',
+                order_date=now,
+            )
+            for order_id in generate_order_ids(count)
+        ], batch_size=1000)
+
+    def measure(self, serialize, renderer, repeat):
+        """Median milliseconds to query, serialize and render every order"""
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            renderer.render({'orders': serialize()})
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    def measure_allocations(self, serialize, renderer):
+        """Peak traced memory and number of allocated blocks still alive at the peak"""
+        tracemalloc.start()
+        try:
+            data = serialize()
+            content = renderer.render({'orders': data})
+            blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        del data, content
+        return peak, blocks
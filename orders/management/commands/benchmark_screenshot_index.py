@@ -0,0 +1,94 @@
+import random
+import statistics
+import sys
+import time
+from django.core.management.base import BaseCommand
+from orders.phash import HASH_BITS, MultiIndexHash
+
+
+def flip_bits(value, count, rng):
+    for bit in rng.sample(range(HASH_BITS), count):
+        value ^= 1 << bit
+    return value
+
+
+def index_size(index):
+    """Approximate bytes held by a MultiIndexHash"""
+    size = sys.getsizeof(index.hashes) + sys.getsizeof(index.values)
+    for table in index.tables:
+        size += sys.getsizeof(table) + sum(sys.getsizeof(bucket) for bucket in table.values())
+    return size
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure screenshot band hash lookup latency in the multi-index hash '
+        '(synthetic hashes, nothing is read from or written to the database)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=1000000, help='Number of stored band hashes')
+        parser.add_argument('--queries', type=int, default=2000, help='Lookups per measurement')
+        parser.add_argument('--radius', type=int, default=2, help='Hamming distance of a match')
+        parser.add_argument('--common-share', type=float, default=0.3, help='Share of stored hashes that are app layout bands')
+        parser.add_argument('--common-limit', type=int, default=50, help='Matches after which a band counts as common')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        size = options['size']
+        radius = options['radius']
+
+        # Most bands are unique (amounts, times, transaction IDs); the rest are
+        # noisy copies of a few layout bands that every screenshot of an app has
+        layout_bands = [rng.getrandbits(HASH_BITS) for _ in range(20)]
+        common = int(size * options['common_share'])
+
+        index = MultiIndexHash()
+        stored = []
+        start = time.perf_counter()
+        for value in range(size):
+            if value < common:
+                value_hash = flip_bits(rng.choice(layout_bands), rng.randint(0, radius), rng)
+            else:
+                value_hash = rng.getrandbits(HASH_BITS)
+                stored.append(value_hash)
+            index.add(value_hash, value)
+        build_seconds = time.perf_counter() - start
+        self.stdout.write(
+            f"Indexed {size:,} hashes in {build_seconds:.1f} s, "
+            f"~{index_size(index) / (1024 * 1024):.0f} MB"
+        )
+
+        queries = options['queries']
+        workloads = [
+            ('reused band', [flip_bits(rng.choice(stored), rng.randint(0, radius), rng) for _ in range(queries)]),
+            ('new band', [rng.getrandbits(HASH_BITS) for _ in range(queries)]),
+            ('layout band', [flip_bits(rng.choice(layout_bands), 1, rng) for _ in range(queries)]),
+        ]
+
+        self.stdout.write(f"{'query':>12} {'p50 us':>9} {'p99 us':>9} {'matched':>8} {'common':>8}")
+        for name, hashes in workloads:
+            timings = []
+            matched = common_bands = 0
+            for value_hash in hashes:
+                start = time.perf_counter()
+                values = index.search(value_hash, radius, limit=options['common_limit'])
+                timings.append((time.perf_counter() - start) * 1000000)
+                if values is None:
+                    common_bands += 1
+                elif values:
+                    matched += 1
+            timings.sort()
+            self.stdout.write(
+                f"{name:>12} {statistics.median(timings):>9.1f} {timings[int(len(timings) * 0.99)]:>9.1f} "
+                f"{matched / len(hashes):>8.1%} {common_bands / len(hashes):>8.1%}"
+            )
+
+        # For comparison: comparing against every stored hash
+        sample = workloads[0][1][:20]
+        start = time.perf_counter()
+        for value_hash in sample:
+            [value for value in index.hashes if (value ^ value_hash).bit_count() <= radius]
+        linear_us = (time.perf_counter() - start) / len(sample) * 1000000
+        self.stdout.write(f"{'linear scan':>12} {linear_us:>9.1f}")
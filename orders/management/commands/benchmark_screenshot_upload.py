@@ -0,0 +1,162 @@
+import base64
+import gc
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from django.contrib.auth.models import AnonymousUser
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils import timezone
+from PIL import Image
+from orders.models import PaymentScreenshot
+from orders.views import create_order
+
+
+PATHS = ['json', 'multipart']
+
+
+class Rollback(Exception):
+    """Raised to discard the benchmark order"""
+
+
+def make_screenshot(size_bytes):
+    """PNG of about size_bytes: a noisy (incompressible) area on a white phone-sized screen"""
+    width = 1080
+    noise_rows = max(1, size_bytes // (3 * width))
+    image = Image.new('RGB', (width, max(2400, noise_rows)), 'white')
+    noise = Image.frombytes('RGB', (width, noise_rows), random.Random(1).randbytes(3 * width * noise_rows))
+    image.paste(noise, (0, 0))
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG', compress_level=1)
+    return buffer.getvalue()
+
+
+def build_body(path, screenshot):
+    """Content type and request body of an order as the payment page sends it"""
+    order = {
+        'customerInfo': {
+            'fullName': 'Benchmark Customer',
+            'email': 'benchmark@example.com',
+            'phone': '9876543210',
+            'deliveryAddress': '12 Example Street, Mumbai',
+            'pincode': '400001',
+        },
+        'items': [{'product': 'Kulfi', 'flavor': 'Badam', 'quantity': 1, 'unitPrice': 30, 'price': 30}],
+        'totalAmount': 30,
+        'orderDate': timezone.now().isoformat(),
+        'paymentStatus': 'pending_verification',
+    }
+    if path == 'json':
+        order['paymentScreenshot'] = 'data:image/png;base64,' + base64.b64encode(screenshot).decode()
+        return 'application/json', json.dumps(order).encode()
+    upload = SimpleUploadedFile('screenshot.png', screenshot, content_type='image/png')
+    return MULTIPART_CONTENT, encode_multipart(BOUNDARY, {'order': json.dumps(order), 'paymentScreenshot': upload})
+
+
+def build_request(content_type, stream, length):
+    """POST /api/orders/ reading its body from stream, as a WSGI server would"""
+    request = WSGIRequest({
+        'REQUEST_METHOD': 'POST',
+        'PATH_INFO': '/api/orders/',
+        'SCRIPT_NAME': '',
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'CONTENT_TYPE': content_type,
+        'CONTENT_LENGTH': str(length),
+        'wsgi.input': stream,
+        'wsgi.url_scheme': 'http',
+    })
+    request.user = AnonymousUser()
+    return request
+
+
+def max_rss_mb():
+    """Process high-water RSS (ru_maxrss is in KB on Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare peak memory of create_order for a base64 JSON and a multipart screenshot upload '
+        '(each measurement runs in a fresh process reading the body from a file; the order is rolled back)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=float, default=5, help='Size of the screenshot file')
+        parser.add_argument('--path', choices=PATHS, help='Measure one path in this process (used internally)')
+        parser.add_argument('--body-file', help='Request body to send (used internally)')
+        parser.add_argument('--trace', action='store_true', help='Report the tracemalloc peak instead of RSS (used internally)')
+
+    def handle(self, *args, **options):
+        if options['path']:
+            result = self.measure(options['path'], options['body_file'], options['trace'])
+            self.stdout.write(json.dumps(result))
+            return
+
+        screenshot = make_screenshot(int(options['size_mb'] * 1024 * 1024))
+        self.stdout.write(f"{len(screenshot) / (1024 * 1024):.1f} MB screenshot")
+        self.stdout.write(f"{'path':>10} {'status':>7} {'body MB':>8} {'peak RSS +MB':>13} {'python peak MB':>15}")
+        for path in PATHS:
+            _, body = build_body(path, screenshot)
+            with tempfile.NamedTemporaryFile(delete=False) as handle:
+                handle.write(body)
+            results = {'body_mb': len(body) / (1024 * 1024)}
+            try:
+                for trace in (False, True):
+                    command = [sys.executable, sys.argv[0], 'benchmark_screenshot_upload', '--path', path, '--body-file', handle.name]
+                    if trace:
+                        command.append('--trace')
+                    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+                    results.update(json.loads(output.strip().splitlines()[-1]))
+            finally:
+                os.remove(handle.name)
+            self.stdout.write(
+                f"{path:>10} {results['status']:>7} {results['body_mb']:>8.1f} "
+                f"{results['rss_mb']:>13.1f} {results['python_mb']:>15.1f}"
+            )
+
+    @override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', CATALOG_PRICE_MISMATCH_ACTION='flag')
+    def measure(self, path, body_file, trace):
+        # A small order first, so imports and caches are not counted
+        content_type, body = build_body(path, make_screenshot(10000))
+        self.create_order(build_request(content_type, io.BytesIO(body), len(body)))
+        del body
+        gc.collect()
+
+        result = {}
+        with open(body_file, 'rb') as stream:
+            request = build_request(content_type, stream, os.path.getsize(body_file))
+            if trace:
+                tracemalloc.start()
+            before = max_rss_mb()
+            result['status'] = self.create_order(request)
+            if trace:
+                result['python_mb'] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+                tracemalloc.stop()
+            else:
+                result['rss_mb'] = max_rss_mb() - before
+        return result
+
+    def create_order(self, request):
+        """Run create_order and roll back everything it stored"""
+        try:
+            with transaction.atomic():
+                response = create_order(request)
+                # Screenshot files are not part of the transaction
+                for screenshot in PaymentScreenshot.objects.filter(order__order_id=response.data.get('orderId')):
+                    screenshot.image.delete(save=False)
+                    screenshot.thumbnail.delete(save=False)
+                raise Rollback
+        except Rollback:
+            pass
+        return response.status_code
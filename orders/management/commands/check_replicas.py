@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, DatabaseError
+from orders.models import Order
+from orders.routers import check_replica
+
+
+class Command(BaseCommand):
+    help = 'Show whether each read replica is usable, how far it lags and how many orders it has'
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            self.stdout.write('[WARNING] No replicas configured (DB_REPLICAS), all reads use the primary')
+            return
+
+        primary_orders = Order.objects.using(DEFAULT_DB_ALIAS).count()
+        self.stdout.write(f"{'database':>12} {'status':>8} {'lag s':>8} {'orders':>8}  error")
+        self.stdout.write(f"{DEFAULT_DB_ALIAS:>12} {'primary':>8} {'':>8} {primary_orders:>8}")
+        for alias in settings.DATABASE_REPLICAS:
+            status = check_replica(alias)
+            try:
+                orders = Order.objects.using(alias).count()
+            except DatabaseError:
+                orders = '-'
+            lag = '-' if status['lag_seconds'] is None else status['lag_seconds']
+            self.stdout.write(
+                f"{alias:>12} {'OK' if status['healthy'] else 'SKIPPED':>8} {lag:>8} {orders:>8}  {status['error']}"
+            )
@@ -0,0 +1,45 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from orders.export import EXPORT_FORMATS, stream_export
+
+
+class Command(BaseCommand):
+    help = 'Stream orders as CSV or NDJSON to a file or stdout'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--per', choices=['order', 'item'], default='order', help='One row per order or per line item')
+        parser.add_argument('--start', help='First order date to include (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last order date to include (YYYY-MM-DD)')
+        parser.add_argument('--status', action='append', default=[], help='Only include this status (repeatable)')
+        parser.add_argument('--no-archived', action='store_true', help='Skip archived orders')
+        parser.add_argument('--output', '-o', help='Output file (defaults to stdout)')
+
+    def handle(self, *args, **options):
+        dates = {}
+        for name in ['start', 'end']:
+            value = options[name]
+            try:
+                dates[name] = parse_date(value) if value else None
+            except ValueError:
+                dates[name] = None
+            if value and not dates[name]:
+                raise CommandError(f"--{name} must be a date in YYYY-MM-DD format")
+
+        content = stream_export(
+            options['format'],
+            start=dates['start'],
+            end=dates['end'],
+            statuses=options['status'],
+            per=options['per'],
+            include_archived=not options['no_archived']
+        )
+
+        output = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            for chunk in content:
+                output.write(chunk)
+        finally:
+            if options['output']:
+                output.close()
@@ -0,0 +1,45 @@
+import time
+from django.core.management.base import BaseCommand
+from orders.importer import import_orders, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Bulk import historical orders from CSV or NDJSON without sending any notification'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (export_orders columns) or NDJSON file')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows validated and inserted per transaction')
+        parser.add_argument('--no-copy', action='store_true', help='Use bulk_create even on PostgreSQL')
+        parser.add_argument('--dry-run', action='store_true', help='Validate rows without inserting them')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or ('csv' if options['path'].endswith('.csv') else 'ndjson')
+        rows = read_rows(options['path'], file_format)
+
+        imported = skipped = failed = 0
+        started = time.perf_counter()
+        for progress in import_orders(
+            rows,
+            chunk_size=options['chunk_size'],
+            use_copy=not options['no_copy'],
+            dry_run=options['dry_run']
+        ):
+            imported += progress['imported']
+            skipped += progress['skipped']
+            failed += len(progress['errors'])
+            for row_number, errors in progress['errors']:
+                self.stderr.write(f"[ERROR] Row {row_number}: {errors}")
+
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{imported} imported, {skipped} duplicates skipped, {failed} invalid ({imported / elapsed:.0f} rows/s)")
+
+        elapsed = time.perf_counter() - started
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {imported} orders in {elapsed:.2f}s ({imported / elapsed if elapsed else 0:.0f} rows/s), "
+            f"{skipped} duplicates skipped, {failed} invalid rows"
+        ))
+        if imported and not options['dry_run']:
+            # Their created events are folded in like those of new orders
+            self.stdout.write("The next refresh_analytics run includes them in analytics")
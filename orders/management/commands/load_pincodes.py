@@ -0,0 +1,44 @@
+import csv
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from orders.models import DeliveryZone, ServiceablePincode
+from orders.serviceability import normalize_pincode, pincode_index
+from orders.snapshots import bump_version
+
+
+class Command(BaseCommand):
+    help = 'Load serviceable pincodes and their delivery zones from a CSV file with pincode,zone columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with a header row containing pincode and zone')
+        parser.add_argument('--replace', action='store_true', help='Deactivate pincodes that are not in the file')
+
+    def handle(self, *args, **options):
+        with open(options['path'], newline='', encoding='utf-8') as handle:
+            rows = [(normalize_pincode(row['pincode']), row['zone'].strip()) for row in csv.DictReader(handle)]
+        if not rows:
+            raise CommandError('No pincodes found')
+
+        with transaction.atomic():
+            zones = {zone.name: zone for zone in DeliveryZone.objects.all()}
+            for _, zone_name in rows:
+                if zone_name not in zones:
+                    zones[zone_name] = DeliveryZone.objects.create(name=zone_name)
+
+            # bulk_create does not send signals, so the version is bumped explicitly below
+            ServiceablePincode.objects.bulk_create(
+                [ServiceablePincode(pincode=pincode, zone=zones[zone_name], is_active=True) for pincode, zone_name in rows],
+                update_conflicts=True,
+                unique_fields=['pincode'],
+                update_fields=['zone', 'is_active']
+            )
+            deactivated = 0
+            if options['replace']:
+                deactivated = ServiceablePincode.objects.exclude(
+                    pincode__in=[pincode for pincode, _ in rows]
+                ).update(is_active=False)
+            bump_version(pincode_index.name)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {len(rows)} pincodes in {len({zone for _, zone in rows})} zones, {deactivated} deactivated"
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from orders.invoices import get_media_usage
+from .archive_orders import format_bytes
+
+
+class Command(BaseCommand):
+    help = 'Report disk usage of the media volumes per category'
+
+    def handle(self, *args, **options):
+        usage = get_media_usage()
+        self.stdout.write(f"{'category':<24} {'files':>8} {'size':>10}")
+        for category, files, size in usage:
+            self.stdout.write(f"{category:<24} {files:>8} {format_bytes(size):>10}")
+        self.stdout.write(
+            f"{'total':<24} {sum(files for _, files, _ in usage):>8} "
+            f"{format_bytes(sum(size for _, _, size in usage)):>10}"
+        )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from orders.invoices import move_flat_invoices
+
+
+class Command(BaseCommand):
+    help = 'Move invoices from the old flat MEDIA_ROOT/invoices/ directory into the sharded layout'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many invoices would be moved')
+
+    def handle(self, *args, **options):
+        moved = move_flat_invoices(dry_run=options['dry_run'])
+        if options['dry_run']:
+            self.stdout.write(f"{moved} invoices would be moved")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Moved {moved} invoices"))
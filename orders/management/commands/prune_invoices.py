@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from orders.invoices import prune_invoices
+from .archive_orders import format_bytes
+
+
+class Command(BaseCommand):
+    help = 'Gzip old invoice PDFs and delete the oldest (they are regenerated when downloaded)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--compress-after-days', type=int, default=settings.INVOICE_COMPRESS_AFTER_DAYS,
+            help='Gzip invoices generated more than this many days ago (0 to never compress)'
+        )
+        parser.add_argument(
+            '--delete-after-days', type=int, default=settings.INVOICE_RETENTION_DAYS,
+            help='Delete invoices generated more than this many days ago (0 to keep them)'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be compressed or deleted')
+
+    def handle(self, *args, **options):
+        result = prune_invoices(options['compress_after_days'], options['delete_after_days'], dry_run=options['dry_run'])
+        if options['dry_run']:
+            self.stdout.write(
+                f"{result['compressed']} invoices would be compressed and {result['deleted']} deleted "
+                f"(deleting frees {format_bytes(result['bytes_freed'])})"
+            )
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Compressed {result['compressed']} and deleted {result['deleted']} invoices, "
+            f"freeing {format_bytes(result['bytes_freed'])}"
+        ))
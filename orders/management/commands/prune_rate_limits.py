@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from orders.ratelimit import prune_buckets
+
+
+class Command(BaseCommand):
+    help = 'Delete order rate limit buckets that have refilled completely'
+
+    def handle(self, *args, **options):
+        deleted = prune_buckets()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} rate limit buckets"))
@@ -0,0 +1,20 @@
+import time
+from django.core.management.base import BaseCommand
+from orders.analytics import refresh_rollups
+
+
+class Command(BaseCommand):
+    help = 'Fold order events recorded since the last run into the sales rollup tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Recompute all rollups from the live and archived orders'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        processed = refresh_rollups(rebuild=options['rebuild'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rolled up {processed} orders in {time.perf_counter() - started:.2f}s"
+        ))
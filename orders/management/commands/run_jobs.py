@@ -0,0 +1,36 @@
+import time
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+
+class Command(BaseCommand):
+    help = 'Run the management commands listed in settings.SCHEDULED_JOBS at their configured intervals'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run every job once and exit')
+
+    def handle(self, *args, **options):
+        next_run = {name: 0.0 for name in settings.SCHEDULED_JOBS}
+
+        while True:
+            for name, job in settings.SCHEDULED_JOBS.items():
+                if time.time() < next_run[name]:
+                    continue
+
+                self.stdout.write(f"[JOB] Running {name}")
+                try:
+                    call_command(job['command'], *job.get('args', []))
+                except Exception as e:
+                    self.stderr.write(f"[ERROR] Job {name} failed: {e}")
+                finally:
+                    close_old_connections()
+                next_run[name] = time.time() + job['interval']
+
+            if options['once']:
+                return
+            if not next_run:
+                time.sleep(60)
+                continue
+            time.sleep(max(0, min(next_run.values()) - time.time()))
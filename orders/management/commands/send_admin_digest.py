@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from orders.digest import send_admin_digest
+
+
+class Command(BaseCommand):
+    help = 'Email the orders queued for the admin digest once a batch is due'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Send everything that is queued, due or not')
+
+    def handle(self, *args, **options):
+        sent = send_admin_digest(force=options['force'])
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent} queued orders"))
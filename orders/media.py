@@ -0,0 +1,221 @@
+"""
+Responsive image variants and video renditions generated at collectstatic time
+
+Images matching MEDIA_IMAGE_VARIANTS get resized copies in their own format
+plus WebP (and AVIF when pillow-avif-plugin is installed); videos get a poster
+frame and lower-bitrate renditions when ffmpeg is available. Everything that
+was generated is listed in MEDIA_MANIFEST_NAME inside STATIC_ROOT, which the
+media template tags read to build <picture>/<video> markup.
+"""
+import json
+import os
+import shutil
+import subprocess
+from django.conf import settings
+from PIL import Image
+
+try:
+    import pillow_avif  # noqa: F401 - registers the AVIF plugin with Pillow
+except ImportError:  # optional, WebP is always available
+    pillow_avif = None
+
+
+MEDIA_MANIFEST_NAME = 'media-variants.json'
+
+IMAGE_EXTENSIONS = {'.png': 'png', '.jpg': 'jpeg', '.jpeg': 'jpeg'}
+
+VIDEO_EXTENSIONS = {'.mp4'}
+
+
+def get_image_options(name):
+    """Variant options for a static path, or None if it gets no variants"""
+    for prefix, options in settings.MEDIA_IMAGE_VARIANTS.items():
+        if name.startswith(prefix):
+            return options
+    return None
+
+
+def get_image_formats():
+    """Modern formats Pillow can write here, best first"""
+    formats = ['webp']
+    if 'AVIF' in Image.SAVE:
+        formats.insert(0, 'avif')
+    return formats
+
+
+def variant_name(name, suffix, extension):
+    """'asset/icimg/kulfi.png', '-640w', 'webp' -> 'asset/icimg/kulfi-640w.webp'"""
+    return f"{os.path.splitext(name)[0]}{suffix}.{extension}"
+
+
+def is_up_to_date(source_path, target_path):
+    """Skip regenerating a variant that is newer than its source"""
+    return os.path.exists(target_path) and os.path.getmtime(target_path) >= os.path.getmtime(source_path)
+
+
+def save_image(image, path, image_format, options):
+    """Write one variant with settings suited to its format"""
+    lossless = options.get('lossless', False)
+    quality = options.get('quality', 80)
+    if image_format == 'png':
+        image.save(path, 'PNG', optimize=True)
+    elif image_format == 'jpeg':
+        image.convert('RGB').save(path, 'JPEG', quality=95 if lossless else quality, optimize=True, progressive=True)
+    elif image_format == 'webp':
+        image.save(path, 'WEBP', lossless=lossless, quality=100 if lossless else quality, method=6)
+    else:
+        image.save(path, 'AVIF', quality=100 if lossless else quality - 20, speed=4)
+
+
+def generate_image_variants(storage, name, options):
+    """
+    Resize and re-encode one image
+
+    Widths larger than the original are skipped; the original width is always
+    produced in every modern format. Modern variants that are not smaller than
+    the original format at the same width are dropped.
+
+    Returns:
+        Manifest entry with the image size, the fallback 'src' and one srcset
+        list per format, and the list of generated static paths
+    """
+    source_path = storage.path(name)
+    original_format = IMAGE_EXTENSIONS[os.path.splitext(name)[1].lower()]
+    extension = os.path.splitext(name)[1].lstrip('.').lower()
+    generated = []
+
+    with Image.open(source_path) as original:
+        original.load()
+        width, height = original.size
+        widths = sorted({w for w in options.get('widths', []) if w < width} | {width})
+        entry = {'width': width, 'height': height, 'src': name, 'srcset': {}}
+
+        for target_width in widths:
+            resized = original
+            if target_width != width:
+                resized = original.resize((target_width, round(height * target_width / width)), Image.LANCZOS)
+
+            # The original format comes first so modern formats can be compared against it
+            suffix = f'-{target_width}w' if target_width != width else ''
+            reference_path = source_path
+            if target_width != width:
+                target = variant_name(name, suffix, extension)
+                reference_path = storage.path(target)
+                if not is_up_to_date(source_path, reference_path):
+                    save_image(resized, reference_path, original_format, options)
+                generated.append(target)
+                entry['srcset'].setdefault(original_format, []).append([target, target_width])
+
+            for image_format in get_image_formats():
+                target = variant_name(name, suffix, image_format)
+                target_path = storage.path(target)
+                if not is_up_to_date(source_path, target_path):
+                    save_image(resized, target_path, image_format, options)
+                # e.g. lossless WebP of a small JPEG can come out larger than the JPEG
+                if os.path.getsize(target_path) >= os.path.getsize(reference_path):
+                    os.remove(target_path)
+                    continue
+                generated.append(target)
+                entry['srcset'].setdefault(image_format, []).append([target, target_width])
+
+        # Browsers without WebP/AVIF get the largest resized copy rather than the full original
+        fallbacks = entry['srcset'].get(original_format, [])
+        if fallbacks:
+            entry['src'] = fallbacks[-1][0]
+        entry['srcset'].setdefault(original_format, []).append([name, width])
+
+    return entry, generated
+
+
+def run_ffmpeg(arguments):
+    """Run ffmpeg quietly, raising CalledProcessError on failure"""
+    subprocess.run(
+        [settings.MEDIA_FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-y', *arguments],
+        check=True,
+        timeout=settings.MEDIA_FFMPEG_TIMEOUT
+    )
+
+
+def generate_video_variants(storage, name):
+    """
+    Extract a poster frame and encode lower-bitrate renditions of one video
+
+    Renditions are H.264 with the moov atom at the start (faststart), so
+    playback can begin before the whole file is downloaded.
+
+    Returns:
+        Manifest entry with 'poster' and 'renditions' (largest first), and
+        the list of generated static paths
+    """
+    source_path = storage.path(name)
+    generated = []
+    entry = {'src': name, 'poster': None, 'renditions': []}
+
+    poster = variant_name(name, '-poster', 'jpg')
+    if not is_up_to_date(source_path, storage.path(poster)):
+        run_ffmpeg(['-ss', '1', '-i', source_path, '-frames:v', '1', '-q:v', '4', storage.path(poster)])
+    generated.append(poster)
+    entry['poster'] = poster
+
+    for rendition in sorted(settings.MEDIA_VIDEO_RENDITIONS, key=lambda r: r['height'], reverse=True):
+        target = variant_name(name, f"-{rendition['height']}p", 'mp4')
+        if not is_up_to_date(source_path, storage.path(target)):
+            run_ffmpeg([
+                '-i', source_path,
+                '-vf', f"scale=-2:{rendition['height']}",
+                '-c:v', 'libx264', '-preset', 'slow', '-b:v', rendition['bitrate'],
+                '-maxrate', rendition['bitrate'], '-bufsize', rendition['bitrate'],
+                '-pix_fmt', 'yuv420p', '-an', '-movflags', '+faststart',
+                storage.path(target)
+            ])
+        generated.append(target)
+        entry['renditions'].append({
+            'src': target,
+            'height': rendition['height'],
+            'min_width': rendition.get('min_width')
+        })
+
+    return entry, generated
+
+
+def generate_media_variants(storage, names):
+    """
+    Generate variants for every collected image and video
+
+    Args:
+        storage: Staticfiles storage writing to STATIC_ROOT
+        names: Static paths that were just collected
+
+    Returns:
+        List of generated static paths, to be hashed and compressed like any
+        other static file
+    """
+    manifest = {'images': {}, 'videos': {}}
+    generated = []
+    ffmpeg = shutil.which(settings.MEDIA_FFMPEG_BINARY)
+
+    for name in sorted(names):
+        extension = os.path.splitext(name)[1].lower()
+        if extension in IMAGE_EXTENSIONS:
+            options = get_image_options(name)
+            if options is None:
+                continue
+            entry, files = generate_image_variants(storage, name, options)
+            manifest['images'][name] = entry
+            generated += files
+        elif extension in VIDEO_EXTENSIONS:
+            if ffmpeg is None:
+                print(f"[WARNING] ffmpeg not found, skipping poster and renditions for {name}")
+                continue
+            try:
+                entry, files = generate_video_variants(storage, name)
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+                print(f"[ERROR] Failed to encode {name}: {e}")
+                continue
+            manifest['videos'][name] = entry
+            generated += files
+
+    with open(storage.path(MEDIA_MANIFEST_NAME), 'w', encoding='utf-8') as handle:
+        json.dump(manifest, handle, indent=2, sort_keys=True)
+    print(f"[SUCCESS] Generated {len(generated)} media variants")
+    return generated
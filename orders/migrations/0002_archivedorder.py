@@ -0,0 +1,41 @@
+# Generated by Django 5.0.1 on 2026-10-19 04:39
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.CharField(db_index=True, max_length=50, unique=True)),
+                ('full_name', models.CharField(max_length=255)),
+                ('email', models.EmailField(db_index=True, max_length=254)),
+                ('phone', models.CharField(max_length=20)),
+                ('delivery_address', models.TextField()),
+                ('pincode', models.CharField(max_length=10)),
+                ('alternate_phone', models.CharField(blank=True, max_length=20, null=True)),
+                ('items', models.JSONField()),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('payment_screenshot', models.TextField(blank=True, null=True)),
+                ('payment_status', models.CharField(choices=[('pending', 'Pending'), ('pending_verification', 'Pending Verification'), ('verified', 'Verified'), ('failed', 'Failed')], db_index=True, default='pending', max_length=50)),
+                ('order_date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('processing', 'Processing'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled')], db_index=True, default='pending', max_length=50)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Archived Order',
+                'verbose_name_plural': 'Archived Orders',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.1 on 2026-10-19 04:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_archivedorder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField(default=0)),
+                ('product', models.CharField(db_index=True, max_length=255)),
+                ('flavor', models.CharField(blank=True, db_index=True, max_length=255)),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('order', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='line_items', to='orders.order')),
+            ],
+            options={
+                'verbose_name': 'Order Item',
+                'verbose_name_plural': 'Order Items',
+                'ordering': ['order_id', 'position'],
+                'indexes': [models.Index(fields=['product', 'flavor'], name='orders_orde_product_709739_idx')],
+            },
+        ),
+    ]
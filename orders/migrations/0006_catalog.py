@@ -0,0 +1,69 @@
+# Generated by Django 5.0.1 on 2026-10-19 04:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# The menu as it was hardcoded in the storefront: product -> [(flavor or size, unit price)]
+MENU = [
+    ('Kulfi', [('Badam', 30), ('Mava', 30), ('Guava', 30), ('Gulkand', 30), ('Rabdi', 30)]),
+    ('Cup Ice Cream', [('Vanilla', 10), ('Pista', 10), ('Butterscotch', 10), ('Strawberry', 10), ('Mango', 10)]),
+    ('Chocbar', [('Chocobar', 20), ('Nutty Chocobar', 40)]),
+    ('Dolly', [('Mango', 20), ('Strawberry', 20)]),
+    ('Cone', [('Butterscotch', 40), ('Vanilla', 40), ('Strawberry', 40), ('Chocolate', 45), ('Black Currant', 50)]),
+    ('Gadbad', [('Mini Gudbud', 20), ('Sundae Gudbud', 30), ('Tango Gudbud', 50), ('Deluxe Gudbud', 60)]),
+    ('Scoop Ice Cream', [
+        ('Sithapal', 20), ('Gulkand', 20), ('Anjeer', 20), ('Kesar Pista', 20), ('Chikoo', 20),
+        ('Rababi', 20), ('Guava', 20), ('Rajbhog', 20), ('Shahi Gulab', 20), ('Pan', 20),
+    ]),
+    ('Family Pack', [('Half Liter', 120), ('1 Liter', 200)]),
+]
+
+
+def seed_catalog(apps, schema_editor):
+    Product = apps.get_model('orders', 'Product')
+    Flavor = apps.get_model('orders', 'Flavor')
+    for product_position, (product_name, flavors) in enumerate(MENU):
+        product = Product.objects.create(name=product_name, sort_order=product_position)
+        Flavor.objects.bulk_create([
+            Flavor(product=product, name=name, price=price, sort_order=position)
+            for position, (name, price) in enumerate(flavors)
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_delivery_zones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Product',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('sort_order', models.PositiveIntegerField(default=0)),
+                ('is_available', models.BooleanField(default=True)),
+            ],
+            options={
+                'ordering': ['sort_order', 'name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Flavor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('sort_order', models.PositiveIntegerField(default=0)),
+                ('is_available', models.BooleanField(default=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='flavors', to='orders.product')),
+            ],
+            options={
+                'ordering': ['product', 'sort_order', 'name'],
+                'unique_together': {('product', 'name')},
+            },
+        ),
+        migrations.RunPython(seed_catalog, migrations.RunPython.noop),
+    ]
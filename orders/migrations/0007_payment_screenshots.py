@@ -0,0 +1,33 @@
+# Generated by Django 5.0.1 on 2026-10-19 04:59
+
+import django.db.models.deletion
+import orders.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_catalog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentScreenshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.FileField(storage=orders.models.screenshot_storage, upload_to='%Y/%m/')),
+                ('thumbnail', models.FileField(storage=orders.models.screenshot_storage, upload_to='%Y/%m/')),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('original_sha256', models.CharField(db_index=True, max_length=64)),
+                ('original_size', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='screenshot', to='orders.order')),
+            ],
+            options={
+                'verbose_name': 'Payment Screenshot',
+                'verbose_name_plural': 'Payment Screenshots',
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.1 on 2026-10-19 05:05
+
+from django.db import migrations, models
+from PIL import Image
+
+
+def hash_stored_screenshots(apps, schema_editor):
+    from orders.phash import band_hashes
+    PaymentScreenshot = apps.get_model('orders', 'PaymentScreenshot')
+    for screenshot in PaymentScreenshot.objects.all().iterator():
+        try:
+            with screenshot.image.open('rb') as handle, Image.open(handle) as image:
+                screenshot.phashes = band_hashes(image)
+        except OSError as e:
+            print(f"[WARNING] Could not hash screenshot of order {screenshot.order_id}: {e}")
+            continue
+        screenshot.save(update_fields=['phashes'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_payment_screenshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentscreenshot',
+            name='phashes',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='paymentscreenshot',
+            name='similar_orders',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(hash_stored_screenshots, migrations.RunPython.noop),
+    ]
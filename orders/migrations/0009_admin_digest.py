@@ -0,0 +1,29 @@
+# Generated by Django 5.0.1 on 2026-10-19 05:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_screenshot_phashes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdminDigestEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delivery_zone', models.CharField(blank=True, max_length=100)),
+                ('warnings', models.JSONField(blank=True, default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('order', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='digest_entry', to='orders.order')),
+            ],
+            options={
+                'verbose_name': 'Admin Digest Entry',
+                'verbose_name_plural': 'Admin Digest Entries',
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.1 on 2026-10-19 05:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_admin_digest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdmissionSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('held_until', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RateLimitBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=80, unique=True)),
+                ('tokens', models.FloatField()),
+                ('updated_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
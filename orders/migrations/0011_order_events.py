@@ -0,0 +1,61 @@
+# Generated by Django 5.0.1 on 2026-10-19 05:23
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def record_existing_orders(apps, schema_editor):
+    """One 'created' event per live order, with its current status, so a feed read from 0 covers every order"""
+    Order = apps.get_model('orders', 'Order')
+    OrderEvent = apps.get_model('orders', 'OrderEvent')
+    CacheVersion = apps.get_model('orders', 'CacheVersion')
+    seq = 0
+    batch = []
+    rows = Order.objects.order_by('created_at', 'pk').values_list('order_id', 'status', 'payment_status', 'created_at')
+    for order_id, status, payment_status, created_at in rows.iterator(chunk_size=2000):
+        seq += 1
+        batch.append(OrderEvent(
+            seq=seq,
+            order_id=order_id,
+            kind='created',
+            actor='system',
+            new_status=status,
+            new_payment_status=payment_status,
+            created_at=created_at,
+        ))
+        if len(batch) >= 2000:
+            OrderEvent.objects.bulk_create(batch)
+            batch = []
+    OrderEvent.objects.bulk_create(batch)
+    CacheVersion.objects.update_or_create(name='order_events', defaults={'version': seq})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_admission_control'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.PositiveBigIntegerField(unique=True)),
+                ('order_id', models.CharField(db_index=True, max_length=50)),
+                ('kind', models.CharField(choices=[('created', 'Created'), ('status_changed', 'Status changed'), ('archived', 'Archived')], max_length=20)),
+                ('actor', models.CharField(max_length=100)),
+                ('old_status', models.CharField(blank=True, max_length=50)),
+                ('new_status', models.CharField(blank=True, max_length=50)),
+                ('old_payment_status', models.CharField(blank=True, max_length=50)),
+                ('new_payment_status', models.CharField(blank=True, max_length=50)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Order Event',
+                'verbose_name_plural': 'Order Events',
+                'ordering': ['seq'],
+            },
+        ),
+        migrations.RunPython(record_existing_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 5.0.1 on 2026-10-19 05:24
+
+import django.db.models.functions.text
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def normalize_phone(phone):
+    # Frozen copy of orders.models.normalize_phone
+    digits = ''.join(character for character in phone or '' if character.isdigit())
+    if len(digits) == 14 and digits.startswith('0091'):
+        digits = digits[4:]
+    elif len(digits) == 12 and digits.startswith('91'):
+        digits = digits[2:]
+    elif len(digits) == 11 and digits.startswith('0'):
+        digits = digits[1:]
+    return digits
+
+
+def backfill_customer_history(apps, schema_editor):
+    """Fill phone_normalized of existing orders and build their customer summaries"""
+    CustomerSummary = apps.get_model('orders', 'CustomerSummary')
+    summaries = {}
+    for model_name in ['Order', 'ArchivedOrder']:
+        model = apps.get_model('orders', model_name)
+        batch = []
+        rows = model.objects.only('pk', 'phone', 'email', 'status', 'total_amount', 'order_id', 'created_at')
+        for order in rows.iterator(chunk_size=2000):
+            order.phone_normalized = normalize_phone(order.phone)
+            batch.append(order)
+            if len(batch) >= 2000:
+                model.objects.bulk_update(batch, ['phone_normalized'])
+                batch = []
+
+            for key in [('phone', order.phone_normalized), ('email', order.email.strip().lower())]:
+                if not key[1]:
+                    continue
+                summary = summaries.setdefault(key, {
+                    'order_count': 0, 'lifetime_value': Decimal('0'), 'last_order_id': '', 'last_order_at': None
+                })
+                summary['order_count'] += 1
+                if order.status != 'cancelled':
+                    summary['lifetime_value'] += order.total_amount
+                if summary['last_order_at'] is None or order.created_at > summary['last_order_at']:
+                    summary['last_order_id'] = order.order_id
+                    summary['last_order_at'] = order.created_at
+        model.objects.bulk_update(batch, ['phone_normalized'])
+
+    CustomerSummary.objects.bulk_create(
+        [CustomerSummary(kind=kind, value=value, **summary) for (kind, value), summary in summaries.items()],
+        batch_size=2000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0011_order_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('phone', 'Phone'), ('email', 'Email')], max_length=10)),
+                ('value', models.CharField(max_length=255)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('lifetime_value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('last_order_id', models.CharField(blank=True, max_length=50)),
+                ('last_order_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Customer Summary',
+                'verbose_name_plural': 'Customer Summaries',
+            },
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='phone_normalized',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='phone_normalized',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['phone_normalized', 'created_at'], name='archived_phone_history_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(django.db.models.functions.text.Lower('email'), models.F('created_at'), name='archived_email_history_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['phone_normalized', 'created_at'], name='order_phone_history_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(django.db.models.functions.text.Lower('email'), models.F('created_at'), name='order_email_history_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='customersummary',
+            unique_together={('kind', 'value')},
+        ),
+        migrations.RunPython(backfill_customer_history, migrations.RunPython.noop),
+    ]
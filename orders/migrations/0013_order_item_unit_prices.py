@@ -0,0 +1,62 @@
+from decimal import Decimal
+from itertools import islice
+from django.db import migrations
+
+
+# Orders read, and line items fetched and updated, per round trip
+BATCH_SIZE = 2000
+
+
+def unit_price(item):
+    # Frozen copy of the price logic of orders.models.OrderItem.from_json
+    quantity = int(item.get('quantity', 1))
+    if item.get('unitPrice') is not None:
+        price = Decimal(str(item['unitPrice']))
+    else:
+        price = Decimal(str(item.get('price', 0))) / max(quantity, 1)
+    return price.quantize(Decimal('0.01'))
+
+
+def fix_unit_prices(apps, schema_editor):
+    """
+    Line items created before OrderItem.from_json read 'unitPrice' hold the
+    storefront's line total as their unit price; recompute them from the items
+    JSON and let the next refresh_analytics run rebuild the rollups from them
+    """
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    for model_name in ['Order', 'ArchivedOrder']:
+        model = apps.get_model('orders', model_name)
+        orders = model.objects.only('pk', 'items').order_by('pk').iterator(chunk_size=BATCH_SIZE)
+        while True:
+            batch = list(islice(orders, BATCH_SIZE))
+            if not batch:
+                break
+
+            prices = {
+                (order.pk, position): unit_price(item)
+                for order in batch
+                for position, item in enumerate(order.items or [])
+            }
+            changed = []
+            line_items = OrderItem.objects.filter(order_id__in=[order.pk for order in batch]).only('order_id', 'position', 'price')
+            for line_item in line_items:
+                price = prices.get((line_item.order_id, line_item.position))
+                if price is not None and line_item.price != price:
+                    line_item.price = price
+                    changed.append(line_item)
+            OrderItem.objects.bulk_update(changed, ['price'], batch_size=BATCH_SIZE)
+
+    for model_name in ['SalesRollup', 'ProductSalesRollup', 'PincodeSalesRollup']:
+        apps.get_model('orders', model_name).objects.all().delete()
+    apps.get_model('orders', 'RollupWatermark').objects.update(processed_until=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0012_customer_history'),
+    ]
+
+    operations = [
+        migrations.RunPython(fix_unit_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.1 on 2026-10-19 06:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0013_order_item_unit_prices'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='rollupwatermark',
+            name='processed_until',
+        ),
+        migrations.AddField(
+            model_name='rollupwatermark',
+            name='processed_seq',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -1,9 +1,29 @@
+from decimal import Decimal
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Lower
 from django.utils import timezone
 
 
-class Order(models.Model):
-    """Order model matching the existing PostgreSQL schema"""
+def normalize_phone(phone):
+    """
+    Digits of a phone number without the Indian country code or trunk prefix,
+    so '+91 98765 43210', '098765-43210' and '9876543210' are the same customer
+    """
+    digits = ''.join(character for character in phone or '' if character.isdigit())
+    if len(digits) == 14 and digits.startswith('0091'):
+        digits = digits[4:]
+    elif len(digits) == 12 and digits.startswith('91'):
+        digits = digits[2:]
+    elif len(digits) == 11 and digits.startswith('0'):
+        digits = digits[1:]
+    return digits
+
+
+class AbstractOrder(models.Model):
+    """Fields shared by live and archived orders"""
     
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -24,6 +44,8 @@ class Order(models.Model):
     full_name = models.CharField(max_length=255)
     email = models.EmailField(db_index=True)
     phone = models.CharField(max_length=20)
+    # normalize_phone(phone), set by save(); indexed with created_at for customer history
+    phone_normalized = models.CharField(max_length=20, blank=True, default='')
     delivery_address = models.TextField()
     pincode = models.CharField(max_length=10)
     alternate_phone = models.CharField(max_length=20, blank=True, null=True)
@@ -46,10 +68,431 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        abstract = True
+    
+    def __str__(self):
+        return f"{self.order_id} - {self.full_name}"
+    
+    def save(self, *args, **kwargs):
+        self.phone_normalized = normalize_phone(self.phone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'phone' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'phone_normalized'}
+        super().save(*args, **kwargs)
+    
+    def get_line_items(self):
+        """
+        Line items of this order as OrderItem instances
+        
+        Falls back to unsaved instances built from the items JSON for orders
+        that have not been backfilled yet.
+        """
+        line_items = list(OrderItem.objects.filter(order_id=self.pk)) if self.pk else []
+        if not line_items:
+            line_items = [OrderItem.from_json(item, position) for position, item in enumerate(self.items or [])]
+        return line_items
+
+
+class Order(AbstractOrder):
+    """Order model matching the existing PostgreSQL schema"""
+    
+    # Orders in these states never change again and are eligible for archival
+    TERMINAL_STATUSES = ['delivered', 'cancelled']
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),
+            # Customer history, newest first (see orders.customers)
+            models.Index(fields=['phone_normalized', 'created_at'], name='order_phone_history_idx'),
+            models.Index(Lower('email'), F('created_at'), name='order_email_history_idx'),
+        ]
         verbose_name = 'Order'
         verbose_name_plural = 'Orders'
+
+
+class ArchivedOrder(AbstractOrder):
+    """Delivered/cancelled orders moved out of the hot orders table by archive_orders"""
+    
+    # Copied verbatim from the live order, so they must not be reset on insert/update
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['phone_normalized', 'created_at'], name='archived_phone_history_idx'),
+            models.Index(Lower('email'), F('created_at'), name='archived_email_history_idx'),
+        ]
+        verbose_name = 'Archived Order'
+        verbose_name_plural = 'Archived Orders'
+
+
+
+class OrderItem(models.Model):
+    """One line of an order, normalized from Order.items for product-level queries"""
+    
+    # Archived orders keep their primary key, so line items are left in place
+    # (no cascade, no constraint) when an order moves to ArchivedOrder
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='line_items'
+    )
+    position = models.PositiveSmallIntegerField(default=0)
+    product = models.CharField(max_length=255, db_index=True)
+    flavor = models.CharField(max_length=255, blank=True, db_index=True)
+    quantity = models.PositiveIntegerField(default=1)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    
+    class Meta:
+        ordering = ['order_id', 'position']
+        indexes = [
+            models.Index(fields=['product', 'flavor']),
+        ]
+        verbose_name = 'Order Item'
+        verbose_name_plural = 'Order Items'
     
     def __str__(self):
-        return f"{self.order_id} - {self.full_name}"
+        return f"{self.product} ({self.flavor}) x{self.quantity}"
+    
+    @property
+    def amount(self):
+        return self.quantity * self.price
+    
+    @classmethod
+    def from_json(cls, item, position=0):
+        """
+        Build an unsaved OrderItem from one entry of Order.items
+        
+        The storefront stores the line total in 'price' and the unit price in
+        'unitPrice'; OrderItem.price is always the unit price.
+        """
+        quantity = int(item.get('quantity', 1))
+        if item.get('unitPrice') is not None:
+            price = Decimal(str(item['unitPrice']))
+        else:
+            price = Decimal(str(item.get('price', 0))) / max(quantity, 1)
+        return cls(
+            position=position,
+            # The storefront writes 'product', some older writers used 'name'
+            product=item.get('product') or item.get('name') or '',
+            flavor=item.get('flavor') or '',
+            quantity=quantity,
+            price=price.quantize(Decimal('0.01'))
+        )
+    
+    def as_dict(self):
+        """Same shape as an entry of Order.items"""
+        return {
+            'product': self.product,
+            'flavor': self.flavor,
+            'quantity': self.quantity,
+            'unitPrice': self.price,
+            'price': self.amount,
+        }
+    
+    @classmethod
+    def build_for_order(cls, order):
+        """Unsaved line items for a live or archived order's items JSON"""
+        line_items = [cls.from_json(item, position) for position, item in enumerate(order.items or [])]
+        for line_item in line_items:
+            line_item.order_id = order.pk
+        return line_items
+    
+    @classmethod
+    def sync_order(cls, order):
+        """Replace an order's line items with the contents of its items JSON"""
+        cls.objects.filter(order_id=order.pk).delete()
+        return cls.objects.bulk_create(cls.build_for_order(order))
+
+
+def screenshot_storage():
+    """Payment screenshots live outside MEDIA_ROOT so they are never served without a permission check"""
+    return FileSystemStorage(location=settings.PRIVATE_MEDIA_ROOT / 'screenshots')
+
+
+class PaymentScreenshot(models.Model):
+    """Payment proof of an order, decoded and processed once at upload"""
+    
+    # Same reasoning as OrderItem: archived orders keep their primary key
+    order = models.OneToOneField(
+        Order,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='screenshot'
+    )
+    image = models.FileField(storage=screenshot_storage, upload_to='%Y/%m/')
+    thumbnail = models.FileField(storage=screenshot_storage, upload_to='%Y/%m/')
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    # SHA-256 of the uploaded file, before processing
+    original_sha256 = models.CharField(max_length=64, db_index=True)
+    original_size = models.PositiveIntegerField()
+    # 64-bit perceptual hashes of the screenshot's bands of content, see orders.phash
+    phashes = models.JSONField(default=list, blank=True)
+    # order_ids of earlier orders whose screenshot looked the same at upload
+    similar_orders = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Payment Screenshot'
+        verbose_name_plural = 'Payment Screenshots'
+    
+    def __str__(self):
+        return f"Screenshot for order {self.order_id}"
+
+
+class AdminDigestEntry(models.Model):
+    """A new order waiting to go out in the next admin digest email"""
+    
+    # Same reasoning as OrderItem: the order may be archived before the digest is sent
+    order = models.OneToOneField(
+        Order,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='digest_entry'
+    )
+    delivery_zone = models.CharField(max_length=100, blank=True)
+    # What the per-order email would have flagged: price mismatches, reused screenshot, ...
+    warnings = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        verbose_name = 'Admin Digest Entry'
+        verbose_name_plural = 'Admin Digest Entries'
+    
+    def __str__(self):
+        return f"Digest entry for order {self.order_id}"
+
+
+class CustomerSummary(models.Model):
+    """
+    Cached order totals of one phone number or email, live and archived orders
+    together; refreshed whenever one of its orders changes (see orders.customers)
+    """
+    
+    KIND_CHOICES = [
+        ('phone', 'Phone'),
+        ('email', 'Email'),
+    ]
+    
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # normalize_phone() of the phone number, or the lowercased email
+    value = models.CharField(max_length=255)
+    order_count = models.PositiveIntegerField(default=0)
+    # Total of the orders that were not cancelled
+    lifetime_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    last_order_id = models.CharField(max_length=50, blank=True)
+    last_order_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = [('kind', 'value')]
+        verbose_name = 'Customer Summary'
+        verbose_name_plural = 'Customer Summaries'
+    
+    def __str__(self):
+        return f"{self.kind} {self.value}: {self.order_count} orders"
+
+
+class OrderEvent(models.Model):
+    """
+    Append-only history of orders: creation, every status change and archival
+    
+    seq increases by one per event, in commit order (see orders.events), so
+    readers can sync with ?since=<last seq> without missing events.
+    """
+    
+    KIND_CHOICES = [
+        ('created', 'Created'),
+        ('status_changed', 'Status changed'),
+        ('archived', 'Archived'),
+    ]
+    
+    seq = models.PositiveBigIntegerField(unique=True)
+    # The public order_id, which stays valid after the order is archived
+    order_id = models.CharField(max_length=50, db_index=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # 'customer', 'admin:<username>', 'import' or 'system'
+    actor = models.CharField(max_length=100)
+    old_status = models.CharField(max_length=50, blank=True)
+    new_status = models.CharField(max_length=50, blank=True)
+    old_payment_status = models.CharField(max_length=50, blank=True)
+    new_payment_status = models.CharField(max_length=50, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['seq']
+        verbose_name = 'Order Event'
+        verbose_name_plural = 'Order Events'
+    
+    def __str__(self):
+        return f"#{self.seq} {self.order_id} {self.kind}"
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Order events are append-only")
+        super().save(*args, **kwargs)
+
+
+class Product(models.Model):
+    """A product on the menu (Kulfi, Cone, ...)"""
+    
+    name = models.CharField(max_length=100, unique=True)
+    sort_order = models.PositiveIntegerField(default=0)
+    is_available = models.BooleanField(default=True)
+    
+    class Meta:
+        ordering = ['sort_order', 'name']
+    
+    def __str__(self):
+        return self.name
+
+
+class Flavor(models.Model):
+    """A flavor or size of a product, with its unit price"""
+    
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='flavors')
+    name = models.CharField(max_length=100)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    sort_order = models.PositiveIntegerField(default=0)
+    is_available = models.BooleanField(default=True)
+    
+    class Meta:
+        ordering = ['product', 'sort_order', 'name']
+        unique_together = [('product', 'name')]
+    
+    def __str__(self):
+        return f"{self.product} - {self.name}"
+
+
+class SalesRollup(models.Model):
+    """Order count, item count and revenue per hour/day/week, maintained by refresh_analytics"""
+    
+    PERIOD_CHOICES = [
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+        ('week', 'Week'),
+    ]
+    
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES)
+    bucket_start = models.DateTimeField()
+    order_count = models.PositiveIntegerField(default=0)
+    item_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        ordering = ['period', 'bucket_start']
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'bucket_start'], name='unique_sales_rollup_bucket'),
+        ]
+
+
+class ProductSalesRollup(models.Model):
+    """Units sold and revenue per product and flavor per day"""
+    
+    day = models.DateField()
+    product = models.CharField(max_length=255)
+    flavor = models.CharField(max_length=255, blank=True)
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        ordering = ['day', 'product', 'flavor']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product', 'flavor'], name='unique_product_rollup_bucket'),
+        ]
+
+
+class PincodeSalesRollup(models.Model):
+    """Order count and revenue per delivery pincode per day"""
+    
+    day = models.DateField()
+    pincode = models.CharField(max_length=10)
+    order_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        ordering = ['day', 'pincode']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'pincode'], name='unique_pincode_rollup_bucket'),
+        ]
+
+
+class RollupWatermark(models.Model):
+    """
+    Order events up to processed_seq have been folded into the rollup tables;
+    None means the rollups have to be rebuilt
+    """
+    
+    name = models.CharField(max_length=50, unique=True)
+    processed_seq = models.PositiveBigIntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name}: {self.processed_seq}"
+
+
+class CacheVersion(models.Model):
+    """Version counter bumped whenever the data behind an in-process snapshot changes"""
+    
+    name = models.CharField(max_length=50, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+
+class DeliveryZone(models.Model):
+    """Group of pincodes delivered together"""
+    
+    name = models.CharField(max_length=100, unique=True)
+    sort_order = models.PositiveIntegerField(default=0)
+    is_active = models.BooleanField(default=True)
+    
+    class Meta:
+        ordering = ['sort_order', 'name']
+    
+    def __str__(self):
+        return self.name
+
+
+class ServiceablePincode(models.Model):
+    """A pincode we deliver to"""
+    
+    pincode = models.CharField(max_length=10, unique=True)
+    zone = models.ForeignKey(DeliveryZone, on_delete=models.CASCADE, related_name='pincodes')
+    is_active = models.BooleanField(default=True)
+    
+    class Meta:
+        ordering = ['pincode']
+    
+    def __str__(self):
+        return f"{self.pincode} ({self.zone})"
+
+
+class RateLimitBucket(models.Model):
+    """Token bucket shared by every worker (see orders.ratelimit)"""
+    
+    key = models.CharField(max_length=80, unique=True)
+    tokens = models.FloatField()
+    updated_at = models.DateTimeField(db_index=True)
+    
+    def __str__(self):
+        return f"{self.key}: {self.tokens:.1f}"
+
+
+class AdmissionSlot(models.Model):
+    """One of ORDER_MAX_IN_FLIGHT create_order slots; free once held_until has passed"""
+    
+    held_until = models.DateTimeField()
+    
+    def __str__(self):
+        return f"Slot {self.pk} held until {self.held_until}"
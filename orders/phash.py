@@ -0,0 +1,267 @@
+"""
+Perceptual hashes of payment screenshots and an in-memory index to find reuse
+
+A single hash of the whole screenshot cannot tell two payments made in the
+same UPI app apart (they share the layout and only differ in a few lines of
+text), and a finer one breaks as soon as the status bar is cropped away. So a
+screenshot is cut into bands of content at its blank rows, which crops of the
+top or bottom do not move, and every band gets its own 64-bit difference hash.
+
+Band hashes are kept in a multi-index hash: each hash is split into four
+16-bit chunks, each chunk has its own lookup table, and two hashes within
+distance r are within r // 4 of each other in at least one chunk, so a lookup
+probes a few buckets instead of comparing against every stored hash.
+
+A screenshot matches an earlier one when most of its bands do. Bands found on
+a lot of screenshots (the app's header, "Payment successful", buttons) do not
+count; the amount, time and transaction ID are what make a payment unique.
+"""
+import math
+import threading
+import time
+from array import array
+from collections import Counter
+from itertools import combinations
+from django.conf import settings
+from django.db.models import Q
+from PIL import Image
+from .models import ArchivedOrder, Order, PaymentScreenshot
+
+
+HASH_BITS = 64
+CHUNKS = 4
+CHUNK_BITS = HASH_BITS // CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+# Screenshots are compared at this width, so resized copies cut into the same bands
+BAND_WIDTH = 256
+# Rows whose darkest and brightest pixels differ less than this are blank
+BLANK_ROW_CONTRAST = 12
+# Thinner bands are separators or noise rather than content
+MIN_BAND_ROWS = 4
+# 32x2 gradient grid: fine enough across a line of text to see different digits
+HASH_COLUMNS = 32
+HASH_ROWS = 2
+
+# Larger jumps in screenshot pks are old deletions, not uncommitted rows
+MAX_TRACKED_GAP = 1000
+
+
+def difference_hash(image):
+    """64-bit dHash of a grayscale image: is each grid cell darker than its right neighbour"""
+    pixels = list(image.resize((HASH_COLUMNS + 1, HASH_ROWS), Image.LANCZOS).getdata())
+    value = 0
+    for y in range(HASH_ROWS):
+        row = pixels[y * (HASH_COLUMNS + 1):(y + 1) * (HASH_COLUMNS + 1)]
+        for left, right in zip(row, row[1:]):
+            value = (value << 1) | (left < right)
+    return value
+
+
+def band_hashes(image):
+    """
+    Perceptual hashes of the bands of content in a screenshot, top to bottom
+
+    Args:
+        image: PIL image
+
+    Returns:
+        List of 64-bit hashes (empty for images without blank rows, e.g. photos)
+    """
+    height = max(1, round(image.height * BAND_WIDTH / image.width))
+    gray = image.convert('L').resize((BAND_WIDTH, height), Image.LANCZOS)
+    pixels = list(gray.getdata())
+
+    hashes = []
+    start = None
+    for y in range(height + 1):
+        row = pixels[y * BAND_WIDTH:(y + 1) * BAND_WIDTH] if y < height else [0]
+        if max(row) - min(row) > BLANK_ROW_CONTRAST:
+            if start is None:
+                start = y
+        elif start is not None:
+            if y - start >= MIN_BAND_ROWS and not (start == 0 and y == height):
+                hashes.append(difference_hash(gray.crop((0, start, BAND_WIDTH, y))))
+            start = None
+    return hashes
+
+
+def chunk_neighbors(chunk, radius):
+    """Every CHUNK_BITS value within radius bits of chunk"""
+    yield chunk
+    for distance in range(1, radius + 1):
+        for bits in combinations(range(CHUNK_BITS), distance):
+            flipped = chunk
+            for bit in bits:
+                flipped ^= 1 << bit
+            yield flipped
+
+
+class MultiIndexHash:
+    """
+    Hamming-distance index of 64-bit hashes with an integer value each
+
+    Hashes and values are kept in flat arrays; the per-chunk tables only hold
+    positions in those arrays, which keeps a million entries at a few dozen MB.
+    """
+
+    def __init__(self):
+        self.hashes = array('Q')
+        self.values = array('q')
+        self.tables = [{} for _ in range(CHUNKS)]
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def add(self, value_hash, value):
+        position = len(self.hashes)
+        self.hashes.append(value_hash)
+        self.values.append(value)
+        for chunk_index, table in enumerate(self.tables):
+            chunk = (value_hash >> (chunk_index * CHUNK_BITS)) & CHUNK_MASK
+            bucket = table.get(chunk)
+            if bucket is None:
+                table[chunk] = array('I', [position])
+            else:
+                bucket.append(position)
+
+    def search(self, value_hash, radius, limit=None):
+        """
+        Values of the stored hashes within radius of value_hash
+
+        Args:
+            limit: Give up and return None once more than this many hashes match
+
+        Returns:
+            Set of values, or None if there were more than limit matches
+        """
+        chunk_radius = radius // CHUNKS
+        seen = set()
+        values = set()
+        matched = 0
+        for chunk_index, table in enumerate(self.tables):
+            chunk = (value_hash >> (chunk_index * CHUNK_BITS)) & CHUNK_MASK
+            for neighbor in chunk_neighbors(chunk, chunk_radius):
+                for position in table.get(neighbor, ()):
+                    if position in seen:
+                        continue
+                    seen.add(position)
+                    if (self.hashes[position] ^ value_hash).bit_count() <= radius:
+                        matched += 1
+                        if limit is not None and matched > limit:
+                            return None
+                        values.add(self.values[position])
+        return values
+
+
+def match_bands(index, hashes, radius, common_limit, min_fraction):
+    """
+    Values whose bands cover most of the distinctive bands in hashes
+
+    Returns:
+        List of (matched bands, value), most matched first
+    """
+    votes = Counter()
+    distinctive = 0
+    for value_hash in set(hashes):
+        values = index.search(value_hash, radius, limit=common_limit)
+        if values is None:
+            continue
+        distinctive += 1
+        votes.update(values)
+    # A single distinctive band is not enough evidence either way
+    needed = max(2, math.ceil(distinctive * min_fraction))
+    return [(count, value) for value, count in votes.most_common() if count >= needed]
+
+
+class ScreenshotIndex:
+    """
+    Per-process index of the band hashes of every stored screenshot, mapped
+    to the order's primary key
+
+    Screenshots are only ever added, so instead of reloading the index it
+    pulls rows newer than the last one it has seen before each lookup.
+
+    A row can commit after rows with higher pks are already visible, so the
+    pks skipped over are remembered and asked for again on every sync for
+    SCREENSHOT_INDEX_GAP_SECONDS; after that they belong to rolled back
+    transactions.
+    """
+
+    def __init__(self):
+        self.index = MultiIndexHash()
+        self.last_id = 0
+        # Skipped pk -> time.monotonic() when it was first skipped
+        self.gaps = {}
+        self._lock = threading.Lock()
+
+    def sync(self):
+        now = time.monotonic()
+        self.gaps = {
+            pk: skipped_at for pk, skipped_at in self.gaps.items()
+            if now - skipped_at < settings.SCREENSHOT_INDEX_GAP_SECONDS
+        }
+        new_rows = Q(pk__gt=self.last_id)
+        if self.gaps:
+            new_rows |= Q(pk__in=list(self.gaps))
+        rows = (
+            PaymentScreenshot.objects
+            .filter(new_rows)
+            .order_by('pk')
+            .values_list('pk', 'phashes', 'order_id')
+            .iterator(chunk_size=10000)
+        )
+        for pk, hashes, order_pk in rows:
+            if pk in self.gaps:
+                del self.gaps[pk]
+            elif pk > self.last_id:
+                if self.last_id and pk - self.last_id <= MAX_TRACKED_GAP:
+                    self.gaps.update(dict.fromkeys(range(self.last_id + 1, pk), now))
+                self.last_id = pk
+            for value_hash in hashes:
+                self.index.add(value_hash, order_pk)
+
+    def find_similar(self, hashes):
+        """
+        Primary keys of orders whose screenshot has most of the same bands
+
+        Returns:
+            List of order pks, best match first
+        """
+        with self._lock:
+            self.sync()
+            matches = match_bands(
+                self.index,
+                hashes,
+                radius=settings.SCREENSHOT_MATCH_DISTANCE,
+                common_limit=settings.SCREENSHOT_COMMON_BAND_LIMIT,
+                min_fraction=settings.SCREENSHOT_MATCH_FRACTION
+            )
+        return [order_pk for _, order_pk in matches]
+
+
+screenshot_index = ScreenshotIndex()
+
+
+def find_similar_orders(processed):
+    """
+    order_ids of live or archived orders paid with the same screenshot
+
+    Args:
+        processed: ProcessedScreenshot of the new upload
+
+    Returns:
+        Up to SCREENSHOT_MATCH_LIMIT order_ids, closest match first
+    """
+    pks = screenshot_index.find_similar(processed.phashes)
+    # Byte-identical uploads match even when the image has no usable bands
+    identical = PaymentScreenshot.objects.filter(original_sha256=processed.original_sha256)
+    for order_pk in identical.values_list('order_id', flat=True):
+        if order_pk not in pks:
+            pks.insert(0, order_pk)
+    pks = pks[:settings.SCREENSHOT_MATCH_LIMIT]
+    if not pks:
+        return []
+    order_ids = dict(Order.objects.filter(pk__in=pks).values_list('pk', 'order_id'))
+    order_ids.update(ArchivedOrder.objects.filter(pk__in=pks).values_list('pk', 'order_id'))
+    return [order_ids[pk] for pk in pks if pk in order_ids]
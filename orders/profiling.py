@@ -0,0 +1,210 @@
+"""
+On-demand request profiling
+
+ProfilingMiddleware runs a view under cProfile when an admin asks for it with
+?profile=1 or an X-Profile: 1 header (profile=memory / X-Profile: memory also
+traces allocations with tracemalloc), or when the request is picked at random
+by PROFILE_SAMPLE_RATE. Each profile is stored in PROFILE_DIR as a pstats file
+(plus a tracemalloc snapshot for memory profiles) next to a JSON summary with
+the route, order ID, timings, queries and top functions, which the
+admin-profiles.html page lists. Only one request per process is profiled at a
+time, as tracemalloc traces every thread; cProfile only sees the thread that
+enabled it, but from Python 3.12 only one can be enabled at once. Others run
+normally. The view is profiled up to the moment it returns, so a streaming
+response's body is not included.
+"""
+import cProfile
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import tracemalloc
+import uuid
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from .querylog import QueryRecorder
+
+
+PROFILE_ID_PATTERN = re.compile(r'^\d{8}-\d{6}-[0-9a-f]{8}$')
+
+# Extensions of the files of one profile
+PROFILE_FILES = {'summary': '.json', 'pstats': '.prof', 'memory': '.tracemalloc'}
+
+_profiling_lock = threading.Lock()
+
+
+def get_profile_path(profile_id, kind):
+    """
+    Raises:
+        ValueError: if profile_id is not one new_profile_id made
+    """
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        raise ValueError(f"Invalid profile id: {profile_id}")
+    return os.path.join(settings.PROFILE_DIR, profile_id + PROFILE_FILES[kind])
+
+
+def new_profile_id():
+    return f"{timezone.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+
+def requested_mode(request):
+    """
+    'cpu' or 'memory' if this request should be profiled, otherwise None
+
+    Only admins can ask for a profile; sampled requests get 'cpu' (or
+    'memory' with PROFILE_SAMPLE_MEMORY).
+    """
+    asked = request.GET.get('profile') or request.headers.get('X-Profile')
+    if asked and asked != '0' and request.session.get('is_admin'):
+        return 'memory' if asked == 'memory' else 'cpu'
+    if settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE:
+        return 'memory' if settings.PROFILE_SAMPLE_MEMORY else 'cpu'
+    return None
+
+
+def short_filename(filename):
+    """Project files relative to BASE_DIR, everything else as is"""
+    if filename.startswith(str(settings.BASE_DIR)):
+        return os.path.relpath(filename, settings.BASE_DIR)
+    return filename
+
+
+def get_top_functions(stats, limit):
+    """The limit functions with the most cumulative time, as dictionaries"""
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [
+        {
+            'function': f"{short_filename(filename)}:{line}({name})",
+            'calls': calls,
+            'tottime_ms': round(tottime * 1000, 3),
+            'cumtime_ms': round(cumtime * 1000, 3),
+        }
+        for (filename, line, name), (_, calls, tottime, cumtime, _) in rows
+    ]
+
+
+def get_top_allocations(snapshot, limit):
+    """The limit source lines holding the most memory allocated during the request"""
+    return [
+        {'line': str(stat.traceback[0]), 'kib': round(stat.size / 1024, 1), 'count': stat.count}
+        for stat in snapshot.statistics('lineno')[:limit]
+    ]
+
+
+def save_profile(request, response, mode, profiler, snapshot, queries, elapsed):
+    """Write the profile files and summary, then drop the oldest beyond PROFILE_KEEP"""
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    profile_id = new_profile_id()
+    profiler.dump_stats(get_profile_path(profile_id, 'pstats'))
+    stats = pstats.Stats(profiler)
+
+    match = request.resolver_match
+    summary = {
+        'id': profile_id,
+        'created_at': timezone.now().isoformat(),
+        'method': request.method,
+        'path': request.path,
+        'route': match.route if match else '',
+        'order_id': match.kwargs.get('order_id', '') if match else '',
+        'status': response.status_code,
+        'mode': mode,
+        'duration_ms': round(elapsed * 1000, 1),
+        'queries': len(queries),
+        'query_ms': round(sum(query[3] for query in queries), 1),
+        'top_functions': get_top_functions(stats, settings.PROFILE_TOP_FUNCTIONS),
+    }
+    if snapshot is not None:
+        snapshot.dump(get_profile_path(profile_id, 'memory'))
+        summary['top_allocations'] = get_top_allocations(snapshot, settings.PROFILE_TOP_FUNCTIONS)
+    with open(get_profile_path(profile_id, 'summary'), 'w') as summary_file:
+        json.dump(summary, summary_file)
+
+    prune_profiles(settings.PROFILE_KEEP)
+    return profile_id
+
+
+def list_profile_ids():
+    """Ids of the stored profiles, newest first"""
+    if not os.path.isdir(settings.PROFILE_DIR):
+        return []
+    ids = {
+        filename[:-len(PROFILE_FILES['summary'])]
+        for filename in os.listdir(settings.PROFILE_DIR)
+        if filename.endswith(PROFILE_FILES['summary'])
+    }
+    return sorted((profile_id for profile_id in ids if PROFILE_ID_PATTERN.match(profile_id)), reverse=True)
+
+
+def prune_profiles(keep):
+    for profile_id in list_profile_ids()[keep:]:
+        for kind in PROFILE_FILES:
+            try:
+                os.remove(get_profile_path(profile_id, kind))
+            except FileNotFoundError:
+                pass
+
+
+def get_recent_profiles(limit):
+    """Summaries of the newest stored profiles"""
+    profiles = []
+    for profile_id in list_profile_ids()[:limit]:
+        try:
+            with open(get_profile_path(profile_id, 'summary')) as summary_file:
+                profiles.append(json.load(summary_file))
+        except (FileNotFoundError, ValueError):  # pruned or half written meanwhile
+            continue
+    return profiles
+
+
+class ProfilingMiddleware:
+    """Profile the views of requests that ask for it (see module docstring)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = requested_mode(request)
+        if mode is None or not _profiling_lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            return self.profile(request, mode)
+        finally:
+            _profiling_lock.release()
+
+    def profile(self, request, mode):
+        queries = []
+        # Call sites would cost a stack walk per query inside the profile
+        recorders = [QueryRecorder(alias, queries, with_call_sites=False) for alias in connections]
+        for recorder in recorders:
+            connections[recorder.alias].execute_wrappers.append(recorder)
+        trace_memory = mode == 'memory' and not tracemalloc.is_tracing()
+        if trace_memory:
+            tracemalloc.start()
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            elapsed = time.perf_counter() - started
+            snapshot = tracemalloc.take_snapshot() if trace_memory else None
+        finally:
+            if trace_memory:
+                tracemalloc.stop()
+            for recorder in recorders:
+                connections[recorder.alias].execute_wrappers.remove(recorder)
+
+        try:
+            profile_id = save_profile(request, response, mode, profiler, snapshot, queries, elapsed)
+            if request.session.get('is_admin'):
+                response['X-Profile-Id'] = profile_id
+        except OSError as e:
+            print(f"[ERROR] Failed to save profile of {request.path}: {e}")
+        return response
@@ -0,0 +1,120 @@
+"""
+Development query log
+
+QueryLogMiddleware records every SQL query a request runs, on every database
+alias and including the ones run while a streaming response is consumed. When
+the request is done it prints the queries that ran more than once with the
+same parameters (duplicates), the ones that ran QUERY_LOG_REPEAT_THRESHOLD
+times or more with different parameters (a query per row, N+1), and the ones
+slower than QUERY_LOG_SLOW_MS, each with the line of project code that ran it.
+Only installed when DEBUG and QUERY_LOG are both on (see settings).
+"""
+import os
+import time
+import traceback
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.db import connections
+
+
+PROJECT_ROOT = str(settings.BASE_DIR)
+
+THIS_FILE = os.path.abspath(__file__)
+
+
+def get_call_site():
+    """'path:line in function' of the innermost project frame running a query"""
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if filename.startswith(PROJECT_ROOT) and filename != THIS_FILE and 'site-packages' not in filename:
+            return f"{os.path.relpath(filename, PROJECT_ROOT)}:{frame.lineno} in {frame.name}"
+    return 'unknown'
+
+
+class QueryRecorder:
+    """
+    Execute wrapper collecting (alias, sql, params, milliseconds, call site) per
+    query; with_call_sites=False skips the stack walk and leaves call sites empty
+    """
+
+    def __init__(self, alias, queries, with_call_sites=True):
+        self.alias = alias
+        self.queries = queries
+        self.with_call_sites = with_call_sites
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            call_site = get_call_site() if self.with_call_sites else ''
+            self.queries.append((self.alias, sql, repr(params), elapsed_ms, call_site))
+
+
+def report_queries(request, queries):
+    """Print the request's duplicate, repeated and slow queries"""
+    total_ms = sum(query[3] for query in queries)
+    lines = []
+
+    statements = defaultdict(list)
+    for alias, sql, params, elapsed_ms, call_site in queries:
+        statements[(alias, sql)].append((params, call_site))
+
+    for (alias, sql), runs in statements.items():
+        duplicates = sum(count - 1 for count in Counter(params for params, _ in runs).values())
+        call_sites = ', '.join(sorted({call_site for _, call_site in runs}))
+        if len(runs) >= settings.QUERY_LOG_REPEAT_THRESHOLD:
+            lines.append(f"  {len(runs)}x ({duplicates} duplicates) [{alias}] {sql[:300]}\n      at {call_sites}")
+        elif duplicates:
+            lines.append(f"  {duplicates + 1}x duplicate [{alias}] {sql[:300]}\n      at {call_sites}")
+
+    for alias, sql, params, elapsed_ms, call_site in queries:
+        if elapsed_ms >= settings.QUERY_LOG_SLOW_MS:
+            lines.append(f"  slow {elapsed_ms:.1f} ms [{alias}] {sql[:300]} {params[:200]}\n      at {call_site}")
+
+    prefix = '[WARNING]' if lines else '[SUCCESS]'
+    print(f"{prefix} {request.method} {request.path}: {len(queries)} queries in {total_ms:.1f} ms")
+    for line in lines:
+        print(line)
+
+
+class QueryLogMiddleware:
+    """Print the query report of every request (development only)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = []
+        recorders = [QueryRecorder(alias, queries) for alias in connections]
+        self.install(recorders)
+        try:
+            response = self.get_response(request)
+        except Exception:
+            self.finish(request, recorders, queries)
+            raise
+
+        if response.streaming:
+            # Keep recording until the last chunk has been sent
+            response.streaming_content = self.stream(response.streaming_content, request, recorders, queries)
+        else:
+            self.finish(request, recorders, queries)
+        return response
+
+    def stream(self, content, request, recorders, queries):
+        try:
+            yield from content
+        finally:
+            self.finish(request, recorders, queries)
+
+    def install(self, recorders):
+        for recorder in recorders:
+            connections[recorder.alias].execute_wrappers.append(recorder)
+
+    def finish(self, request, recorders, queries):
+        for recorder in recorders:
+            wrappers = connections[recorder.alias].execute_wrappers
+            if recorder in wrappers:
+                wrappers.remove(recorder)
+        report_queries(request, queries)
@@ -0,0 +1,229 @@
+"""
+Admission control for order creation
+
+Token buckets limit how often each client IP and each phone number / email
+may place an order; a fixed number of leased slots limits how many
+create_order requests run at once. Both live in the database, so the limits
+hold across all gunicorn workers. Rejections are counted per worker (see
+get_rejection_counts) and reported by the deep health check.
+"""
+import hashlib
+import math
+import threading
+from collections import Counter
+from datetime import timedelta
+from functools import wraps
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.throttling import BaseThrottle
+from .models import AdmissionSlot, RateLimitBucket, normalize_phone
+
+
+_rejections = Counter()
+_rejections_lock = threading.Lock()
+
+# Slot rows known to exist in this process
+_slots_created = 0
+
+
+def get_rejection_counts():
+    """Requests rejected by this worker since it started, by reason"""
+    with _rejections_lock:
+        return dict(_rejections)
+
+
+def count_rejection(reason):
+    with _rejections_lock:
+        _rejections[reason] += 1
+
+
+def bucket_key(scope, value):
+    """Bucket key that does not store the IP, phone number or email itself"""
+    return f"{scope}:{hashlib.sha256(value.encode()).hexdigest()[:40]}"
+
+
+def take_tokens(keys, burst, refill_seconds):
+    """
+    Take a token from each of several buckets, each holding up to burst tokens
+    and gaining one every refill_seconds, or from none of them if any is empty
+
+    Returns:
+        Tuple of (0, None) if the tokens were taken, otherwise (seconds until
+        the next token, key of the first empty bucket in keys)
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # Locked in key order, so two requests sharing buckets cannot deadlock
+        locked = {
+            key: RateLimitBucket.objects.select_for_update().get_or_create(
+                key=key,
+                defaults={'tokens': burst, 'updated_at': now}
+            )[0]
+            for key in sorted(keys)
+        }
+        buckets = []
+        for key in keys:
+            bucket = locked[key]
+            elapsed = max(0.0, (now - bucket.updated_at).total_seconds())
+            tokens = min(burst, bucket.tokens + elapsed / refill_seconds)
+            if tokens < 1:
+                return (1 - tokens) * refill_seconds, key
+            buckets.append((bucket, tokens))
+
+        for bucket, tokens in buckets:
+            bucket.tokens = tokens - 1
+            bucket.updated_at = now
+            bucket.save(update_fields=['tokens', 'updated_at'])
+    return 0, None
+
+
+def take_token(key, burst, refill_seconds):
+    """
+    Take a token from one bucket (see take_tokens)
+
+    Returns:
+        0 if a token was taken, otherwise seconds until the next one
+    """
+    return take_tokens([key], burst, refill_seconds)[0]
+
+
+def ensure_slots(limit):
+    """Create the slot rows up to limit (once per process)"""
+    global _slots_created
+    if _slots_created >= limit:
+        return
+    AdmissionSlot.objects.bulk_create(
+        [AdmissionSlot(pk=pk, held_until=timezone.now()) for pk in range(1, limit + 1)],
+        ignore_conflicts=True
+    )
+    _slots_created = limit
+
+
+def acquire_slot():
+    """
+    Lease a free create_order slot for ORDER_IN_FLIGHT_LEASE_SECONDS
+
+    A slot is released by release_slot, or frees itself when the lease ends
+    (a worker killed mid-request cannot keep it).
+
+    Returns:
+        (slot id, lease end), or None when every slot is taken
+    """
+    limit = settings.ORDER_MAX_IN_FLIGHT
+    ensure_slots(limit)
+    now = timezone.now()
+    with transaction.atomic():
+        slot = (
+            AdmissionSlot.objects
+            .select_for_update(skip_locked=True)
+            .filter(pk__lte=limit, held_until__lte=now)
+            .first()
+        )
+        if slot is None:
+            return None
+        slot.held_until = now + timedelta(seconds=settings.ORDER_IN_FLIGHT_LEASE_SECONDS)
+        slot.save(update_fields=['held_until'])
+    return slot.pk, slot.held_until
+
+
+def release_slot(lease):
+    """Free a slot, unless its lease ran out and someone else holds it now"""
+    pk, held_until = lease
+    AdmissionSlot.objects.filter(pk=pk, held_until=held_until).update(held_until=timezone.now())
+
+
+def rejection_response(reason, retry_after, status_code, message):
+    """429/503 response telling the client when to retry"""
+    count_rejection(reason)
+    retry_after = math.ceil(retry_after)
+    response = Response({
+        'error': 'Too many requests' if status_code == status.HTTP_429_TOO_MANY_REQUESTS else 'Service busy',
+        'message': message,
+        'retryAfter': retry_after
+    }, status=status_code)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def admission_control(view):
+    """
+    Rate limit a view per client IP and cap how many of it run at once,
+    before it reads the request body
+
+    Client IPs come from DRF's get_ident, so REST_FRAMEWORK['NUM_PROXIES']
+    decides how much of X-Forwarded-For is trusted.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if settings.ORDER_RATE_IP_BURST:
+            ip = BaseThrottle().get_ident(request) or 'unknown'
+            retry_after = take_token(
+                bucket_key('ip', ip),
+                settings.ORDER_RATE_IP_BURST,
+                settings.ORDER_RATE_IP_SECONDS
+            )
+            if retry_after:
+                return rejection_response(
+                    'ip', retry_after, status.HTTP_429_TOO_MANY_REQUESTS,
+                    'Too many orders from your network. Please try again shortly'
+                )
+
+        if not settings.ORDER_MAX_IN_FLIGHT:
+            return view(request, *args, **kwargs)
+
+        lease = acquire_slot()
+        if lease is None:
+            return rejection_response(
+                'busy', settings.ORDER_BUSY_RETRY_AFTER, status.HTTP_503_SERVICE_UNAVAILABLE,
+                'We are receiving a lot of orders right now. Please try again in a few seconds'
+            )
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            release_slot(lease)
+    return wrapper
+
+
+def check_customer_rate(customer_info):
+    """
+    Take a token from the customer's phone and email buckets
+
+    Returns:
+        None if the order may go ahead, otherwise a 429 response
+    """
+    if not settings.ORDER_RATE_CUSTOMER_BURST:
+        return None
+    phone = normalize_phone(customer_info['phone'])
+    email = customer_info['email'].strip().lower()
+    scopes = {bucket_key('phone', phone): 'phone', bucket_key('email', email): 'email'}
+    # Both or neither: a customer over the email limit keeps their phone tokens
+    retry_after, key = take_tokens(
+        scopes,
+        settings.ORDER_RATE_CUSTOMER_BURST,
+        settings.ORDER_RATE_CUSTOMER_SECONDS
+    )
+    if retry_after:
+        return rejection_response(
+            scopes[key], retry_after, status.HTTP_429_TOO_MANY_REQUESTS,
+            'You have placed several orders in a short time. Please wait before ordering again'
+        )
+    return None
+
+
+def prune_buckets():
+    """
+    Delete buckets that have refilled completely (a new bucket starts full anyway)
+
+    Returns:
+        Number of buckets deleted
+    """
+    longest_refill = max(
+        settings.ORDER_RATE_IP_BURST * settings.ORDER_RATE_IP_SECONDS,
+        settings.ORDER_RATE_CUSTOMER_BURST * settings.ORDER_RATE_CUSTOMER_SECONDS
+    )
+    cutoff = timezone.now() - timedelta(seconds=longest_refill)
+    deleted, _ = RateLimitBucket.objects.filter(updated_at__lt=cutoff).delete()
+    return deleted
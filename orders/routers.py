@@ -0,0 +1,222 @@
+"""
+Read replica routing
+
+Views decorated with read_from_replica read orders-app tables from one of
+settings.DATABASE_REPLICAS; every write, and every read anywhere else, goes
+to the primary (default) database. A replica that cannot be reached or lags
+more than REPLICA_MAX_LAG_SECONDS behind is skipped until its next check.
+
+Read-your-writes: once a request writes, the rest of it reads from the
+primary, and ReplicaPinMiddleware sets a cookie that keeps that browser on
+the primary for REPLICA_PIN_SECONDS.
+"""
+import random
+import threading
+import time
+from functools import wraps
+from asgiref.local import Local
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, OperationalError, connections
+
+
+PIN_COOKIE = 'db_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+# Apps whose tables are read from replicas; sessions, auth etc. always use the primary
+REPLICA_APPS = {'orders'}
+
+LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+# Per request (thread or async task): whether replicas may be used, whether
+# the request is pinned to the primary, and the replica it reads from
+_state = Local()
+
+# alias -> last check result, shared by every request in this worker
+_replica_status = {}
+_status_lock = threading.Lock()
+
+
+def measure_lag(alias):
+    """Seconds the replica is behind the primary (0 when it has replayed everything)"""
+    connection = connections[alias]
+    connection.ensure_connection()
+    if connection.vendor != 'postgresql':
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(LAG_QUERY)
+        return float(cursor.fetchone()[0])
+
+
+def check_replica(alias):
+    """Connect to a replica and record whether it is usable"""
+    try:
+        lag = measure_lag(alias)
+        status = {
+            'healthy': lag <= settings.REPLICA_MAX_LAG_SECONDS,
+            'lag_seconds': round(lag, 3),
+            'error': '' if lag <= settings.REPLICA_MAX_LAG_SECONDS else 'lagging',
+        }
+    except DatabaseError as e:
+        connections[alias].close()
+        status = {'healthy': False, 'lag_seconds': None, 'error': str(e)}
+    status['checked_at'] = time.monotonic()
+
+    with _status_lock:
+        previous = _replica_status.get(alias)
+        _replica_status[alias] = status
+    if previous and previous['healthy'] != status['healthy']:
+        if status['healthy']:
+            print(f"[SUCCESS] Replica {alias} is back (lag {status['lag_seconds']}s)")
+        else:
+            print(f"[WARNING] Replica {alias} skipped: {status['error']}")
+    return status
+
+
+def get_replica_status(alias):
+    """Last check result of a replica, re-checked every REPLICA_CHECK_SECONDS"""
+    with _status_lock:
+        status = _replica_status.get(alias)
+    if status is None or time.monotonic() - status['checked_at'] >= settings.REPLICA_CHECK_SECONDS:
+        status = check_replica(alias)
+    return status
+
+
+def mark_unavailable(alias, error):
+    """Skip a replica until its next check"""
+    print(f"[WARNING] Replica {alias} skipped: {error}")
+    with _status_lock:
+        _replica_status[alias] = {
+            'healthy': False,
+            'lag_seconds': None,
+            'error': str(error),
+            'checked_at': time.monotonic(),
+        }
+
+
+def choose_replica():
+    """
+    Pick a usable replica for this request
+
+    Returns:
+        Database alias, or None when no replica is usable
+    """
+    replicas = [alias for alias in settings.DATABASE_REPLICAS if get_replica_status(alias)['healthy']]
+    random.shuffle(replicas)
+    for alias in replicas:
+        try:
+            connections[alias].ensure_connection()
+            return alias
+        except OperationalError as e:
+            mark_unavailable(alias, e)
+    return None
+
+
+def reads_from_primary():
+    """Whether this request must read from the primary"""
+    return (
+        not getattr(_state, 'replicas', False)
+        or getattr(_state, 'pinned', False)
+        or getattr(_state, 'wrote', False)
+        or connections[DEFAULT_DB_ALIAS].in_atomic_block
+    )
+
+
+def replica_failed(error):
+    """
+    Whether an error a view caught came from the replica it read from
+
+    Views that catch every exception must re-raise these, so read_from_replica
+    can run them again against the primary.
+    """
+    return isinstance(error, OperationalError) and getattr(_state, 'replica', None) is not None
+
+
+def read_from_replica(view):
+    """
+    Let a read-only view read from a replica
+
+    If the replica fails while the view runs, it is skipped and the view is
+    run again against the primary (see replica_failed).
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        _state.replicas = bool(settings.DATABASE_REPLICAS)
+        _state.replica = None
+        try:
+            return view(request, *args, **kwargs)
+        except OperationalError as e:
+            if _state.replica is None:
+                raise
+            mark_unavailable(_state.replica, e)
+            _state.replicas = False
+            return view(request, *args, **kwargs)
+        finally:
+            _state.replicas = False
+            _state.replica = None
+    return wrapper
+
+
+class ReplicaRouter:
+    """Send replica reads of read-only views to a replica, everything else to the primary"""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in REPLICA_APPS:
+            return None
+        if reads_from_primary():
+            return DEFAULT_DB_ALIAS
+        if _state.replica is None:
+            _state.replica = choose_replica()
+            if _state.replica is None:
+                # No usable replica: the rest of this request reads from the primary
+                _state.replicas = False
+                return DEFAULT_DB_ALIAS
+        return _state.replica
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label in REPLICA_APPS:
+            _state.wrote = True
+        # Also for objects that were read from a replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaPinMiddleware:
+    """Keep a browser on the primary for REPLICA_PIN_SECONDS after it writes"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.pinned = PIN_COOKIE in request.COOKIES
+        _state.wrote = request.method not in SAFE_METHODS
+        try:
+            response = self.get_response(request)
+            wrote = _state.wrote
+        finally:
+            _state.pinned = False
+            _state.wrote = False
+
+        if wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax'
+            )
+        return response
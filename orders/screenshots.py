@@ -0,0 +1,219 @@
+"""
+Payment screenshot processing
+
+A screenshot arrives as a multipart file upload, streamed to a temporary file
+by ScreenshotUploadHandler (older clients send a base64 data URL instead). It
+is decoded exactly once, checked, rotated upright, re-encoded without
+metadata, downscaled and stored next to a small thumbnail; everything
+afterwards (admin pages, emails) uses those files.
+"""
+import binascii
+import hashlib
+import io
+from collections import namedtuple
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import IntegrityError, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+from .models import PaymentScreenshot
+from .phash import band_hashes
+
+
+# Formats phones and browsers produce for screenshots
+ALLOWED_FORMATS = {'PNG', 'JPEG', 'WEBP', 'GIF'}
+
+# Content types a browser sends for those formats in a multipart upload
+UPLOAD_CONTENT_TYPES = {'image/png', 'image/jpeg', 'image/webp', 'image/gif'}
+
+ProcessedScreenshot = namedtuple(
+    'ProcessedScreenshot',
+    ['image', 'data', 'thumbnail', 'original_sha256', 'original_size', 'phashes']
+)
+
+
+class ScreenshotError(ValueError):
+    """The uploaded screenshot is not an acceptable image"""
+
+
+def too_large():
+    return ScreenshotError(f"Screenshot is larger than {settings.SCREENSHOT_MAX_BYTES // (1024 * 1024)} MB")
+
+
+def get_max_request_bytes(content_type):
+    """
+    Largest create_order body worth reading: a SCREENSHOT_MAX_BYTES screenshot
+    plus the rest of the order, as a multipart upload or base64 in JSON
+    """
+    if content_type.startswith('multipart/form-data'):
+        return settings.SCREENSHOT_MAX_BYTES + settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+    return settings.ORDER_JSON_MAX_BYTES
+
+
+class ScreenshotUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams uploaded files to a temporary file, never holding them in memory
+
+    Requests whose body is larger than a screenshot plus the order form could
+    be are refused before anything is read, and an upload is abandoned as soon
+    as it passes SCREENSHOT_MAX_BYTES.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length and content_length > get_max_request_bytes('multipart/form-data'):
+            raise too_large()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.SCREENSHOT_MAX_BYTES:
+            raise too_large()
+        return super().receive_data_chunk(raw_data, start)
+
+
+def decode_data_url(value):
+    """
+    Raw bytes of a base64 data URL (or bare base64 string)
+
+    The string is copied once, to ASCII bytes, and decoded from a view past
+    the "data:...;base64," prefix; it can be as large as the request body.
+    """
+    start = value.find(',') + 1
+    # Reject oversized uploads before spending memory on decoding them
+    if (len(value) - start) * 3 // 4 > settings.SCREENSHOT_MAX_BYTES:
+        raise too_large()
+    try:
+        return binascii.a2b_base64(memoryview(value.encode('ascii'))[start:], strict_mode=True)
+    except (binascii.Error, ValueError):
+        raise ScreenshotError('Screenshot is not valid base64 data')
+
+
+def encode_jpeg(image, quality):
+    buffer = io.BytesIO()
+    # Saving a fresh RGB image writes no EXIF, GPS or other metadata
+    image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def read_upload(upload):
+    """
+    Checked size and SHA-256 of an uploaded file, read in chunks
+
+    The file itself (usually a temporary file written by the upload handler)
+    is left in place for Pillow to read.
+    """
+    if upload.size > settings.SCREENSHOT_MAX_BYTES:
+        raise too_large()
+    if upload.content_type not in UPLOAD_CONTENT_TYPES:
+        raise ScreenshotError(f"Unsupported file type: {upload.content_type}")
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    upload.seek(0)
+    return upload.size, digest.hexdigest()
+
+
+def process_screenshot(value):
+    """
+    Decode, validate and normalize an uploaded screenshot
+
+    Args:
+        value: Uploaded file from a multipart request, or a base64 data URL
+            as sent by older versions of the payment page
+
+    Returns:
+        ProcessedScreenshot with the downscaled RGB image, its JPEG bytes, the
+        JPEG thumbnail and the image's perceptual hashes
+
+    Raises:
+        ScreenshotError: if the data is not an allowed, reasonably sized image
+    """
+    if isinstance(value, str):
+        raw = decode_data_url(value)
+        source, size, sha256 = io.BytesIO(raw), len(raw), hashlib.sha256(raw).hexdigest()
+    else:
+        size, sha256 = read_upload(value)
+        source = value
+    try:
+        with Image.open(source) as original:
+            if original.format not in ALLOWED_FORMATS:
+                raise ScreenshotError(f"Unsupported image format: {original.format}")
+            # Only the header has been read so far, so this stops decompression bombs
+            if original.width * original.height > settings.SCREENSHOT_MAX_PIXELS:
+                raise ScreenshotError('Screenshot dimensions are too large')
+            original.load()
+            image = ImageOps.exif_transpose(original)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise ScreenshotError('Screenshot is not a readable image')
+
+    if image.mode != 'RGB':
+        # Flatten transparency onto white, as it would be shown on screen
+        background = Image.new('RGB', image.size, 'white')
+        image = image.convert('RGBA')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+
+    max_dimension = settings.SCREENSHOT_MAX_DIMENSION
+    image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    thumbnail = image.copy()
+    thumbnail.thumbnail((settings.SCREENSHOT_THUMBNAIL_SIZE, settings.SCREENSHOT_THUMBNAIL_SIZE * 3), Image.LANCZOS)
+
+    return ProcessedScreenshot(
+        image=image,
+        data=encode_jpeg(image, quality=85),
+        thumbnail=encode_jpeg(thumbnail, quality=75),
+        original_sha256=sha256,
+        original_size=size,
+        phashes=band_hashes(image)
+    )
+
+
+def save_screenshot(order, processed, similar_orders=()):
+    """
+    Store a processed screenshot for an order, with the orders it looked like
+
+    The files are written right away and are not part of the transaction: a
+    caller whose transaction rolls back must delete_screenshot_files().
+    """
+    screenshot = PaymentScreenshot(
+        order_id=order.pk,
+        width=processed.image.width,
+        height=processed.image.height,
+        original_sha256=processed.original_sha256,
+        original_size=processed.original_size,
+        phashes=processed.phashes,
+        similar_orders=list(similar_orders)
+    )
+    screenshot.image.save(f"{order.order_id}.jpg", ContentFile(processed.data), save=False)
+    screenshot.thumbnail.save(f"{order.order_id}-thumb.jpg", ContentFile(processed.thumbnail), save=False)
+    try:
+        screenshot.save()
+    except Exception:
+        delete_screenshot_files(screenshot)
+        raise
+    return screenshot
+
+
+def delete_screenshot_files(screenshot):
+    """Delete the files of a screenshot whose row was rolled back"""
+    for field in (screenshot.image, screenshot.thumbnail):
+        if field.name:
+            field.storage.delete(field.name)
+
+
+def get_order_screenshot(order):
+    """
+    PaymentScreenshot of a live or archived order, or None
+
+    Orders placed before screenshots were processed at upload still carry the
+    base64 data; it is processed and stored on first access.
+    """
+    screenshot = PaymentScreenshot.objects.filter(order_id=order.pk).first()
+    if screenshot is None and order.payment_screenshot:
+        try:
+            with transaction.atomic():
+                screenshot = save_screenshot(order, process_screenshot(order.payment_screenshot))
+        except ScreenshotError as e:
+            print(f"[ERROR] Stored screenshot of order {order.order_id} is unusable: {e}")
+        except IntegrityError:
+            # Another request processed it at the same time
+            screenshot = PaymentScreenshot.objects.filter(order_id=order.pk).first()
+    return screenshot
@@ -1,5 +1,6 @@
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Order
+from .models import Order, ArchivedOrder
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -17,6 +18,48 @@ class OrderSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'order_id', 'created_at', 'updated_at']
 
 
+class ArchivedOrderSerializer(OrderSerializer):
+    """Serializer for archived orders, same shape as OrderSerializer"""
+    
+    class Meta(OrderSerializer.Meta):
+        model = ArchivedOrder
+
+
+class OrderRowSerializer:
+    """
+    Read-only OrderSerializer built from values() rows
+
+    Gives the same JSON as OrderSerializer without creating model instances or
+    running a serializer field per value. Datetimes are left as datetimes in
+    the current time zone for the renderer to format.
+
+    Usage: OrderRowSerializer(Order.objects.all(), many=True).data, or
+    OrderRowSerializer(row).data for a single row of values(*fields)
+    """
+    
+    fields = OrderSerializer.Meta.fields
+    datetime_fields = ['order_date', 'created_at', 'updated_at']
+    
+    def __init__(self, rows, many=False):
+        self.rows = rows
+        self.many = many
+    
+    def to_representation(self, row, tz):
+        # Same string as DecimalField gives: the database value already has two places
+        row['total_amount'] = str(row['total_amount'])
+        for field in self.datetime_fields:
+            if row[field] is not None:
+                row[field] = row[field].astimezone(tz)
+        return row
+    
+    @property
+    def data(self):
+        tz = timezone.get_current_timezone()
+        if not self.many:
+            return self.to_representation(dict(self.rows), tz)
+        return [self.to_representation(row, tz) for row in self.rows.values(*self.fields)]
+
+
 class OrderCreateSerializer(serializers.Serializer):
     """Serializer for creating orders from frontend data"""
     
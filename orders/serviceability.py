@@ -0,0 +1,77 @@
+"""
+In-memory pincode serviceability index
+"""
+from collections import namedtuple
+from .models import DeliveryZone, ServiceablePincode
+from .snapshots import VersionedSnapshot
+
+
+Zone = namedtuple('Zone', ['id', 'name', 'sort_order'])
+
+PincodeIndex = namedtuple('PincodeIndex', ['zones', 'pincodes'])
+
+
+def normalize_pincode(pincode):
+    """Strip whitespace so ' 400 001' and '400001' match"""
+    return ''.join(str(pincode or '').split())
+
+
+def load_pincode_index():
+    """
+    Build the lookup structure from the database
+
+    Returns:
+        PincodeIndex whose 'pincodes' maps each active pincode to its position
+        in the 'zones' tuple (ints keep the dictionary small)
+    """
+    zones = list(DeliveryZone.objects.filter(is_active=True).values_list('id', 'name', 'sort_order'))
+    zone_positions = {zone_id: position for position, (zone_id, _, _) in enumerate(zones)}
+    pincodes = {}
+    for pincode, zone_id in ServiceablePincode.objects.filter(is_active=True).values_list('pincode', 'zone_id'):
+        if zone_id in zone_positions:
+            pincodes[normalize_pincode(pincode)] = zone_positions[zone_id]
+    return PincodeIndex(tuple(Zone(*zone) for zone in zones), pincodes)
+
+
+pincode_index = VersionedSnapshot('pincodes', load_pincode_index)
+
+
+def is_serviceability_enabled():
+    """Checks only apply once at least one serviceable pincode is configured"""
+    return bool(pincode_index.get().pincodes)
+
+
+def get_delivery_zone(pincode):
+    """Zone delivering to a pincode, or None if we do not deliver there"""
+    index = pincode_index.get()
+    position = index.pincodes.get(normalize_pincode(pincode))
+    return index.zones[position] if position is not None else None
+
+
+def group_orders_by_zone(orders):
+    """
+    Group orders by delivery zone, in zone order, with unserviceable pincodes last
+
+    Sets order.delivery_zone (Zone or None) on every order.
+
+    Returns:
+        List of (zone name, list of orders); a single (None, orders) group
+        when no serviceable pincodes are configured
+    """
+    if not is_serviceability_enabled():
+        orders = list(orders)
+        for order in orders:
+            order.delivery_zone = None
+        return [(None, orders)] if orders else []
+
+    groups = {}
+    for order in orders:
+        order.delivery_zone = get_delivery_zone(order.pincode)
+        groups.setdefault(order.delivery_zone, []).append(order)
+
+    def zone_order(group):
+        zone = group[0]
+        return (1, 0, '') if zone is None else (0, zone.sort_order, zone.name)
+
+    ordered = sorted(groups.items(), key=zone_order)
+    return [(zone.name if zone else 'Outside delivery area', zone_orders) for zone, zone_orders in ordered]
@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .catalog import catalog
+from .models import DeliveryZone, ServiceablePincode, Product, Flavor
+from .serviceability import pincode_index
+from .snapshots import bump_version
+
+
+@receiver([post_save, post_delete], sender=DeliveryZone)
+@receiver([post_save, post_delete], sender=ServiceablePincode)
+def pincodes_changed(sender, **kwargs):
+    """Make every worker reload the pincode index"""
+    bump_version(pincode_index.name)
+    pincode_index.invalidate()
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Flavor)
+def catalog_changed(sender, **kwargs):
+    """Make every worker reload the catalog, so new prices apply immediately"""
+    bump_version(catalog.name)
+    catalog.invalidate()
@@ -0,0 +1,77 @@
+"""
+Versioned in-process snapshots of rarely changing tables
+
+Each worker keeps the data in memory and only re-reads a single CacheVersion
+row every CACHE_VERSION_CHECK_SECONDS to find out whether another worker (or
+the admin) changed it.
+"""
+import threading
+import time
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+from .models import CacheVersion
+
+
+# Every snapshot created, so they can all be loaded when a worker starts
+SNAPSHOTS = []
+
+
+def get_version(name):
+    """Current version number of a snapshot (0 if it was never bumped)"""
+    return CacheVersion.objects.filter(name=name).values_list('version', flat=True).first() or 0
+
+
+def bump_version(name):
+    """Mark a snapshot as changed for every worker"""
+    updated = CacheVersion.objects.filter(name=name).update(version=F('version') + 1)
+    if not updated:
+        CacheVersion.objects.get_or_create(name=name, defaults={'version': 1})
+
+
+class VersionedSnapshot:
+    """
+    Lazily loaded, version-checked in-memory copy of some data
+
+    Args:
+        name: CacheVersion name shared by every worker
+        loader: Function returning the data to keep in memory
+    """
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.data = None
+        self.version = None
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+        SNAPSHOTS.append(self)
+
+    def get(self):
+        """Return the snapshot, reloading it if its version changed"""
+        if time.monotonic() - self.checked_at < settings.CACHE_VERSION_CHECK_SECONDS and self.data is not None:
+            return self.data
+
+        with self._lock:
+            if time.monotonic() - self.checked_at >= settings.CACHE_VERSION_CHECK_SECONDS or self.data is None:
+                version = get_version(self.name)
+                if version != self.version or self.data is None:
+                    self.data = self.loader()
+                    self.version = version
+                self.checked_at = time.monotonic()
+        return self.data
+
+    def invalidate(self):
+        """Force a version check on next access"""
+        self.checked_at = 0.0
+
+
+def warm_snapshots():
+    """Load every snapshot up front so the first requests do not pay for it"""
+    for snapshot in SNAPSHOTS:
+        try:
+            snapshot.get()
+        except Exception as e:
+            print(f"[ERROR] Failed to load {snapshot.name} snapshot: {e}")
+    # Not part of a request, so Django would not close this connection itself
+    connection.close()
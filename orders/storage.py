@@ -0,0 +1,22 @@
+"""
+Static files storage generating media variants during collectstatic
+"""
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+from .media import generate_media_variants
+
+
+class MediaVariantsStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """
+    WhiteNoise's hashed, compressed storage plus responsive image variants and
+    video renditions (see orders.media)
+
+    Variants are written next to their originals before post-processing, so
+    they get hashed names and a place in the manifest like any other file.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            paths = dict(paths)
+            for name in generate_media_variants(self, list(paths)):
+                paths[name] = (self, name)
+        yield from super().post_process(paths, dry_run=dry_run, **options)
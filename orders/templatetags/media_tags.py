@@ -0,0 +1,114 @@
+"""
+<picture> and <video> markup for the variants generated by collectstatic
+
+Without a media manifest (e.g. before collectstatic has run) both tags fall
+back to the plain original file.
+"""
+import json
+import os
+from django import template
+from django.conf import settings
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
+from orders.media import MEDIA_MANIFEST_NAME
+
+
+register = template.Library()
+
+IMAGE_TYPES = {'avif': 'image/avif', 'webp': 'image/webp'}
+
+# Offered as <source> elements, best first; the original format is the <img> fallback
+MODERN_FORMATS = ['avif', 'webp']
+
+_manifest = {'mtime': None, 'data': {'images': {}, 'videos': {}}}
+
+
+def get_media_manifest():
+    """The media manifest from STATIC_ROOT, re-read whenever collectstatic rewrites it"""
+    path = os.path.join(settings.STATIC_ROOT, MEDIA_MANIFEST_NAME)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {'images': {}, 'videos': {}}
+    if mtime != _manifest['mtime']:
+        with open(path, encoding='utf-8') as handle:
+            _manifest['data'] = json.load(handle)
+        _manifest['mtime'] = mtime
+    return _manifest['data']
+
+
+def build_srcset(candidates):
+    return ', '.join(f"{static(name)} {width}w" for name, width in candidates)
+
+
+@register.simple_tag
+def responsive_image(name, alt='', sizes='100vw', **attrs):
+    """
+    <picture> with AVIF/WebP sources and resized fallbacks for a static image
+
+    Usage: {% responsive_image 'asset/icimg/kulfi.png' alt='Kulfi' sizes='300px' loading='lazy' %}
+    """
+    entry = get_media_manifest()['images'].get(name)
+    extra = format_html_join('', ' {}="{}"', attrs.items())
+
+    if entry is None:
+        return format_html('<img src="{}" alt="{}"{}>', static(name), alt, extra)
+
+    srcsets = entry['srcset']
+    sources = format_html_join(
+        '',
+        '<source type="{}" srcset="{}" sizes="{}">',
+        (
+            (IMAGE_TYPES[image_format], build_srcset(srcsets[image_format]), sizes)
+            for image_format in MODERN_FORMATS
+            if image_format in srcsets
+        )
+    )
+    fallback = next(
+        (candidates for image_format, candidates in srcsets.items() if image_format not in MODERN_FORMATS),
+        []
+    )
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}"{}></picture>',
+        sources,
+        static(entry['src']),
+        build_srcset(fallback),
+        sizes,
+        entry['width'],
+        entry['height'],
+        alt,
+        extra
+    )
+
+
+@register.simple_tag
+def responsive_video(name, **attrs):
+    """
+    <video> with a poster frame and one <source> per rendition
+
+    Renditions with a min_width are only picked on screens at least that wide;
+    the original is only offered when no rendition covers every screen.
+
+    Usage, with boolean attributes passed as True:
+    {% responsive_video 'asset/video/intro.mp4' class='hero-video' autoplay=True muted=True %}
+    """
+    entry = get_media_manifest()['videos'].get(name, {'poster': None, 'renditions': []})
+    extra = mark_safe(''.join(
+        format_html(' {}', key) if value is True else format_html(' {}="{}"', key, value)
+        for key, value in attrs.items()
+    ))
+    poster = format_html(' poster="{}"', static(entry['poster'])) if entry['poster'] else ''
+
+    sources = [
+        format_html(
+            '<source src="{}" type="video/mp4"{}>',
+            static(rendition['src']),
+            format_html(' media="(min-width: {}px)"', rendition['min_width']) if rendition.get('min_width') else ''
+        )
+        for rendition in entry['renditions']
+    ]
+    if not sources or entry['renditions'][-1].get('min_width'):
+        sources.append(format_html('<source src="{}" type="video/mp4">', static(name)))
+
+    return format_html('<video{}{}>{}</video>', poster, extra, mark_safe(''.join(sources)))
@@ -1,3 +1,1552 @@
-from django.test import TestCase
+import base64
+import gzip
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.management import call_command
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+from django.core.files.storage import FileSystemStorage
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, OperationalError, connection, connections, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, modify_settings, override_settings
+from django.test.utils import CaptureQueriesContext, captured_stdout
+from django.template import Context, Template
+from django.utils import timezone
+from PIL import Image, ImageDraw
+from rest_framework.renderers import JSONRenderer
+from . import health
+from .fragments import invalidate_order_cards
+from .analytics import get_sales_timeseries, get_summary, get_top_products, refresh_rollups
+from .archive import archive_batch, find_order, find_order_row
+from .catalog import catalog, check_order_prices, choose_encoding
+from .customers import InvalidCursor, get_customer_history, refresh_customer_summaries
+from .dbpool import ConnectionPool
+from .digest import send_admin_digest
+from .events import get_events_since, record_created, record_status_change, reserve_sequence
+from .export import iter_order_rows
+from .importer import import_orders
+from .invoices import find_invoice, get_invoice_root, invoice_path, move_flat_invoices, open_invoice, prune_invoices
+from .management.commands.benchmark_checkout_memory import MB, Command as CheckoutMemoryBenchmark
+from .management.commands.benchmark_screenshot_upload import PATHS, build_body, build_request, make_screenshot
+from .models import AdminDigestEntry, ArchivedOrder, DeliveryZone, Flavor, Order, OrderEvent, OrderItem, PaymentScreenshot, Product, RateLimitBucket, ServiceablePincode
+from .phash import MultiIndexHash, ScreenshotIndex, band_hashes, match_bands
+from .querylog import report_queries
+from .screenshots import process_screenshot
+from .serializers import OrderSerializer
+from . import ratelimit
+from .ratelimit import acquire_slot, bucket_key, check_customer_rate, get_rejection_counts, release_slot, take_token
+from . import routers
+from .routers import PIN_COOKIE, ReplicaPinMiddleware, read_from_replica
+from .serviceability import get_delivery_zone, group_orders_by_zone, is_serviceability_enabled, pincode_index
+from .views import create_order
 
-# Create your tests here.
+
+# Most queries each page may run, whatever the number of orders
+QUERY_BUDGETS = {
+    '/admin-dashboard.html': 6,
+    '/pending-orders.html': 2,
+    '/confirmed-orders.html': 2,
+    '/api/orders/list/': 3,
+    '/api/orders/ORD-TEST-00000/': 3,
+    '/api/orders/events/?orders=1': 3,
+    '/api/orders/export/?format=csv&per=item': 3,
+    '/api/analytics/': 6,
+    '/api/customers/history/?phone=9876543210': 4,
+    '/api/catalog/': 2,
+    '/admin/orders/order/': 5,
+    '/admin/orders/orderevent/': 6,
+}
+
+# Order counts each page is rendered with
+SEED_SIZES = [1, 10, 100]
+
+STATUSES = ['pending', 'confirmed', 'delivered', 'cancelled']
+
+# Second database alias for the replica routing tests: a test mirror of the primary
+REPLICA = 'replica_test'
+connections.settings.setdefault(REPLICA, {**connections.settings[DEFAULT_DB_ALIAS], 'TEST': {'MIRROR': DEFAULT_DB_ALIAS}})
+
+
+def use_temporary_media_root(test_case):
+    """Point MEDIA_ROOT at a directory removed after the test, so tests leave no files in the tree"""
+    media_root = tempfile.TemporaryDirectory()
+    test_case.addCleanup(media_root.cleanup)
+    settings_override = override_settings(MEDIA_ROOT=media_root.name)
+    settings_override.enable()
+    test_case.addCleanup(settings_override.disable)
+
+
+def use_temporary_screenshot_storage(test_case):
+    """
+    Store payment screenshots in a directory removed after the test
+
+    Their storage is created when the model is defined, so overriding
+    PRIVATE_MEDIA_ROOT does not move it.
+
+    Returns:
+        The temporary directory
+    """
+    directory = tempfile.mkdtemp()
+    test_case.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+    for name in ('image', 'thumbnail'):
+        patcher = mock.patch.object(PaymentScreenshot._meta.get_field(name), 'storage', FileSystemStorage(directory))
+        patcher.start()
+        test_case.addCleanup(patcher.stop)
+    return directory
+
+
+def make_order(order_id, **fields):
+    """Save an order with one Kulfi line, overriding any field"""
+    return Order.objects.create(**{
+        'order_id': order_id,
+        'full_name': 'Customer',
+        'email': 'customer@example.com',
+        'phone': '9876543210',
+        'delivery_address': '1 Test Street',
+        'pincode': '400001',
+        'items': [{'product': 'Kulfi', 'flavor': 'Badam', 'quantity': 2, 'unitPrice': 30, 'price': 60}],
+        'total_amount': Decimal('60.00'),
+        **fields,
+    })
+
+# Most Python memory (tracemalloc peak, in MB) one create_order may use: a
+# fixed allowance for the admin email and its PDF plus this many times the
+# request body, which a base64 screenshot has to be held in
+MEMORY_BUDGETS = {
+    'json': (10, 3),
+    'multipart': (12, 0),
+}
+
+# Screenshot sizes orders are placed with
+SCREENSHOT_SIZES = [100 * 1024, 2 * MB]
+
+# The admin pages link css/styles.css; without collectstatic there is no manifest to look it up in
+PLAIN_STATIC_STORAGES = {
+    **settings.STORAGES,
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGES)
+class QueryBudgetTests(TestCase):
+    """
+    Every admin page and API endpoint runs the same number of queries with 1,
+    10 and 100 orders, so a template or serializer change that adds a query per
+    order (N+1) fails here. Each page also has to stay within its budget.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = get_user_model().objects.create_superuser('staff', 'staff@example.com', 'password')
+
+    def setUp(self):
+        self.seeded = 0
+        session = self.client.session
+        session['is_admin'] = True
+        session['admin_username'] = 'anand'
+        session.save()
+        self.client.force_login(self.superuser)
+
+    def seed_orders(self, count):
+        """Add orders until there are count of them, cycling through the statuses"""
+        now = timezone.now()
+        orders = [
+            Order(
+                order_id=f'ORD-TEST-{number:05d}',
+                full_name=f'Customer {number}',
+                email='customer@example.com',
+                phone='+91 98765 43210',
+                delivery_address='1 Test Street',
+                pincode='400001',
+                items=[
+                    {'product': 'Kulfi', 'flavor': 'Badam', 'quantity': 2, 'unitPrice': 30, 'price': 60},
+                    {'product': 'Cone', 'flavor': 'Chocolate', 'quantity': 1, 'unitPrice': 45, 'price': 45},
+                ],
+                total_amount=Decimal('105.00'),
+                status=STATUSES[number % len(STATUSES)],
+                payment_status='verified',
+                order_date=now - timedelta(minutes=number),
+            )
+            for number in range(self.seeded, count)
+        ]
+        for order in orders:
+            order.save()
+        OrderItem.objects.bulk_create([item for order in orders for item in OrderItem.build_for_order(order)])
+        record_created(orders, actor='customer')
+        refresh_customer_summaries(orders)
+        self.seeded = count
+
+    def get(self, url):
+        response = self.client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200, url)
+
+    def count_queries(self, url):
+        """
+        Queries of one request, after a first one has loaded the per-process
+        catalog and pincode caches; the Django caches are cleared in between,
+        so order cards are rendered rather than read from the fragment cache
+        """
+        self.get(url)
+        for cache in caches.all():
+            cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            self.get(url)
+        return len(context.captured_queries), [query['sql'] for query in context.captured_queries]
+
+    def test_query_counts_do_not_grow_with_orders(self):
+        counts = {url: [] for url in QUERY_BUDGETS}
+        for size in SEED_SIZES:
+            self.seed_orders(size)
+            for url in QUERY_BUDGETS:
+                count, queries = self.count_queries(url)
+                counts[url].append(count)
+                self.assertLessEqual(
+                    count, QUERY_BUDGETS[url],
+                    f"{url} ran {count} queries with {size} orders:\n" + '\n'.join(queries)
+                )
+
+        for url, url_counts in counts.items():
+            with self.subTest(url=url):
+                self.assertEqual(
+                    len(set(url_counts)), 1,
+                    f"{url} ran {url_counts} queries with {SEED_SIZES} orders"
+                )
+
+
+@modify_settings(MIDDLEWARE={'prepend': 'orders.querylog.QueryLogMiddleware'})
+@override_settings(QUERY_LOG_REPEAT_THRESHOLD=3, QUERY_LOG_SLOW_MS=10000)
+class QueryLogMiddlewareTests(TestCase):
+
+    def test_reports_call_sites(self):
+        Order.objects.create(
+            order_id='ORD-LOG-0', full_name='Customer', email='customer@example.com',
+            phone='9876543210', delivery_address='1 Test Street', pincode='400001',
+            items=[], total_amount=Decimal('10.00')
+        )
+        with captured_stdout() as stdout, self.settings(QUERY_LOG_REPEAT_THRESHOLD=1):
+            self.client.get('/api/orders/ORD-LOG-0/')
+        report = stdout.getvalue()
+        self.assertIn('[WARNING] GET /api/orders/ORD-LOG-0/', report)
+        self.assertIn('orders/archive.py', report)
+
+    def test_reports_duplicates_and_repeats(self):
+        request = RequestFactory().get('/pending-orders.html')
+        queries = (
+            [('default', 'SELECT a WHERE id = %s', '(1,)', 1.0, 'orders/views.py:10 in view')] * 2
+            + [('default', 'SELECT b WHERE id = %s', f'({number},)', 1.0, 'orders/views.py:20 in view') for number in range(3)]
+        )
+        with captured_stdout() as stdout:
+            report_queries(request, queries)
+        report = stdout.getvalue()
+        self.assertIn('2x duplicate [default] SELECT a', report)
+        self.assertIn('3x (0 duplicates) [default] SELECT b', report)
+        self.assertIn('orders/views.py:20 in view', report)
+
+
+class UnreadableStream(io.BytesIO):
+
+    def read(self, *args):
+        raise AssertionError('The request body was read')
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    CATALOG_PRICE_MISMATCH_ACTION='flag',
+    ORDER_RATE_IP_BURST=0,
+    ORDER_RATE_CUSTOMER_BURST=0,
+    ORDER_MAX_IN_FLIGHT=0,
+    ADMIN_NOTIFICATION_MODE='immediate',
+)
+class CheckoutMemoryTests(TestCase):
+    """
+    create_order stays within its memory budget whether the screenshot comes
+    as base64 JSON or as a multipart upload, and refuses oversize bodies
+    without reading them
+    """
+
+    def setUp(self):
+        self.benchmark = CheckoutMemoryBenchmark()
+        # A small order first, so imports and caches are not counted
+        for path in PATHS:
+            self.benchmark.measure_request(path, make_screenshot(10000))
+
+    def test_peak_memory_within_budget(self):
+        for size in SCREENSHOT_SIZES:
+            screenshot = make_screenshot(size)
+            for path, (allowance, per_body_mb) in MEMORY_BUDGETS.items():
+                with self.subTest(path=path, size=size):
+                    body_mb = len(build_body(path, screenshot)[1]) / MB
+                    status_code, peak = self.benchmark.measure_request(path, screenshot)
+                    self.assertEqual(status_code, 201)
+                    self.assertLessEqual(
+                        peak, allowance + per_body_mb * body_mb,
+                        f"{path} order with a {body_mb:.1f} MB body peaked at {peak:.1f} MB"
+                    )
+
+    @override_settings(SCREENSHOT_MAX_BYTES=1000, ORDER_JSON_MAX_BYTES=2000, DATA_UPLOAD_MAX_MEMORY_SIZE=1000)
+    def test_rejects_oversize_body_unread(self):
+        for path in PATHS:
+            with self.subTest(path=path):
+                content_type, body = build_body(path, make_screenshot(10000))
+                response = create_order(build_request(content_type, UnreadableStream(), len(body)))
+                self.assertEqual(response.status_code, 413)
+                self.assertFalse(Order.objects.exists())
+
+
+class HealthCheckTests(TestCase):
+
+    def setUp(self):
+        health._cache.update(checks=None, checked_at=0.0)
+        self.addCleanup(health._cache.update, checks=None, checked_at=0.0)
+
+    def test_shallow_check_does_not_touch_the_database(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/health/live/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['mode'], 'shallow')
+
+    def test_deep_check_caches_probe_results(self):
+        probe = mock.Mock()
+        with mock.patch.dict(health.PROBES, {'database': (probe, True), 'smtp': (probe, False), 'storage': (probe, False)}):
+            self.client.get('/api/health/ready/')
+            response = self.client.get('/api/health/ready/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'OK')
+        self.assertEqual(probe.call_count, 3)
+
+    def test_failing_critical_probe_is_an_error(self):
+        failing = mock.Mock(side_effect=OSError('connection refused'))
+        with mock.patch.dict(health.PROBES, {'database': (failing, True), 'smtp': (mock.Mock(), False), 'storage': (failing, False)}):
+            response = self.client.get('/api/health/')
+        self.assertEqual(response.status_code, 500)
+        checks = response.json()['checks']
+        self.assertEqual(checks['database']['status'], 'ERROR')
+        self.assertEqual(checks['database']['error'], 'connection refused')
+        self.assertEqual(checks['smtp']['status'], 'OK')
+
+
+class ArchiveTests(TestCase):
+
+    def test_archives_only_old_completed_orders(self):
+        long_ago = timezone.now() - timedelta(days=100)
+        for order_id, status in [('ORD-OLD-DELIVERED', 'delivered'), ('ORD-OLD-CANCELLED', 'cancelled'), ('ORD-OLD-PENDING', 'pending')]:
+            make_order(order_id, status=status)
+        Order.objects.update(updated_at=long_ago)
+        make_order('ORD-NEW-DELIVERED', status='delivered')
+
+        call_command('archive_orders', '--older-than-days', '90', '--batch-size', '1', stdout=io.StringIO())
+
+        self.assertEqual(
+            sorted(Order.objects.values_list('order_id', flat=True)),
+            ['ORD-NEW-DELIVERED', 'ORD-OLD-PENDING']
+        )
+        self.assertEqual(
+            sorted(ArchivedOrder.objects.values_list('order_id', flat=True)),
+            ['ORD-OLD-CANCELLED', 'ORD-OLD-DELIVERED']
+        )
+        archived = ArchivedOrder.objects.get(order_id='ORD-OLD-DELIVERED')
+        self.assertEqual(archived.updated_at, long_ago)
+
+    def test_find_order_looks_in_live_and_archived_orders(self):
+        make_order('ORD-OLD', status='delivered')
+        Order.objects.update(updated_at=timezone.now() - timedelta(days=100))
+        call_command('archive_orders', '--older-than-days', '90', stdout=io.StringIO())
+        make_order('ORD-LIVE')
+
+        self.assertIsInstance(find_order('ORD-LIVE'), Order)
+        self.assertIsInstance(find_order('ORD-OLD'), ArchivedOrder)
+        self.assertEqual(find_order_row('ORD-OLD', ['status']), {'status': 'delivered'})
+        with self.assertRaises(Order.DoesNotExist):
+            find_order('ORD-MISSING')
+
+    def test_reopened_orders_stay_live(self):
+        order = make_order('ORD-OLD', status='delivered')
+        Order.objects.update(updated_at=timezone.now() - timedelta(days=100))
+        # Reopened after archive_orders read its id
+        order.status = 'processing'
+        order.save()
+
+        self.assertEqual(archive_batch([order.pk], older_than_days=90), 0)
+        self.assertTrue(Order.objects.filter(order_id='ORD-OLD').exists())
+        self.assertFalse(ArchivedOrder.objects.exists())
+
+    def test_existing_archived_copy_rolls_back(self):
+        order = make_order('ORD-OLD', status='delivered')
+        Order.objects.update(updated_at=timezone.now() - timedelta(days=100))
+        ArchivedOrder.objects.create(**{
+            **Order.objects.filter(pk=order.pk).values(*[
+                field.attname for field in Order._meta.concrete_fields if field.attname != 'id'
+            ]).get(),
+            'status': 'cancelled',
+        })
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            archive_batch([order.pk], older_than_days=90)
+        self.assertEqual(Order.objects.get(pk=order.pk).status, 'delivered')
+        self.assertEqual(ArchivedOrder.objects.get(order_id='ORD-OLD').status, 'cancelled')
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        # Local (Asia/Kolkata) times around the 2 to 3 March range
+        created = {
+            'ORD-1-MAR-LATE': datetime(2026, 3, 1, 23, 59),
+            'ORD-2-MAR-EARLY': datetime(2026, 3, 2, 0, 0),
+            'ORD-3-MAR-LATE': datetime(2026, 3, 3, 23, 59),
+            'ORD-4-MAR-EARLY': datetime(2026, 3, 4, 0, 0),
+        }
+        for order_id, created_at in created.items():
+            make_order(order_id, status='cancelled' if order_id == 'ORD-3-MAR-LATE' else 'pending')
+            Order.objects.filter(order_id=order_id).update(created_at=timezone.make_aware(created_at))
+
+    def export(self, **filters):
+        return [row['order_id'] for row in iter_order_rows(**filters)]
+
+    def test_date_range_includes_whole_local_days(self):
+        self.assertEqual(
+            self.export(start=date(2026, 3, 2), end=date(2026, 3, 3)),
+            ['ORD-2-MAR-EARLY', 'ORD-3-MAR-LATE']
+        )
+        self.assertEqual(self.export(start=date(2026, 3, 4)), ['ORD-4-MAR-EARLY'])
+        self.assertEqual(self.export(end=date(2026, 3, 1)), ['ORD-1-MAR-LATE'])
+
+    def test_status_filter_and_archived_orders(self):
+        ArchivedOrder.objects.create(**{
+            **Order.objects.filter(order_id='ORD-3-MAR-LATE').values(*[
+                field.attname for field in Order._meta.concrete_fields if field.attname != 'id'
+            ]).get(),
+            'order_id': 'ORD-ARCHIVED',
+        })
+        self.assertEqual(self.export(statuses=['cancelled']), ['ORD-3-MAR-LATE', 'ORD-ARCHIVED'])
+        self.assertEqual(self.export(statuses=['cancelled'], include_archived=False), ['ORD-3-MAR-LATE'])
+
+    def test_item_rows(self):
+        rows = list(iter_order_rows(start=date(2026, 3, 4), per='item'))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(
+            {key: rows[0][key] for key in ('order_id', 'product', 'quantity', 'unit_price', 'amount')},
+            {'order_id': 'ORD-4-MAR-EARLY', 'product': 'Kulfi', 'quantity': 2, 'unit_price': Decimal('30'), 'amount': Decimal('60')}
+        )
+
+
+class ImportTests(TestCase):
+
+    def row(self, order_id=None, **fields):
+        """Row in the export_orders shape"""
+        return {
+            'order_id': order_id,
+            'full_name': 'Old Customer',
+            'email': 'old@example.com',
+            'phone': '+91 98765 43210',
+            'delivery_address': '2 Old Street',
+            'pincode': '400002',
+            'items': [{'product': 'Kulfi', 'flavor': 'Badam', 'quantity': 1, 'unitPrice': 30, 'price': 30}],
+            'total_amount': '30.00',
+            'order_date': '2024-01-15T12:00:00+05:30',
+            'status': 'delivered',
+            **fields,
+        }
+
+    def test_skips_duplicates_and_reports_invalid_rows(self):
+        make_order('ORD-EXISTING')
+        rows = [
+            self.row('ORD-IMPORTED'),
+            self.row('ORD-EXISTING'),
+            self.row('ORD-IMPORTED'),
+            self.row('ORD-NO-EMAIL', email=None),
+            self.row('ORD-NO-ITEMS', items=[]),
+        ]
+        progress = list(import_orders(rows, chunk_size=2))
+
+        self.assertEqual(sum(chunk['imported'] for chunk in progress), 1)
+        self.assertEqual(sum(chunk['skipped'] for chunk in progress), 2)
+        errors = [error for chunk in progress for error in chunk['errors']]
+        self.assertEqual([number for number, _ in errors], [4, 5])
+
+        order = Order.objects.get(order_id='ORD-IMPORTED')
+        self.assertEqual(order.phone_normalized, '9876543210')
+        self.assertEqual(order.created_at, order.order_date)
+        self.assertEqual(list(order.line_items.values_list('product', 'quantity')), [('Kulfi', 1)])
+
+    def test_generated_ids_avoid_existing_orders(self):
+        make_order('ORD-EXISTING')
+        generated = [['ORD-EXISTING', 'ORD-GENERATED-1'], ['ORD-GENERATED-2']]
+        with mock.patch('orders.importer.generate_order_ids', side_effect=generated):
+            progress = list(import_orders([self.row(), self.row()]))
+
+        self.assertEqual(progress[0]['imported'], 2)
+        self.assertEqual(
+            sorted(Order.objects.values_list('order_id', flat=True)),
+            ['ORD-EXISTING', 'ORD-GENERATED-1', 'ORD-GENERATED-2']
+        )
+
+    def test_dry_run_inserts_nothing(self):
+        progress = list(import_orders([self.row('ORD-IMPORTED')], dry_run=True))
+        self.assertEqual(progress[0]['imported'], 1)
+        self.assertFalse(Order.objects.exists())
+
+
+class OrderItemTests(TestCase):
+
+    def test_price_is_the_unit_price(self):
+        line_item = OrderItem.from_json({'product': 'Kulfi', 'flavor': 'Badam', 'quantity': 3, 'unitPrice': 30, 'price': 90})
+        self.assertEqual(line_item.price, Decimal('30.00'))
+        self.assertEqual(line_item.amount, Decimal('90.00'))
+
+    def test_unit_price_falls_back_to_line_total_over_quantity(self):
+        line_item = OrderItem.from_json({'name': 'Cone', 'quantity': 3, 'price': 100})
+        self.assertEqual(line_item.product, 'Cone')
+        self.assertEqual(line_item.price, Decimal('33.33'))
+
+    def test_line_items_are_written_with_the_order(self):
+        order = make_order('ORD-ITEMS', items=[
+            {'product': 'Kulfi', 'flavor': 'Badam', 'quantity': 2, 'unitPrice': 30, 'price': 60},
+            {'product': 'Cone', 'flavor': 'Chocolate', 'quantity': 1, 'unitPrice': 45, 'price': 45},
+        ])
+        OrderItem.sync_order(order)
+        self.assertEqual(
+            [line_item.as_dict() for line_item in order.get_line_items()],
+            [
+                {'product': 'Kulfi', 'flavor': 'Badam', 'quantity': 2, 'unitPrice': Decimal('30.00'), 'price': Decimal('60.00')},
+                {'product': 'Cone', 'flavor': 'Chocolate', 'quantity': 1, 'unitPrice': Decimal('45.00'), 'price': Decimal('45.00')},
+            ]
+        )
+
+
+class SalesAnalyticsTests(TestCase):
+
+    def place_order(self, order_id):
+        with transaction.atomic():
+            order = make_order(order_id)
+            OrderItem.sync_order(order)
+            record_created([order], actor='customer')
+        return order
+
+    def change_status(self, order, status):
+        previous_status, previous_payment_status = order.status, order.payment_status
+        order.status = status
+        with transaction.atomic():
+            order.save()
+            record_status_change(order, previous_status, previous_payment_status, actor='admin:test')
+
+    def summary(self):
+        today = timezone.localdate()
+        return get_summary(today, today)
+
+    def test_only_accepted_orders_are_counted(self):
+        accepted, rejected = self.place_order('ORD-ACCEPTED'), self.place_order('ORD-REJECTED')
+        self.place_order('ORD-PENDING')
+        refresh_rollups()
+        self.assertEqual(self.summary()['orders'], 0)
+
+        self.change_status(accepted, 'confirmed')
+        self.change_status(rejected, 'cancelled')
+        refresh_rollups()
+        self.assertEqual(self.summary()['orders'], 1)
+        self.assertEqual(self.summary()['revenue'], 60.0)
+        today = timezone.localdate()
+        self.assertEqual(get_top_products(today, today), [{'name': 'Kulfi', 'quantity': 2, 'revenue': 60.0}])
+
+    def test_cancelled_orders_are_subtracted(self):
+        order = self.place_order('ORD-CANCELLED')
+        self.change_status(order, 'confirmed')
+        refresh_rollups()
+        self.change_status(order, 'delivered')
+        self.change_status(order, 'cancelled')
+        refresh_rollups()
+        summary = self.summary()
+        self.assertEqual((summary['orders'], summary['revenue']), (0, 0.0))
+        self.assertEqual(get_top_products(timezone.localdate(), timezone.localdate())[0]['quantity'], 0)
+
+    def test_rebuild_matches_incremental_refresh(self):
+        for number in range(3):
+            order = self.place_order(f'ORD-{number}')
+            refresh_rollups()
+            self.change_status(order, 'confirmed')
+        refresh_rollups()
+        incremental = self.summary()
+        refresh_rollups(rebuild=True)
+        self.assertEqual(self.summary(), incremental)
+        self.assertEqual(incremental['orders'], 3)
+
+    def test_date_range_covers_whole_local_days(self):
+        # Local (Asia/Kolkata) times; the first is still 1 March in UTC
+        for order_id, created_at in [('ORD-EARLY', datetime(2026, 3, 2, 0, 30)), ('ORD-LATE', datetime(2026, 3, 2, 23, 30)), ('ORD-NEXT', datetime(2026, 3, 3, 0, 0))]:
+            order = self.place_order(order_id)
+            order.created_at = timezone.make_aware(created_at)
+            self.change_status(order, 'confirmed')
+        refresh_rollups()
+
+        self.assertEqual(get_summary(date(2026, 3, 2), date(2026, 3, 2))['orders'], 2)
+        self.assertEqual(get_summary(date(2026, 3, 1), date(2026, 3, 1))['orders'], 0)
+        days = get_sales_timeseries('day', date(2026, 3, 1), date(2026, 3, 3))
+        self.assertEqual(
+            [(timezone.localtime(row['bucket']).date(), row['orders']) for row in days],
+            [(date(2026, 3, 2), 2), (date(2026, 3, 3), 1)]
+        )
+
+
+def reset_snapshot(snapshot):
+    """Drop a per-process snapshot, whose version may be left over from another test"""
+    snapshot.data = None
+    snapshot.version = None
+
+
+class ServiceabilityTests(TestCase):
+
+    def setUp(self):
+        reset_snapshot(pincode_index)
+        self.addCleanup(reset_snapshot, pincode_index)
+
+    def test_everything_is_serviceable_until_pincodes_are_configured(self):
+        self.assertFalse(is_serviceability_enabled())
+        self.assertEqual(group_orders_by_zone([]), [])
+
+    def test_pincodes_map_to_active_zones(self):
+        south = DeliveryZone.objects.create(name='South', sort_order=2)
+        north = DeliveryZone.objects.create(name='North', sort_order=1)
+        closed = DeliveryZone.objects.create(name='Closed', is_active=False)
+        ServiceablePincode.objects.create(pincode='400001', zone=south)
+        ServiceablePincode.objects.create(pincode='400002', zone=north)
+        ServiceablePincode.objects.create(pincode='400003', zone=north, is_active=False)
+        ServiceablePincode.objects.create(pincode='400004', zone=closed)
+
+        self.assertTrue(is_serviceability_enabled())
+        self.assertEqual(get_delivery_zone(' 400 001').name, 'South')
+        self.assertIsNone(get_delivery_zone('400003'))
+        self.assertIsNone(get_delivery_zone('400004'))
+
+        orders = [Order(order_id=f'ORD-{pincode}', pincode=pincode) for pincode in ['400001', '400009', '400002', '400001']]
+        groups = group_orders_by_zone(orders)
+        self.assertEqual(
+            [(name, [order.order_id for order in zone_orders]) for name, zone_orders in groups],
+            [
+                ('North', ['ORD-400002']),
+                ('South', ['ORD-400001', 'ORD-400001']),
+                ('Outside delivery area', ['ORD-400009']),
+            ]
+        )
+
+    def test_changes_reach_the_index(self):
+        zone = DeliveryZone.objects.create(name='Central')
+        pincode = ServiceablePincode.objects.create(pincode='400001', zone=zone)
+        self.assertEqual(get_delivery_zone('400001').name, 'Central')
+        pincode.delete()
+        self.assertIsNone(get_delivery_zone('400001'))
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    CATALOG_PRICE_MISMATCH_ACTION='reject',
+    ORDER_RATE_IP_BURST=0,
+    ORDER_RATE_CUSTOMER_BURST=0,
+    ORDER_MAX_IN_FLIGHT=0,
+)
+class CatalogPriceTests(TestCase):
+
+    def setUp(self):
+        reset_snapshot(catalog)
+        self.addCleanup(reset_snapshot, catalog)
+        product = Product.objects.create(name='Test Bar')
+        self.flavor = Flavor.objects.create(product=product, name='Mango', price=Decimal('50.00'))
+
+    def order(self, unit_price, quantity=2, total=None):
+        line_total = unit_price * quantity
+        return {
+            'customerInfo': {
+                'fullName': 'Customer', 'email': 'customer@example.com', 'phone': '9876543210',
+                'deliveryAddress': '1 Test Street', 'pincode': '400001',
+            },
+            'items': [{'product': 'Test Bar', 'flavor': 'Mango', 'quantity': quantity, 'unitPrice': unit_price, 'price': line_total}],
+            'totalAmount': line_total if total is None else total,
+            'orderDate': timezone.now().isoformat(),
+        }
+
+    def test_current_prices_pass(self):
+        order = self.order(50)
+        self.assertEqual(check_order_prices(order['items'], order['totalAmount']), (Decimal('100.00'), []))
+
+    def test_stale_and_tampered_prices_are_problems(self):
+        self.flavor.price = Decimal('55.00')
+        self.flavor.save()
+        stale = self.order(50)
+        self.assertEqual(
+            check_order_prices(stale['items'], stale['totalAmount'])[1],
+            ['Test Bar (Mango) x2 costs ₹110.00, not ₹100']
+        )
+        tampered = self.order(55, total=1)
+        self.assertEqual(
+            check_order_prices(tampered['items'], tampered['totalAmount'])[1],
+            ['Order total is ₹110.00, not ₹1']
+        )
+        self.flavor.is_available = False
+        self.flavor.save()
+        self.assertEqual(
+            check_order_prices(self.order(55)['items'], 110)[1],
+            ['Test Bar (Mango) is currently unavailable']
+        )
+
+    def test_create_order_rejects_stale_prices(self):
+        self.flavor.price = Decimal('55.00')
+        self.flavor.save()
+        with self.settings(ORDER_RATE_CUSTOMER_BURST=1):
+            response = self.client.post('/api/orders/', self.order(50), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Order does not match the menu')
+        self.assertFalse(Order.objects.exists())
+        # A rejected order costs the customer no rate limit tokens
+        self.assertFalse(RateLimitBucket.objects.exists())
+
+        response = self.client.post('/api/orders/', self.order(55), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+
+
+def draw_payment_screenshot(seed):
+    """Phone-sized screenshot with a status bar and lines of "words" (dark boxes) of random widths"""
+    rng = random.Random(seed)
+    image = Image.new('RGB', (1080, 2200), 'white')
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, 1080, 60), fill=(30, 30, 30))
+    for line in range(14):
+        top = 200 + line * 130
+        x = rng.randint(40, 200)
+        while x < 900:
+            width = rng.randint(30, 160)
+            draw.rectangle((x, top, x + width, top + rng.choice([40, 50, 60])), fill=(rng.randint(0, 90),) * 3)
+            x += width + rng.randint(20, 40)
+    return image
+
+
+class ScreenshotHashTests(TestCase):
+
+    def index_of(self, images):
+        index = MultiIndexHash()
+        for value, image in enumerate(images):
+            for value_hash in band_hashes(image):
+                index.add(value_hash, value)
+        return index
+
+    def test_search_matches_brute_force(self):
+        rng = random.Random(1)
+        hashes = [rng.getrandbits(64) for _ in range(2000)]
+        # Near copies, so every radius has matches
+        hashes += [value_hash ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64)) for value_hash in hashes[:200]]
+        index = MultiIndexHash()
+        for value, value_hash in enumerate(hashes):
+            index.add(value_hash, value)
+
+        for query in hashes[:50] + [rng.getrandbits(64) for _ in range(50)]:
+            for radius in range(8):
+                expected = {value for value, value_hash in enumerate(hashes) if (value_hash ^ query).bit_count() <= radius}
+                self.assertEqual(index.search(query, radius), expected)
+        self.assertIsNone(index.search(hashes[0], 64, limit=10))
+
+    def test_cropped_and_resized_copies_match(self):
+        original = draw_payment_screenshot(1)
+        index = self.index_of([original, draw_payment_screenshot(2)])
+        copies = {
+            'status bar cropped': original.crop((0, 120, 1080, 2200)),
+            'bottom cropped': original.crop((0, 0, 1080, 1900)),
+            'resized': original.resize((720, 1467), Image.LANCZOS),
+        }
+        for name, copy in copies.items():
+            with self.subTest(name):
+                matches = match_bands(index, band_hashes(copy), radius=2, common_limit=50, min_fraction=0.8)
+                self.assertEqual([value for _, value in matches], [0])
+
+        other = match_bands(index, band_hashes(draw_payment_screenshot(3)), radius=2, common_limit=50, min_fraction=0.8)
+        self.assertEqual(other, [])
+
+
+class ScreenshotIndexTests(TestCase):
+
+    def add_screenshot(self, pk):
+        PaymentScreenshot.objects.create(
+            pk=pk, order_id=pk, image=f'{pk}.jpg', thumbnail=f'{pk}-thumb.jpg', width=1, height=1,
+            original_sha256='0' * 64, original_size=1, phashes=[pk]
+        )
+
+    def indexed(self, index):
+        return {value_hash for value_hash in index.index.hashes}
+
+    def test_rows_committed_late_are_picked_up(self):
+        index = ScreenshotIndex()
+        self.add_screenshot(1)
+        self.add_screenshot(4)
+        index.sync()
+        self.assertEqual(self.indexed(index), {1, 4})
+        self.assertEqual(set(index.gaps), {2, 3})
+
+        # Screenshot 2's transaction commits after 4 was synced
+        self.add_screenshot(2)
+        self.add_screenshot(5)
+        index.sync()
+        index.sync()
+        self.assertEqual(sorted(index.index.hashes), [1, 2, 4, 5])
+        self.assertEqual(set(index.gaps), {3})
+
+    @override_settings(SCREENSHOT_INDEX_GAP_SECONDS=0)
+    def test_gaps_are_given_up(self):
+        index = ScreenshotIndex()
+        self.add_screenshot(1)
+        self.add_screenshot(3)
+        index.sync()
+        self.add_screenshot(2)
+        index.sync()
+        self.assertEqual(self.indexed(index), {1, 3})
+        self.assertEqual(index.gaps, {})
+
+
+
+@override_settings(ADMIN_EMAIL='admin@example.com', ADMIN_DIGEST_MAX_ORDERS=2, ADMIN_DIGEST_INTERVAL_MINUTES=15)
+class AdminDigestTests(TestCase):
+
+    def setUp(self):
+        for number in range(1, 6):
+            order = make_order(f'ORD-{number}')
+            AdminDigestEntry.objects.create(order_id=order.pk)
+
+    def send(self, **kwargs):
+        with captured_stdout():
+            return send_admin_digest(**kwargs)
+
+    def test_full_batches_are_sent(self):
+        self.assertEqual(self.send(), 4)
+        self.assertEqual([message.subject for message in mail.outbox], ['🍦 2 New Orders - Anand Ice Cream'] * 2)
+        self.assertIn('ORD-1', mail.outbox[0].body)
+        self.assertIn('ORD-3', mail.outbox[1].body)
+        # The last order waits for a full batch or the interval
+        self.assertEqual(list(AdminDigestEntry.objects.values_list('order__order_id', flat=True)), ['ORD-5'])
+
+        AdminDigestEntry.objects.update(created_at=timezone.now() - timedelta(minutes=15))
+        self.assertEqual(self.send(), 1)
+        self.assertEqual(mail.outbox[2].subject, '🍦 1 New Order - Anand Ice Cream')
+        self.assertFalse(AdminDigestEntry.objects.exists())
+
+    def test_entries_requeued_when_send_fails(self):
+        queued = dict(AdminDigestEntry.objects.values_list('pk', 'created_at'))
+        waiting = []
+
+        def fail_send():
+            # The batch being sent is off the queue, and nothing is left locked
+            waiting.append(AdminDigestEntry.objects.count())
+            raise OSError('SMTP down')
+
+        with mock.patch('orders.digest.EmailMessage.send', side_effect=fail_send):
+            with self.assertRaises(OSError):
+                self.send(force=True)
+        self.assertEqual(waiting, [3])
+        self.assertEqual(dict(AdminDigestEntry.objects.values_list('pk', 'created_at')), queued)
+
+        self.assertEqual(self.send(force=True), 5)
+        self.assertEqual(len(mail.outbox), 3)
+
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRoutingTests(TransactionTestCase):
+    # TestCase would wrap every test in a transaction, and reads inside one use the primary
+    databases = {DEFAULT_DB_ALIAS, REPLICA}
+
+    def setUp(self):
+        routers._replica_status.clear()
+        self.reads = []
+
+    def read(self, request):
+        self.reads.append((Order.objects.all().db, get_user_model().objects.all().db))
+        return HttpResponse()
+
+    def write_and_read(self, request):
+        make_order('ORD-1')
+        return self.read(request)
+
+    def run_view(self, view, method='get', cookies=None, replicas=True):
+        request = getattr(RequestFactory(), method)('/')
+        request.COOKIES.update(cookies or {})
+        return ReplicaPinMiddleware(read_from_replica(view) if replicas else view)(request)
+
+    def test_reads_use_replica(self):
+        response = self.run_view(self.read)
+        self.assertEqual(self.reads, [(REPLICA, DEFAULT_DB_ALIAS)])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+        # Only views decorated with read_from_replica
+        self.run_view(self.read, replicas=False)
+        self.assertEqual(self.reads[-1], (DEFAULT_DB_ALIAS, DEFAULT_DB_ALIAS))
+
+    def test_writes_pin_to_primary(self):
+        response = self.run_view(self.write_and_read)
+        self.assertEqual(self.reads, [(DEFAULT_DB_ALIAS, DEFAULT_DB_ALIAS)])
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        self.run_view(self.read, method='post')
+        self.run_view(self.read, cookies={PIN_COOKIE: '1'})
+        self.assertEqual(self.reads[1:], [(DEFAULT_DB_ALIAS, DEFAULT_DB_ALIAS)] * 2)
+        self.run_view(self.read)
+        self.assertEqual(self.reads[-1][0], REPLICA)
+
+    def test_lagging_replica_skipped(self):
+        with override_settings(REPLICA_MAX_LAG_SECONDS=5), mock.patch('orders.routers.measure_lag', return_value=30):
+            with captured_stdout():
+                self.run_view(self.read)
+        self.assertEqual(self.reads, [(DEFAULT_DB_ALIAS, DEFAULT_DB_ALIAS)])
+        self.assertFalse(routers._replica_status[REPLICA]['healthy'])
+
+    def test_failover_to_primary(self):
+        make_order('ORD-1')
+        replica = connections[REPLICA]
+        replica.ensure_connection()
+        for path in ['/api/orders/list/', '/api/orders/ORD-1/']:
+            routers._replica_status.clear()
+            with self.subTest(path), captured_stdout():
+                with mock.patch.object(replica, 'cursor', side_effect=OperationalError('server closed the connection')):
+                    response = self.client.get(path)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.json()['success'])
+                self.assertFalse(routers._replica_status[REPLICA]['healthy'])
+
+        # Without the failure, the same view is answered by the replica
+        routers._replica_status.clear()
+        with CaptureQueriesContext(replica) as queries:
+            response = self.client.get('/api/orders/list/')
+        self.assertEqual(response.json()['count'], 1)
+        self.assertTrue(any('orders_order' in query['sql'] for query in queries.captured_queries))
+
+
+
+class FakeConnection:
+    """DB-API connection stand-in that tracks its transaction"""
+
+    def __init__(self, fail_rollback=False):
+        self.closed = False
+        self.autocommit = True
+        self.in_transaction = False
+        self.fail_rollback = fail_rollback
+
+    def rollback(self):
+        if self.fail_rollback:
+            raise OSError('server closed the connection unexpectedly')
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(TestCase):
+
+    def setUp(self):
+        self.pool = ConnectionPool(f'pool_{self._testMethodName}', max_size=1, timeout=0.01)
+
+    def test_released_connection_is_reset(self):
+        connection = self.pool.acquire(FakeConnection)
+        # Returned mid-transaction, e.g. by a request that turned autocommit off
+        connection.autocommit = False
+        connection.in_transaction = True
+        self.pool.release(connection)
+
+        self.assertEqual(self.pool.idle, [connection])
+        self.assertFalse(connection.in_transaction)
+        self.assertTrue(connection.autocommit)
+        self.assertIs(self.pool.acquire(FakeConnection), connection)
+
+    def test_connection_discarded_when_reset_fails(self):
+        connection = self.pool.acquire(lambda: FakeConnection(fail_rollback=True))
+        connection.in_transaction = True
+        self.pool.release(connection)
+
+        self.assertTrue(connection.closed)
+        self.assertEqual(self.pool.idle, [])
+        self.assertEqual(self.pool.metrics.snapshot()['open'], 0)
+        # Its slot is free again
+        self.assertIsNot(self.pool.acquire(FakeConnection), connection)
+
+
+
+class RateLimitTests(TestCase):
+
+    def setUp(self):
+        ratelimit._slots_created = 0
+        self.start = timezone.now()
+
+    def at(self, seconds):
+        return mock.patch('django.utils.timezone.now', return_value=self.start + timedelta(seconds=seconds))
+
+    def test_bucket_refills(self):
+        with self.at(0):
+            self.assertEqual([take_token('ip:test', 3, 10) for _ in range(3)], [0, 0, 0])
+            self.assertAlmostEqual(take_token('ip:test', 3, 10), 10)
+        with self.at(4):
+            self.assertAlmostEqual(take_token('ip:test', 3, 10), 6)
+        with self.at(10):
+            self.assertEqual(take_token('ip:test', 3, 10), 0)
+            self.assertAlmostEqual(take_token('ip:test', 3, 10), 10)
+        # Never more than burst tokens, however long the bucket sat
+        with self.at(1000):
+            self.assertEqual([take_token('ip:test', 3, 10) for _ in range(3)], [0, 0, 0])
+            self.assertGreater(take_token('ip:test', 3, 10), 0)
+        # Other keys have their own bucket
+        with self.at(1000):
+            self.assertEqual(take_token('ip:other', 3, 10), 0)
+
+    @override_settings(ORDER_RATE_CUSTOMER_BURST=1, ORDER_RATE_CUSTOMER_SECONDS=360)
+    def test_customer_denied(self):
+        customer = {'phone': '+91 98765 43210', 'email': 'Customer@Example.com'}
+        rejected = get_rejection_counts().get('phone', 0)
+        self.assertIsNone(check_customer_rate(customer))
+
+        # Same customer, written differently
+        response = check_customer_rate({'phone': '9876543210', 'email': 'customer@example.com '})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '360')
+        self.assertEqual(get_rejection_counts()['phone'], rejected + 1)
+
+    @override_settings(ORDER_RATE_CUSTOMER_BURST=2, ORDER_RATE_CUSTOMER_SECONDS=360)
+    def test_customer_buckets_taken_together(self):
+        check_customer_rate({'phone': '9876543210', 'email': 'first@example.com'})
+        check_customer_rate({'phone': '9123456789', 'email': 'first@example.com'})
+
+        # The email is used up, so the phone number keeps its tokens
+        response = check_customer_rate({'phone': '9876543210', 'email': 'first@example.com'})
+        self.assertEqual(response.status_code, 429)
+        self.assertAlmostEqual(RateLimitBucket.objects.get(key=bucket_key('phone', '9876543210')).tokens, 1, places=2)
+        self.assertIsNone(check_customer_rate({'phone': '9876543210', 'email': 'second@example.com'}))
+
+    @override_settings(ORDER_MAX_IN_FLIGHT=2, ORDER_IN_FLIGHT_LEASE_SECONDS=30)
+    def test_slots_are_leased(self):
+        with self.at(0):
+            first, second = acquire_slot(), acquire_slot()
+            self.assertNotEqual(first[0], second[0])
+            self.assertIsNone(acquire_slot())
+            release_slot(first)
+            third = acquire_slot()
+            self.assertEqual(third[0], first[0])
+
+        # Leases run out, e.g. when a worker is killed mid-request
+        with self.at(31):
+            fourth = acquire_slot()
+            self.assertIsNotNone(fourth)
+            # The expired lease's release must not free the new holder's slot
+            release_slot(third if fourth[0] == third[0] else second)
+            self.assertIsNotNone(acquire_slot())
+            self.assertIsNone(acquire_slot())
+
+
+
+class OrderEventTests(TestCase):
+
+    def setUp(self):
+        # Accepting an order writes its invoice
+        use_temporary_media_root(self)
+        session = self.client.session
+        session['is_admin'] = True
+        session['admin_username'] = 'anand'
+        session.save()
+
+    def update_status(self, order_id, action):
+        with captured_stdout():
+            return self.client.post(f'/api/orders/{order_id}/update-status/', {'action': action}, content_type='application/json')
+
+    def test_sequence_numbers_are_consecutive(self):
+        with transaction.atomic():
+            first = reserve_sequence(3)
+            self.assertEqual(reserve_sequence(2), first + 3)
+        with transaction.atomic():
+            self.assertEqual(reserve_sequence(1), first + 5)
+
+        orders = [make_order(f'ORD-{number}') for number in range(1, 4)]
+        with transaction.atomic():
+            created = record_created(orders, actor='customer')
+        self.assertEqual([event.seq for event in created], [first + 6, first + 7, first + 8])
+        events, has_more = get_events_since(first + 6, limit=5)
+        self.assertEqual([event['order_id'] for event in events], ['ORD-2', 'ORD-3'])
+        self.assertFalse(has_more)
+
+    def test_status_updates_are_recorded_in_order(self):
+        order = make_order('ORD-1')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.update_status('ORD-1', 'accept')
+        self.assertEqual(response.json()['order'], {'order_id': 'ORD-1', 'status': 'confirmed', 'payment_status': 'verified'})
+        if connection.features.has_select_for_update:
+            self.assertTrue(any('FOR UPDATE' in query['sql'] for query in queries.captured_queries))
+
+        response = self.update_status('ORD-1', 'deliver')
+        self.assertEqual(response.json()['order'], {'order_id': 'ORD-1', 'status': 'delivered'})
+        self.assertEqual(
+            list(OrderEvent.objects.filter(order_id='ORD-1').values_list('actor', 'old_status', 'new_status')),
+            [('admin:anand', order.status, 'confirmed'), ('admin:anand', 'confirmed', 'delivered')]
+        )
+        self.assertEqual(len(mail.outbox), 2)
+
+        self.assertEqual(self.update_status('ORD-1', 'refund').status_code, 400)
+        self.assertEqual(self.update_status('ORD-404', 'accept').status_code, 404)
+        self.assertEqual(OrderEvent.objects.count(), 2)
+
+
+
+class CustomerHistoryTests(TestCase):
+
+    def setUp(self):
+        start = timezone.now() - timedelta(days=200)
+        # order_id, hours after start, archived, phone
+        orders = [
+            ('ORD-1', 0, False, '9876543210'),
+            ('ORD-2', 1, True, '+91 98765 43210'),
+            ('ORD-3', 2, False, '98765-43210'),
+            ('ORD-4', 3, True, '9876543210'),
+            ('ORD-OTHER', 3, False, '9123456789'),
+            # Placed in the same second: ties are broken by order_id
+            ('ORD-5A', 4, False, '9876543210'),
+            ('ORD-5B', 4, True, '9876543210'),
+        ]
+        for order_id, hours, archived, phone in orders:
+            created_at = start + timedelta(hours=hours)
+            email = 'Customer@Example.com' if order_id != 'ORD-OTHER' else 'other@example.com'
+            order = make_order(order_id, phone=phone, email=email)
+            Order.objects.filter(pk=order.pk).update(created_at=created_at)
+            if archived:
+                row = Order.objects.filter(pk=order.pk).values(*[
+                    field.attname for field in Order._meta.concrete_fields if field.attname != 'id'
+                ]).get()
+                Order.objects.filter(pk=order.pk).delete()
+                ArchivedOrder.objects.create(**row)
+
+    def pages(self, kind, value, limit):
+        pages, cursor = [], None
+        while True:
+            rows, cursor = get_customer_history(kind, value, ['order_id', 'created_at'], limit, cursor)
+            pages.append([(row['order_id'], row['archived']) for row in rows])
+            if cursor is None:
+                return pages
+
+    def test_pages_across_live_and_archived_orders(self):
+        expected = [
+            [('ORD-5B', True), ('ORD-5A', False)],
+            [('ORD-4', True), ('ORD-3', False)],
+            [('ORD-2', True), ('ORD-1', False)],
+        ]
+        self.assertEqual(self.pages('phone', '9876543210', 2), expected)
+        self.assertEqual(self.pages('email', 'customer@example.com', 2), expected)
+        self.assertEqual(self.pages('phone', '9876543210', 4), [expected[0] + expected[1], expected[2]])
+        self.assertEqual(self.pages('phone', '9000000000', 2), [[]])
+
+    def test_invalid_cursor(self):
+        for cursor in ['not-a-cursor', 'WzEsIDJd', 'WyJ5ZXN0ZXJkYXkiLCAiT1JELTEiXQ==']:
+            with self.subTest(cursor), self.assertRaises(InvalidCursor):
+                get_customer_history('phone', '9876543210', ['order_id', 'created_at'], 2, cursor)
+
+
+
+class InvoiceFileTests(TestCase):
+
+    def setUp(self):
+        use_temporary_media_root(self)
+
+    def write(self, path, content, age_days=0):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as invoice:
+            invoice.write(content)
+        modified = time.time() - age_days * 24 * 60 * 60
+        os.utime(path, (modified, modified))
+        return path
+
+    def flat_path(self, order_id):
+        return os.path.join(get_invoice_root(), f'INV-{order_id}.pdf')
+
+    def test_flat_invoices_moved_into_shards(self):
+        self.write(self.flat_path('ORD-A'), b'%PDF a')
+        self.write(self.flat_path('ORD-B'), b'%PDF b old')
+        self.write(invoice_path('ORD-B'), b'%PDF b new')
+        notes = self.write(os.path.join(get_invoice_root(), 'notes.txt'), b'not an invoice')
+
+        self.assertEqual(move_flat_invoices(dry_run=True), 2)
+        self.assertTrue(os.path.exists(self.flat_path('ORD-A')))
+
+        self.assertEqual(move_flat_invoices(), 1)
+        self.assertTrue(os.path.exists(notes))
+        self.assertFalse(os.path.exists(self.flat_path('ORD-A')))
+        self.assertFalse(os.path.exists(self.flat_path('ORD-B')))
+        self.assertEqual(find_invoice('ORD-A'), (invoice_path('ORD-A'), False))
+        with open_invoice('ORD-B') as invoice:
+            self.assertEqual(invoice.read(), b'%PDF b new')
+        self.assertEqual(move_flat_invoices(), 0)
+
+    def test_old_invoices_compressed_then_deleted(self):
+        self.write(invoice_path('ORD-NEW'), b'%PDF new', age_days=10)
+        old = self.write(invoice_path('ORD-OLD'), b'%PDF old ' * 100, age_days=40)
+        self.write(self.flat_path('ORD-EXPIRED'), b'%PDF expired', age_days=400)
+        modified = os.path.getmtime(old)
+
+        self.assertEqual(prune_invoices(30, 365, dry_run=True), {'compressed': 1, 'deleted': 1, 'bytes_freed': 12})
+        self.assertEqual(find_invoice('ORD-OLD'), (old, False))
+
+        result = prune_invoices(30, 365)
+        self.assertEqual((result['compressed'], result['deleted']), (1, 1))
+        self.assertGreater(result['bytes_freed'], 12)
+        self.assertEqual(find_invoice('ORD-OLD'), (old + '.gz', True))
+        self.assertEqual(os.path.getmtime(old + '.gz'), modified)
+        self.assertEqual(open_invoice('ORD-OLD').read(), b'%PDF old ' * 100)
+        self.assertIsNone(find_invoice('ORD-EXPIRED'))
+        self.assertEqual(find_invoice('ORD-NEW'), (invoice_path('ORD-NEW'), False))
+
+        # Gzipped invoices are deleted once they are old enough
+        self.assertEqual(prune_invoices(30, 365), {'compressed': 0, 'deleted': 0, 'bytes_freed': 0})
+        self.assertEqual(prune_invoices(0, 30)['deleted'], 1)
+        self.assertIsNone(find_invoice('ORD-OLD'))
+
+
+
+class CollectStaticTests(TestCase):
+
+    def setUp(self):
+        source, self.static_root = tempfile.mkdtemp(), tempfile.mkdtemp()
+        for directory in (source, self.static_root):
+            self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        # A photo-like image, where WebP beats PNG
+        rng = random.Random(1)
+        photo = Image.new('RGB', (700, 200))
+        photo.putdata([(x // 3, y, rng.randint(0, 255)) for y in range(200) for x in range(700)])
+        os.makedirs(os.path.join(source, 'asset', 'icimg'))
+        photo.save(os.path.join(source, 'asset', 'icimg', 'scoop.png'))
+        os.makedirs(os.path.join(source, 'css'))
+        with open(os.path.join(source, 'css', 'site.css'), 'w') as stylesheet:
+            stylesheet.write('body { color: #ff6b9d; }')
+
+        settings_override = override_settings(STATICFILES_DIRS=[source], STATIC_ROOT=self.static_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_manifest_lists_variants(self):
+        with captured_stdout():
+            call_command('collectstatic', interactive=False, verbosity=0)
+
+        with open(os.path.join(self.static_root, 'staticfiles.json')) as manifest:
+            paths = json.load(manifest)['paths']
+        variants = [
+            'asset/icimg/scoop-320w.png', 'asset/icimg/scoop-320w.webp',
+            'asset/icimg/scoop-640w.png', 'asset/icimg/scoop-640w.webp',
+            'asset/icimg/scoop.webp',
+        ]
+        for name in ['asset/icimg/scoop.png', 'css/site.css', *variants]:
+            self.assertIn(name, paths)
+            self.assertTrue(os.path.exists(os.path.join(self.static_root, paths[name])))
+
+        html = Template("{% load media_tags %}{% responsive_image 'asset/icimg/scoop.png' alt='Scoop' %}").render(Context())
+        self.assertIn(f"/static/{paths['asset/icimg/scoop-640w.webp']} 640w", html)
+
+
+
+class MenuDocumentTests(TestCase):
+
+    def setUp(self):
+        reset_snapshot(catalog)
+        self.addCleanup(reset_snapshot, catalog)
+        self.product = Product.objects.create(name='Test Bar')
+        self.flavor = Flavor.objects.create(product=self.product, name='Mango', price=Decimal('30.00'))
+
+    def get_menu(self, **headers):
+        return self.client.get('/api/catalog/menu.json', headers=headers)
+
+    def find_test_bar(self, response):
+        return next(product for product in response.json()['products'] if product['name'] == 'Test Bar')
+
+    def test_not_modified_for_matching_etag(self):
+        etag = self.get_menu()['ETag']
+        for if_none_match in [etag, f'W/"other", {etag}', '*']:
+            with self.subTest(if_none_match):
+                response = self.get_menu(if_none_match=if_none_match)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.get_menu(if_none_match='W/"other"').status_code, 200)
+
+    def test_precompressed_encodings(self):
+        identity = self.get_menu()
+        self.assertNotIn('Content-Encoding', identity)
+        self.assertIn('Accept-Encoding', identity['Vary'])
+        self.assertEqual(self.find_test_bar(identity)['flavors'], [{'name': 'Mango', 'price': 30.0, 'available': True}])
+
+        compressed = self.get_menu(accept_encoding='gzip, deflate, br')
+        self.assertIn('Accept-Encoding', compressed['Vary'])
+        if 'br' in catalog.get().document.encodings:
+            self.assertEqual(compressed['Content-Encoding'], 'br')
+        else:
+            self.assertEqual(compressed['Content-Encoding'], 'gzip')
+            self.assertEqual(gzip.decompress(compressed.content), identity.content)
+        self.assertEqual(compressed['ETag'], identity['ETag'])
+
+        encodings = {'identity': b'', 'gzip': b'', 'br': b''}
+        self.assertEqual(choose_encoding('gzip, br', encodings), 'br')
+        self.assertEqual(choose_encoding('gzip, br;q=0', encodings), 'gzip')
+        self.assertEqual(choose_encoding('br', {'identity': b'', 'gzip': b''}), 'identity')
+        self.assertEqual(choose_encoding('*;q=0.5', encodings), 'br')
+        self.assertEqual(choose_encoding('', encodings), 'identity')
+
+    def test_etag_changes_with_the_menu(self):
+        etags = [self.get_menu()['ETag']]
+        self.flavor.price = Decimal('35.00')
+        self.flavor.save()
+        etags.append(self.get_menu()['ETag'])
+        self.product.is_available = False
+        self.product.save()
+        response = self.get_menu(if_none_match=etags[-1])
+        self.assertEqual(response.status_code, 200)
+        etags.append(response['ETag'])
+
+        self.assertEqual(len(set(etags)), 3)
+        self.assertEqual(self.find_test_bar(response)['flavors'][0]['available'], False)
+
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGES)
+class OrderCardCacheTests(TestCase):
+
+    def setUp(self):
+        caches['order_fragments'].clear()
+        session = self.client.session
+        session['is_admin'] = True
+        session['admin_username'] = 'anand'
+        session.save()
+        self.order = make_order('ORD-CARD')
+
+    def card_key(self):
+        self.order.refresh_from_db()
+        return make_template_fragment_key('pending_order_card', [self.order.order_id, self.order.updated_at])
+
+    def render_page(self):
+        response = self.client.get('/pending-orders.html')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def mark_cached_card(self):
+        """Replace the cached card, so a page showing the marker reused it"""
+        self.assertIn('ORD-CARD', caches['order_fragments'].get(self.card_key()))
+        caches['order_fragments'].set(self.card_key(), '<div>cached ORD-CARD card</div>')
+
+    def test_second_render_reuses_cards(self):
+        self.render_page()
+        self.mark_cached_card()
+        self.assertIn('cached ORD-CARD card', self.render_page())
+
+    def test_changed_order_is_rendered_again(self):
+        self.render_page()
+        self.mark_cached_card()
+        self.order.payment_status = 'verified'
+        self.order.save()
+        page = self.render_page()
+        self.assertNotIn('cached ORD-CARD card', page)
+        self.assertIn('ORD-CARD', page)
+
+        self.mark_cached_card()
+        invalidate_order_cards(self.order)
+        self.assertIsNone(caches['order_fragments'].get(self.card_key()))
+        self.assertNotIn('cached ORD-CARD card', self.render_page())
+
+    def test_status_update_drops_the_card(self):
+        self.render_page()
+        key = self.card_key()
+        self.assertIsNotNone(caches['order_fragments'].get(key))
+        use_temporary_media_root(self)
+        with captured_stdout():
+            response = self.client.post('/api/orders/ORD-CARD/update-status/', {'action': 'reject'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(caches['order_fragments'].get(key))
+        self.assertNotIn('ORD-CARD', self.render_page())
+
+
+
+def encode_image(image, image_format, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def data_url(image_bytes, content_type):
+    return f"data:{content_type};base64,{base64.b64encode(image_bytes).decode()}"
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    CATALOG_PRICE_MISMATCH_ACTION='flag',
+    ORDER_RATE_IP_BURST=0,
+    ORDER_RATE_CUSTOMER_BURST=0,
+    ORDER_MAX_IN_FLIGHT=0,
+    SCREENSHOT_MAX_DIMENSION=1600,
+    SCREENSHOT_THUMBNAIL_SIZE=320,
+)
+class PaymentScreenshotTests(TestCase):
+
+    def setUp(self):
+        self.directory = use_temporary_screenshot_storage(self)
+        use_temporary_media_root(self)
+        session = self.client.session
+        session['is_admin'] = True
+        session.save()
+
+    def stored_files(self):
+        return [name for _, _, names in os.walk(self.directory) for name in names]
+
+    def test_rotated_photo_stored_upright(self):
+        # A phone photo stored landscape, with EXIF saying to turn it 90 degrees
+        photo = Image.new('RGB', (2400, 1200), 'white')
+        ImageDraw.Draw(photo).rectangle((0, 0, 1199, 1199), fill='red')
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        processed = process_screenshot(data_url(encode_image(photo, 'JPEG', exif=exif), 'image/jpeg'))
+
+        # Upright and scaled down to SCREENSHOT_MAX_DIMENSION
+        self.assertEqual(processed.image.size, (800, 1600))
+        red, _, blue = processed.image.getpixel((400, 200))
+        self.assertGreater(red, 200)
+        self.assertLess(blue, 50)
+        with Image.open(io.BytesIO(processed.data)) as stored:
+            self.assertEqual((stored.format, stored.size), ('JPEG', (800, 1600)))
+            self.assertEqual(len(stored.getexif()), 0)
+        with Image.open(io.BytesIO(processed.thumbnail)) as thumbnail:
+            self.assertEqual(thumbnail.size, (320, 640))
+
+    def test_transparency_flattened_onto_white(self):
+        image = Image.new('RGBA', (300, 600), (0, 0, 0, 0))
+        ImageDraw.Draw(image).rectangle((0, 300, 299, 599), fill=(0, 0, 255, 255))
+        processed = process_screenshot(data_url(encode_image(image, 'PNG'), 'image/png'))
+        self.assertEqual(processed.image.mode, 'RGB')
+        self.assertEqual(processed.image.getpixel((150, 100)), (255, 255, 255))
+        self.assertEqual(processed.image.getpixel((150, 500)), (0, 0, 255))
+
+    def test_legacy_screenshot_served_and_stored_once(self):
+        screenshot = Image.new('RGB', (600, 1200), 'white')
+        make_order('ORD-LEGACY', payment_screenshot=data_url(encode_image(screenshot, 'PNG'), 'image/png'))
+        make_order('ORD-NONE', payment_screenshot='')
+
+        full = self.client.get('/api/orders/ORD-LEGACY/screenshot/')
+        self.assertEqual((full.status_code, full['Content-Type']), (200, 'image/jpeg'))
+        self.assertIn('private', full['Cache-Control'])
+        with Image.open(io.BytesIO(b''.join(full.streaming_content))) as image:
+            self.assertEqual(image.size, (600, 1200))
+
+        thumb = self.client.get('/api/orders/ORD-LEGACY/screenshot/?size=thumb')
+        with Image.open(io.BytesIO(b''.join(thumb.streaming_content))) as image:
+            self.assertEqual(image.size, (320, 640))
+        self.assertNotEqual(thumb['ETag'], full['ETag'])
+        self.assertEqual(PaymentScreenshot.objects.count(), 1)
+        self.assertEqual(len(self.stored_files()), 2)
+
+        not_modified = self.client.get('/api/orders/ORD-LEGACY/screenshot/', headers={'if_none_match': full['ETag']})
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(self.client.get('/api/orders/ORD-NONE/screenshot/').status_code, 404)
+        self.client.session.flush()
+        self.client.cookies.clear()
+        self.assertEqual(self.client.get('/api/orders/ORD-LEGACY/screenshot/').status_code, 401)
+
+    def test_files_removed_when_order_rolls_back(self):
+        order = {
+            'customerInfo': {
+                'fullName': 'Customer', 'email': 'customer@example.com', 'phone': '9876543210',
+                'deliveryAddress': '1 Test Street', 'pincode': '400001',
+            },
+            'items': [{'product': 'Kulfi', 'flavor': 'Badam', 'quantity': 1, 'unitPrice': 30, 'price': 30}],
+            'totalAmount': 30,
+            'orderDate': timezone.now().isoformat(),
+            'paymentScreenshot': data_url(encode_image(Image.new('RGB', (300, 600), 'white'), 'PNG'), 'image/png'),
+        }
+        with mock.patch('orders.views.record_created', side_effect=RuntimeError('event sequence unavailable')):
+            with captured_stdout():
+                response = self.client.post('/api/orders/', order, content_type='application/json')
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(PaymentScreenshot.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+
+        with captured_stdout():
+            response = self.client.post('/api/orders/', order, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(self.stored_files()), 2)
+
+
+class OrderRowSerializerTests(TestCase):
+
+    def setUp(self):
+        session = self.client.session
+        session['is_admin'] = True
+        session.save()
+        moment = timezone.make_aware(datetime(2024, 3, 1, 15, 0, 15, 123456))
+        make_order('ORD-MICRO', total_amount=Decimal('1234.50'), order_date=moment, alternate_phone='9123456789')
+        make_order('ORD-WHOLE', total_amount=Decimal('0.05'), order_date=moment.replace(microsecond=0), payment_screenshot=None)
+        make_order('ORD-ROUND', total_amount=Decimal('60'), order_date=moment.replace(microsecond=500))
+
+    def expected(self, data):
+        # The JSON the stock renderer gives for OrderSerializer, before values() rows and orjson
+        return json.loads(JSONRenderer().render(data))
+
+    def test_same_json_as_order_serializer(self):
+        for time_zone in ['Asia/Kolkata', 'UTC']:
+            with self.subTest(time_zone), override_settings(TIME_ZONE=time_zone):
+                response = self.client.get('/api/orders/list/')
+                self.assertEqual(response.json(), self.expected({
+                    'success': True,
+                    'count': 3,
+                    'orders': OrderSerializer(Order.objects.all(), many=True).data,
+                }))
+                for order in Order.objects.all():
+                    response = self.client.get(f'/api/orders/{order.order_id}/')
+                    self.assertEqual(response.json(), self.expected({
+                        'success': True,
+                        'order': OrderSerializer(order).data,
+                    }))
+
+
+@override_settings(PROFILE_SAMPLE_RATE=0, PROFILE_KEEP=10, PROFILE_TOP_FUNCTIONS=5)
+class ProfilingTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        settings_override = override_settings(PROFILE_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        make_order('ORD-PROFILE')
+
+    def log_in(self):
+        session = self.client.session
+        session['is_admin'] = True
+        session.save()
+
+    def test_admin_request_profiled(self):
+        self.log_in()
+        response = self.client.get('/api/orders/ORD-PROFILE/?profile=memory')
+        self.assertEqual(response.status_code, 200)
+        profile_id = response['X-Profile-Id']
+        self.assertEqual(sorted(os.listdir(self.directory)), [profile_id + extension for extension in ['.json', '.prof', '.tracemalloc']])
+        with open(os.path.join(self.directory, profile_id + '.json')) as summary_file:
+            summary = json.load(summary_file)
+        self.assertEqual((summary['route'], summary['order_id'], summary['status']), ('api/orders/<str:order_id>/', 'ORD-PROFILE', 200))
+        self.assertGreater(summary['queries'], 0)
+        self.assertTrue(summary['top_functions'])
+
+        response = self.client.get('/api/orders/ORD-PROFILE/', headers={'x_profile': '1'})
+        self.assertEqual(len(os.listdir(self.directory)), 5)
+        download = self.client.get(f"/api/admin/profiles/{response['X-Profile-Id']}/pstats/")
+        self.assertEqual(download.status_code, 200)
+        download.close()
+
+    def test_other_requests_not_profiled(self):
+        response = self.client.get('/api/orders/ORD-PROFILE/?profile=1', headers={'x_profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.log_in()
+        self.assertNotIn('X-Profile-Id', self.client.get('/api/orders/ORD-PROFILE/?profile=0'))
+        self.assertEqual(os.listdir(self.directory), [])
@@ -3,9 +3,22 @@ from . import views
 
 urlpatterns = [
     path('health/', views.health_check, name='health_check'),
+    path('health/live/', views.health_check, {'mode': 'shallow'}, name='health_live'),
+    path('health/ready/', views.health_check, {'mode': 'deep'}, name='health_ready'),
+    path('catalog/', views.get_catalog, name='get_catalog'),
+    path('catalog/menu.json', views.catalog_menu, name='catalog_menu'),
     path('orders/', views.create_order, name='create_order'),
     path('orders/list/', views.list_orders, name='list_orders'),
+    path('orders/export/', views.export_orders, name='export_orders'),
+    path('orders/events/', views.order_events, name='order_events'),
     path('orders/<str:order_id>/', views.get_order, name='get_order'),
+    path('orders/<str:order_id>/screenshot/', views.order_screenshot, name='order_screenshot'),
+    path('orders/<str:order_id>/invoice/', views.order_invoice, name='order_invoice'),
+    path('customers/history/', views.customer_history, name='customer_history'),
+    # Admin analytics
+    path('analytics/', views.sales_analytics, name='sales_analytics'),
+    # Request profiles (see orders.profiling)
+    path('admin/profiles/<str:profile_id>/<str:kind>/', views.download_profile, name='download_profile'),
     # Admin authentication
     path('admin/login/', views.admin_login_api, name='admin_login_api'),
     # Order management
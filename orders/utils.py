@@ -1,7 +1,6 @@
 """
 Utility functions for orders app
 """
-import base64
 import io
 import time
 import random
@@ -9,9 +8,10 @@ import string
 from django.core.mail import EmailMessage
 from django.conf import settings
 from django.template.loader import render_to_string
-from PIL import Image
 from reportlab.pdfgen import canvas
+from reportlab.lib.utils import ImageReader
 from reportlab.lib.pagesizes import letter
+from .invoices import invoice_path as get_invoice_path
 
 
 def generate_order_id():
@@ -21,6 +21,16 @@ def generate_order_id():
     return f"ORD-{timestamp}-{random_str}"
 
 
+def generate_order_ids(count):
+    """Generate count distinct order IDs at once, in the same format as generate_order_id"""
+    timestamp = base36_encode(int(time.time() * 1000))
+    order_ids = set()
+    while len(order_ids) < count:
+        random_str = ''.join(random.choices(string.ascii_uppercase + string.digits, k=5))
+        order_ids.add(f"ORD-{timestamp}-{random_str}")
+    return list(order_ids)
+
+
 def base36_encode(number):
     """Convert number to base36 string"""
     if number == 0:
@@ -34,29 +44,22 @@ def base36_encode(number):
     return ''.join(reversed(base36))
 
 
-def convert_image_to_pdf(base64_image):
+def convert_image_to_pdf(image):
     """
-    Convert base64 image to PDF buffer
+    Convert an image to PDF buffer
     
     Args:
-        base64_image: Base64 encoded image string
+        image: File object or PIL Image; JPEG files (such as
+            ProcessedScreenshot.data) are embedded as they are, without
+            re-encoding
         
     Returns:
         BytesIO buffer containing PDF data
     """
     try:
-        # Remove data URL prefix if present
-        if ',' in base64_image:
-            base64_data = base64_image.split(',')[1]
-        else:
-            base64_data = base64_image
-        
-        # Decode base64 to image
-        image_data = base64.b64decode(base64_data)
-        image = Image.open(io.BytesIO(image_data))
-        
         # Get image dimensions
-        img_width, img_height = image.size
+        reader = ImageReader(image)
+        img_width, img_height = reader.getSize()
         
         # Create PDF buffer
         pdf_buffer = io.BytesIO()
@@ -64,13 +67,8 @@ def convert_image_to_pdf(base64_image):
         # Create PDF with image dimensions
         c = canvas.Canvas(pdf_buffer, pagesize=(img_width, img_height))
         
-        # Save image to temporary buffer
-        img_buffer = io.BytesIO()
-        image.save(img_buffer, format='PNG')
-        img_buffer.seek(0)
-        
-        # Draw image on PDF
-        c.drawImage(img_buffer, 0, 0, width=img_width, height=img_height)
+        # Draw image on PDF straight from memory
+        c.drawImage(reader, 0, 0, width=img_width, height=img_height)
         
         # Finalize PDF
         c.save()
@@ -85,6 +83,46 @@ def convert_image_to_pdf(base64_image):
         raise
 
 
+def merge_images_to_pdf(pages):
+    """
+    Combine images into one PDF, one page per image under a title line
+    
+    Args:
+        pages: List of (title, image) where image is a file object or PIL
+            Image; JPEG files are embedded as they are, without re-encoding
+        
+    Returns:
+        BytesIO buffer containing PDF data
+    """
+    title_height = 40
+    pdf_buffer = io.BytesIO()
+    c = canvas.Canvas(pdf_buffer)
+    
+    for title, image in pages:
+        reader = ImageReader(image)
+        img_width, img_height = reader.getSize()
+        c.setPageSize((img_width, img_height + title_height))
+        c.setFont('Helvetica-Bold', 16)
+        c.drawString(12, img_height + 14, title)
+        c.drawImage(reader, 0, 0, width=img_width, height=img_height)
+        c.showPage()
+    
+    c.save()
+    pdf_buffer.seek(0)
+    return pdf_buffer
+
+
+def get_order_warnings(order_data):
+    """Things the admin should check before accepting an order (see send_order_email)"""
+    warnings = []
+    if order_data.get('serviceable') is False:
+        warnings.append('Pincode is outside every delivery zone')
+    warnings += order_data.get('priceProblems') or []
+    if order_data.get('similarOrders'):
+        warnings.append(f"Payment screenshot matches order(s) {', '.join(order_data['similarOrders'])}")
+    return warnings
+
+
 def send_order_email(order_data, order_id):
     """
     Send order confirmation email to admin with PDF attachment
@@ -127,6 +165,8 @@ def send_order_email(order_data, order_id):
                 {f"<p><strong>Alternate Phone:</strong> {order_data['customerInfo'].get('alternatePhone', 'N/A')}</p>" if order_data['customerInfo'].get('alternatePhone') else ''}
                 <p><strong>Delivery Address:</strong> {order_data['customerInfo']['deliveryAddress']}</p>
                 <p><strong>Pincode:</strong> {order_data['customerInfo']['pincode']}</p>
+                {f"<p><strong>Delivery Zone:</strong> {order_data['deliveryZone']}</p>" if order_data.get('deliveryZone') else ''}
+                {''.join(f'<p style="color: #e84393;"><strong>⚠️ {warning}</strong></p>' for warning in get_order_warnings(order_data))}
             </div>
 
             <div style="background: #e8f5e9; padding: 20px; border-radius: 10px; margin: 20px 0;">
@@ -156,13 +196,15 @@ def send_order_email(order_data, order_id):
         )
         email.content_subtype = 'html'
         
-        # Attach PDF if payment screenshot exists
-        if order_data.get('paymentScreenshot'):
+        # Attach PDF if payment screenshot exists (decoded once at upload, see orders.screenshots)
+        screenshot = order_data.get('paymentScreenshot')
+        if screenshot:
             try:
-                pdf_buffer = convert_image_to_pdf(order_data['paymentScreenshot'])
+                # The JPEG bytes go into the PDF as they are, so the image is not encoded again
+                pdf_buffer = convert_image_to_pdf(io.BytesIO(screenshot.data))
                 email.attach(
                     f'payment-screenshot-{order_id}.pdf',
-                    pdf_buffer.read(),
+                    pdf_buffer.getvalue(),
                     'application/pdf'
                 )
                 print(f"✅ Payment screenshot converted to PDF for order: {order_id}")
@@ -170,12 +212,10 @@ def send_order_email(order_data, order_id):
                 print(f"❌ Error converting screenshot to PDF: {pdf_error}")
                 # Fallback: attach as image
                 try:
-                    base64_data = order_data['paymentScreenshot'].split(',')[1] if ',' in order_data['paymentScreenshot'] else order_data['paymentScreenshot']
-                    image_data = base64.b64decode(base64_data)
                     email.attach(
-                        f'payment-screenshot-{order_id}.png',
-                        image_data,
-                        'image/png'
+                        f'payment-screenshot-{order_id}.jpg',
+                        screenshot.data,
+                        'image/jpeg'
                     )
                     print(f"⚠️ Fallback: Attached screenshot as image for order: {order_id}")
                 except Exception as img_error:
@@ -204,8 +244,8 @@ def send_order_acceptance_email(order):
     try:
         # Format items for email
         items_list = '\n'.join([
-            f"- {item['product']} ({item['flavor']}) x{item.get('quantity', 1)} - ₹{item['price']}"
-            for item in order.items
+            f"- {item.product} ({item.flavor}) x{item.quantity} - ₹{item.amount}"
+            for item in order.get_line_items()
         ])
         
         # Email subject
@@ -429,11 +469,11 @@ def send_delivery_confirmation_email(order):
         """
         
         # Add items to email
-        for item in order.items:
+        for item in order.get_line_items():
             html_message += f"""
                         <div class="item">
-                            <strong>{item.get('name', 'N/A')}</strong> - {item.get('flavor', 'N/A')}<br>
-                            Quantity: {item.get('quantity', 0)} × ₹{item.get('price', 0)} = ₹{item.get('quantity', 0) * item.get('price', 0)}
+                            <strong>{item.product or 'N/A'}</strong> - {item.flavor or 'N/A'}<br>
+                            Quantity: {item.quantity} × ₹{item.price} = ₹{item.amount}
                         </div>
             """
         
@@ -586,13 +626,9 @@ def generate_invoice_pdf(order):
     from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
     
     try:
-        # Create invoices directory if it doesn't exist
-        invoice_dir = os.path.join(settings.MEDIA_ROOT, 'invoices')
-        os.makedirs(invoice_dir, exist_ok=True)
-        
-        # Generate invoice filename
-        invoice_filename = f"INV-{order.order_id}.pdf"
-        invoice_path = os.path.join(invoice_dir, invoice_filename)
+        # Sharded path under MEDIA_ROOT/invoices/ (see orders.invoices)
+        invoice_path = get_invoice_path(order.order_id)
+        os.makedirs(os.path.dirname(invoice_path), exist_ok=True)
         
         # Create PDF document
         doc = SimpleDocTemplate(invoice_path, pagesize=letter,
@@ -697,19 +733,13 @@ def generate_invoice_pdf(order):
         items_data = [['Product', 'Flavor', 'Quantity', 'Price', 'Amount']]
         
         # Add items
-        for item in order.items:
-            product_name = item.get('product', 'N/A')
-            flavor = item.get('flavor', 'N/A')
-            quantity = item.get('quantity', 1)
-            price = float(item.get('price', 0))
-            amount = quantity * price
-            
+        for item in order.get_line_items():
             items_data.append([
-                product_name,
-                flavor,
-                str(quantity),
-                f"₹{price:.2f}",
-                f"₹{amount:.2f}"
+                item.product or 'N/A',
+                item.flavor or 'N/A',
+                str(item.quantity),
+                f"₹{item.price:.2f}",
+                f"₹{item.amount:.2f}"
             ])
         
         # Add total row
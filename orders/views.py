@@ -1,44 +1,134 @@
 from rest_framework import status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, parser_classes
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.response import Response
-from django.db import connection
 from django.shortcuts import render, redirect
-from django.http import JsonResponse
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib import messages
-from .models import Order
-from .serializers import OrderSerializer, OrderCreateSerializer
-from .utils import generate_order_id, send_order_email, send_order_acceptance_email, send_order_rejection_email, send_delivery_confirmation_email, send_cancellation_email
+from django.conf import settings
+from django.db import transaction
+from .models import Order, OrderItem
+from .serializers import OrderRowSerializer, OrderCreateSerializer
+from .archive import find_order, find_order_row
+from .export import EXPORT_FORMATS, stream_export
+from .catalog import catalog, choose_encoding, is_catalog_enabled, check_order_prices
+from .serviceability import is_serviceability_enabled, get_delivery_zone, group_orders_by_zone
+from .analytics import get_sales_timeseries, get_top_products, get_revenue_by_pincode, get_summary
+from .health import get_cached_checks
+from .dbpool import get_connection_metrics
+from .screenshots import ScreenshotError, ScreenshotUploadHandler, get_max_request_bytes, too_large, process_screenshot, save_screenshot, delete_screenshot_files, get_order_screenshot
+from .phash import find_similar_orders
+from .digest import is_digest_enabled, queue_for_digest
+from .fragments import with_card_fields, get_card_context, invalidate_order_cards
+from .routers import read_from_replica, replica_failed
+from .ratelimit import admission_control, check_customer_rate, get_rejection_counts
+from .events import get_admin_actor, get_events_since, record_created, record_status_change
+from .customers import InvalidCursor, get_customer_history, get_customer_summary, refresh_customer_summaries
+from .models import normalize_phone
+from .invoices import invoice_filename, open_invoice
+from .profiling import PROFILE_FILES, get_profile_path, get_recent_profiles
+from .utils import generate_order_id, generate_invoice_pdf, send_order_email, send_order_acceptance_email, send_order_rejection_email, send_delivery_confirmation_email, send_cancellation_email
+import hmac
 import json
+from datetime import timedelta
 
 
 @api_view(['GET'])
-def health_check(request):
-    """Health check endpoint"""
-    try:
-        # Test database connection
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT 1")
-        
+def health_check(request, mode=None):
+    """
+    Health check endpoint
+
+    ?mode=shallow (or /health/live/) only reports that the process is up and
+    never touches the database. ?mode=deep (the default, or /health/ready/)
+    reports the cached database, SMTP and storage probe results, plus this
+    worker's database connection metrics and rejected order counts.
+    """
+    mode = mode or request.query_params.get('mode', 'deep')
+
+    if mode in ('shallow', 'live'):
         return Response({
             'status': 'OK',
             'message': 'Server is running',
-            'database': 'Connected'
+            'mode': 'shallow'
         })
-    except Exception as e:
+
+    checks, age = get_cached_checks()
+    failed = [name for name, check in checks.items() if check['status'] != 'OK']
+    critical_failed = [name for name in failed if checks[name]['critical']]
+
+    if critical_failed:
         return Response({
             'status': 'ERROR',
-            'message': 'Database connection failed',
-            'error': str(e)
+            'message': f"Dependency check failed: {', '.join(critical_failed)}",
+            'mode': 'deep',
+            'database': 'Connected' if checks['database']['status'] == 'OK' else 'Disconnected',
+            'checks': checks,
+            'connections': get_connection_metrics(),
+            'rejections': get_rejection_counts(),
+            'age_seconds': age
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    return Response({
+        'status': 'DEGRADED' if failed else 'OK',
+        'message': 'Server is running',
+        'mode': 'deep',
+        'database': 'Connected',
+        'checks': checks,
+        'connections': get_connection_metrics(),
+        'rejections': get_rejection_counts(),
+        'age_seconds': age
+    })
+
 
 @api_view(['POST'])
+@parser_classes([JSONParser, MultiPartParser])
+@admission_control
 def create_order(request):
-    """Create a new order"""
+    """
+    Create a new order
+
+    The payment page sends multipart/form-data: the order as JSON in an 'order'
+    field and the screenshot file in 'paymentScreenshot'. A plain JSON body with
+    a base64 'paymentScreenshot' is still accepted.
+    """
+    # Bodies too large to hold an acceptable screenshot are refused unread
+    try:
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        content_length = 0
+    if content_length > get_max_request_bytes(request.content_type):
+        return Response({
+            'error': 'Request too large',
+            'message': str(too_large())
+        }, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+    
+    # Screenshot files go to a temporary file instead of memory; this has to be
+    # set before request.data is first read
+    request.upload_handlers = [ScreenshotUploadHandler(request)]
     try:
+        try:
+            if request.content_type.startswith('multipart/form-data'):
+                order_data = json.loads(request.data.get('order') or '{}')
+                upload = request.FILES.get('paymentScreenshot')
+            else:
+                order_data = request.data
+                upload = None
+        except ScreenshotError as e:
+            return Response({
+                'error': 'Invalid payment screenshot',
+                'message': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError:
+            return Response({
+                'error': 'Invalid data',
+                'message': 'The order field is not valid JSON'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
         # Validate input data
-        serializer = OrderCreateSerializer(data=request.data)
+        serializer = OrderCreateSerializer(data=order_data)
         if not serializer.is_valid():
             return Response({
                 'error': 'Invalid data',
@@ -48,40 +138,120 @@ def create_order(request):
         data = serializer.validated_data
         customer_info = data['customerInfo']
         
+        # Check the pincode against the in-memory delivery zone index
+        zone = None
+        serviceable = True
+        if is_serviceability_enabled():
+            zone = get_delivery_zone(customer_info['pincode'])
+            serviceable = zone is not None
+            if not serviceable and settings.PINCODE_UNSERVICEABLE_ACTION == 'reject':
+                return Response({
+                    'error': 'Pincode not serviceable',
+                    'message': f"Sorry, we do not deliver to pincode {customer_info['pincode']} yet"
+                }, status=status.HTTP_400_BAD_REQUEST)
+            if not serviceable:
+                print(f"[WARNING] Order for unserviceable pincode {customer_info['pincode']}")
+        
+        # Recompute every line total and the order total from the in-memory catalog
+        price_problems = []
+        if is_catalog_enabled():
+            _, price_problems = check_order_prices(data['items'], data['totalAmount'])
+            if price_problems and settings.CATALOG_PRICE_MISMATCH_ACTION == 'reject':
+                return Response({
+                    'error': 'Order does not match the menu',
+                    'message': 'Some prices have changed. Please refresh the page and review your cart',
+                    'details': price_problems
+                }, status=status.HTTP_400_BAD_REQUEST)
+            if price_problems:
+                print(f"[WARNING] Order prices do not match the catalog: {'; '.join(price_problems)}")
+        
+        # Per phone number / email limits: after the cheap checks, so an order
+        # rejected by them costs no tokens, but before the screenshot is decoded
+        rejection = check_customer_rate(customer_info)
+        if rejection:
+            return rejection
+        
+        # Decode and normalize the payment screenshot once; everything else uses the result
+        screenshot = None
+        similar_orders = []
+        upload = upload or data.get('paymentScreenshot')
+        if upload:
+            try:
+                screenshot = process_screenshot(upload)
+            except ScreenshotError as e:
+                return Response({
+                    'error': 'Invalid payment screenshot',
+                    'message': str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+            # A base64 screenshot is as large as the request body; let it go
+            # before the admin email is built
+            upload = data['paymentScreenshot'] = order_data['paymentScreenshot'] = None
+            # The same payment proof sent for an earlier order is flagged for the admin
+            similar_orders = find_similar_orders(screenshot)
+            if similar_orders:
+                print(f"[WARNING] Payment screenshot matches earlier orders: {', '.join(similar_orders)}")
+        
         # Generate unique order ID
         order_id = generate_order_id()
         
-        # Create order
-        order = Order.objects.create(
-            order_id=order_id,
-            full_name=customer_info['fullName'],
-            email=customer_info['email'],
-            phone=customer_info['phone'],
-            delivery_address=customer_info['deliveryAddress'],
-            pincode=customer_info['pincode'],
-            alternate_phone=customer_info.get('alternatePhone', ''),
-            items=data['items'],
-            total_amount=data['totalAmount'],
-            payment_screenshot=data.get('paymentScreenshot', ''),
-            payment_status=data.get('paymentStatus', 'pending'),
-            status=data.get('status', 'pending'),
-            order_date=data.get('orderDate')
-        )
+        # What the admin is told about the order, now or in the next digest
+        notification = {
+            'customerInfo': customer_info,
+            'totalAmount': str(data['totalAmount']),
+            'paymentScreenshot': screenshot,
+            'deliveryZone': zone.name if zone else None,
+            'serviceable': serviceable,
+            'priceProblems': price_problems,
+            'similarOrders': similar_orders
+        }
+        
+        # Create order and its normalized line items together
+        stored_screenshot = None
+        try:
+            with transaction.atomic():
+                order = Order.objects.create(
+                    order_id=order_id,
+                    full_name=customer_info['fullName'],
+                    email=customer_info['email'],
+                    phone=customer_info['phone'],
+                    delivery_address=customer_info['deliveryAddress'],
+                    pincode=customer_info['pincode'],
+                    alternate_phone=customer_info.get('alternatePhone', ''),
+                    items=data['items'],
+                    total_amount=data['totalAmount'],
+                    # Stored as files by save_screenshot instead of base64 in the row
+                    payment_screenshot='',
+                    payment_status=data.get('paymentStatus', 'pending'),
+                    status=data.get('status', 'pending'),
+                    order_date=data.get('orderDate')
+                )
+                line_items = OrderItem.objects.bulk_create(OrderItem.build_for_order(order))
+                if screenshot:
+                    stored_screenshot = save_screenshot(order, screenshot, similar_orders)
+                if is_digest_enabled():
+                    queue_for_digest(order, notification)
+                refresh_customer_summaries([order])
+                # Last, as it locks the event sequence until commit
+                record_created([order], actor='customer')
+        except Exception:
+            # The screenshot files are not rolled back with the rows
+            if stored_screenshot is not None:
+                delete_screenshot_files(stored_screenshot)
+            raise
         
         print(f"[SUCCESS] New order created: {order_id} (Payment: {order.payment_status})")
         
-        # Send email to admin (async in background)
-        try:
-            send_order_email({
-                'customerInfo': customer_info,
-                'items': data['items'],
-                'totalAmount': str(data['totalAmount']),
-                'orderDate': str(order.order_date),
-                'paymentStatus': order.payment_status,
-                'paymentScreenshot': data.get('paymentScreenshot', '')
-            }, order_id)
-        except Exception as email_error:
-            print(f"Email sending failed: {email_error}")
+        # Send email to admin, unless it goes out with the next digest
+        if not is_digest_enabled():
+            try:
+                send_order_email({
+                    **notification,
+                    'items': [line_item.as_dict() for line_item in line_items],
+                    'orderDate': str(order.order_date),
+                    'paymentStatus': order.payment_status
+                }, order_id)
+            except Exception as email_error:
+                print(f"Email sending failed: {email_error}")
         
         # Return response
         return Response({
@@ -102,7 +272,8 @@ def create_order(request):
                 'totalAmount': float(order.total_amount),
                 'paymentStatus': order.payment_status,
                 'orderDate': order.order_date,
-                'status': order.status
+                'status': order.status,
+                'deliveryZone': zone.name if zone else None
             }
         }, status=status.HTTP_201_CREATED)
         
@@ -115,18 +286,129 @@ def create_order(request):
 
 
 @api_view(['GET'])
+def get_catalog(request):
+    """Products, flavors and prices currently on the menu"""
+    try:
+        menu = catalog.get()
+        return Response({
+            'success': True,
+            'version': catalog.version,
+            'products': menu.products
+        })
+    except Exception as e:
+        print(f"[ERROR] Error fetching catalog: {e}")
+        return Response({
+            'error': 'Failed to fetch catalog',
+            'message': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def catalog_menu(request):
+    """
+    Menu JSON for the storefront
+
+    The document is serialized and compressed once per catalog version, so a
+    request only picks the encoding and compares ETags.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    document = catalog.get().document
+    headers = {
+        'ETag': document.etag,
+        'Cache-Control': (
+            f"public, max-age={settings.CATALOG_MENU_MAX_AGE}, "
+            f"stale-while-revalidate={settings.CATALOG_MENU_STALE_SECONDS}"
+        ),
+        'Vary': 'Accept-Encoding',
+    }
+
+    if_none_match = request.headers.get('If-None-Match', '')
+    if document.etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+        response = HttpResponse(status=304)
+    else:
+        encoding = choose_encoding(request.headers.get('Accept-Encoding', ''), document.encodings)
+        response = HttpResponse(document.encodings[encoding], content_type='application/json; charset=utf-8')
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+
+def order_screenshot(request, order_id):
+    """
+    Payment screenshot (or ?size=thumb for its thumbnail) of an order - admin only
+
+    The stored files never change, so browsers may keep them for a day and
+    revalidate with the ETag afterwards.
+    """
+    if not request.session.get('is_admin'):
+        return JsonResponse({'success': False, 'message': 'Unauthorized'}, status=401)
+
+    try:
+        order = find_order(order_id)
+    except Order.DoesNotExist:
+        return JsonResponse({'success': False, 'message': 'Order not found'}, status=404)
+
+    screenshot = get_order_screenshot(order)
+    if screenshot is None:
+        return JsonResponse({'success': False, 'message': 'Order has no payment screenshot'}, status=404)
+
+    size = request.GET.get('size', 'full')
+    etag = f'"{screenshot.original_sha256[:32]}-{size}"'
+    if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponse(status=304)
+    else:
+        field = screenshot.thumbnail if size == 'thumb' else screenshot.image
+        response = FileResponse(field.open('rb'), content_type='image/jpeg')
+    response['ETag'] = etag
+    # private: payment proofs must never be stored by shared caches
+    response['Cache-Control'] = 'private, max-age=86400'
+    return response
+
+
+def order_invoice(request, order_id):
+    """
+    Invoice PDF of a delivered order - admin only
+
+    Served from disk when stored (gzipped ones are decompressed),
+    otherwise regenerated, as prune_invoices removes old ones.
+    """
+    if not request.session.get('is_admin'):
+        return JsonResponse({'success': False, 'message': 'Unauthorized'}, status=401)
+
+    try:
+        order = find_order(order_id)
+    except Order.DoesNotExist:
+        return JsonResponse({'success': False, 'message': 'Order not found'}, status=404)
+    if order.status != 'delivered':
+        return JsonResponse({'success': False, 'message': 'Invoices are issued for delivered orders only'}, status=404)
+
+    invoice = open_invoice(order.order_id)
+    if invoice is None:
+        if not generate_invoice_pdf(order):
+            return JsonResponse({'success': False, 'message': 'Failed to generate invoice'}, status=500)
+        invoice = open_invoice(order.order_id)
+    return FileResponse(invoice, content_type='application/pdf', filename=invoice_filename(order.order_id))
+
+
+@api_view(['GET'])
+@read_from_replica
 def list_orders(request):
     """List all orders (for admin)"""
     try:
-        orders = Order.objects.all()
-        serializer = OrderSerializer(orders, many=True)
+        orders = OrderRowSerializer(Order.objects.all(), many=True).data
         
         return Response({
             'success': True,
-            'count': orders.count(),
-            'orders': serializer.data
+            'count': len(orders),
+            'orders': orders
         })
     except Exception as e:
+        if replica_failed(e):
+            raise
         print(f"❌ Error fetching orders: {e}")
         return Response({
             'error': 'Failed to fetch orders',
@@ -135,15 +417,15 @@ def list_orders(request):
 
 
 @api_view(['GET'])
+@read_from_replica
 def get_order(request, order_id):
-    """Get specific order by order_id"""
+    """Get specific order by order_id, including archived orders"""
     try:
-        order = Order.objects.get(order_id=order_id)
-        serializer = OrderSerializer(order)
+        row = find_order_row(order_id, OrderRowSerializer.fields)
         
         return Response({
             'success': True,
-            'order': serializer.data
+            'order': OrderRowSerializer(row).data
         })
     except Order.DoesNotExist:
         return Response({
@@ -151,6 +433,8 @@ def get_order(request, order_id):
             'message': f'No order found with ID: {order_id}'
         }, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
+        if replica_failed(e):
+            raise
         print(f"❌ Error fetching order: {e}")
         return Response({
             'error': 'Failed to fetch order',
@@ -158,6 +442,197 @@ def get_order(request, order_id):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def export_orders(request):
+    """
+    Stream orders as CSV or NDJSON (admin only)
+
+    Query parameters: format=csv|ndjson, per=order|item, start/end (YYYY-MM-DD,
+    on created_at), status (comma separated) and archived=0 to skip archived orders.
+    """
+    if not request.session.get('is_admin'):
+        return JsonResponse({
+            'success': False,
+            'message': 'Unauthorized'
+        }, status=401)
+    
+    export_format = request.GET.get('format', 'csv')
+    per = request.GET.get('per', 'order')
+    if export_format not in EXPORT_FORMATS or per not in ('order', 'item'):
+        return JsonResponse({
+            'success': False,
+            'message': 'format must be csv or ndjson and per must be order or item'
+        }, status=400)
+    
+    dates = {}
+    for name in ['start', 'end']:
+        value = request.GET.get(name)
+        try:
+            dates[name] = parse_date(value) if value else None
+        except ValueError:
+            dates[name] = None
+        if value and not dates[name]:
+            return JsonResponse({
+                'success': False,
+                'message': f'{name} must be a date in YYYY-MM-DD format'
+            }, status=400)
+    
+    statuses = [value for value in request.GET.get('status', '').split(',') if value]
+    
+    content = stream_export(
+        export_format,
+        start=dates['start'],
+        end=dates['end'],
+        statuses=statuses,
+        per=per,
+        include_archived=request.GET.get('archived', '1') != '0'
+    )
+    content_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(content, content_type=f'{content_type}; charset=utf-8')
+    filename = f"orders-{timezone.localdate():%Y%m%d}.{export_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@read_from_replica
+def order_events(request):
+    """
+    Change feed of order events (admin session, or the ORDER_FEED_TOKEN bearer token)
+
+    Query parameters: since (last seq already seen, default 0), limit (at most
+    ORDER_EVENT_FEED_LIMIT) and orders=1 to include the current state of the
+    live orders the events refer to. Keep passing the returned 'next' as since
+    until hasMore is false.
+    """
+    token = settings.ORDER_FEED_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    has_token = bool(token) and hmac.compare_digest(authorization, f'Bearer {token}')
+    if not (request.session.get('is_admin') or has_token):
+        return JsonResponse({
+            'success': False,
+            'message': 'Unauthorized'
+        }, status=401)
+    
+    try:
+        since = int(request.GET.get('since', 0))
+        limit = min(int(request.GET.get('limit', settings.ORDER_EVENT_FEED_LIMIT)), settings.ORDER_EVENT_FEED_LIMIT)
+    except ValueError:
+        since = limit = -1
+    if since < 0 or limit < 1:
+        return JsonResponse({
+            'success': False,
+            'message': 'since must be a sequence number and limit a positive number'
+        }, status=400)
+    
+    events, has_more = get_events_since(since, limit)
+    response = {
+        'success': True,
+        'events': events,
+        'next': events[-1]['seq'] if events else since,
+        'hasMore': has_more,
+    }
+    if request.GET.get('orders') == '1':
+        order_ids = {event['order_id'] for event in events}
+        rows = Order.objects.filter(order_id__in=order_ids)
+        response['orders'] = {row['order_id']: row for row in OrderRowSerializer(rows, many=True).data}
+    return JsonResponse(response)
+
+
+@read_from_replica
+def customer_history(request):
+    """
+    Orders of one customer, newest first, with their cached totals (admin only)
+
+    Query parameters: phone or email, limit (at most CUSTOMER_HISTORY_PAGE_SIZE)
+    and cursor, the nextCursor of the previous page.
+    """
+    if not request.session.get('is_admin'):
+        return JsonResponse({
+            'success': False,
+            'message': 'Unauthorized'
+        }, status=401)
+    
+    if request.GET.get('phone'):
+        kind, value = 'phone', normalize_phone(request.GET['phone'])
+    else:
+        kind, value = 'email', request.GET.get('email', '').strip().lower()
+    try:
+        limit = min(int(request.GET.get('limit', settings.CUSTOMER_HISTORY_PAGE_SIZE)), settings.CUSTOMER_HISTORY_PAGE_SIZE)
+    except ValueError:
+        limit = 0
+    if not value or limit < 1:
+        return JsonResponse({
+            'success': False,
+            'message': 'Pass a phone or email, and limit must be a positive number'
+        }, status=400)
+    
+    try:
+        rows, next_cursor = get_customer_history(kind, value, OrderRowSerializer.fields, limit, request.GET.get('cursor'))
+    except InvalidCursor as e:
+        return JsonResponse({
+            'success': False,
+            'message': str(e)
+        }, status=400)
+    
+    serializer = OrderRowSerializer(None)
+    tz = timezone.get_current_timezone()
+    return JsonResponse({
+        'success': True,
+        'customer': {'kind': kind, 'value': value},
+        'summary': get_customer_summary(kind, value),
+        'orders': [serializer.to_representation(row, tz) for row in rows],
+        'nextCursor': next_cursor,
+    })
+
+
+@read_from_replica
+def sales_analytics(request):
+    """
+    Sales analytics from the rollup tables (admin only)
+
+    Query parameters: period=hour|day|week (default day) and start/end
+    (YYYY-MM-DD, default the last 30 days).
+    """
+    if not request.session.get('is_admin'):
+        return JsonResponse({
+            'success': False,
+            'message': 'Unauthorized'
+        }, status=401)
+    
+    period = request.GET.get('period', 'day')
+    if period not in ('hour', 'day', 'week'):
+        return JsonResponse({
+            'success': False,
+            'message': 'period must be hour, day or week'
+        }, status=400)
+    
+    today = timezone.localdate()
+    dates = {}
+    for name, default in [('start', today - timedelta(days=29)), ('end', today)]:
+        value = request.GET.get(name)
+        try:
+            dates[name] = parse_date(value) if value else default
+        except ValueError:
+            dates[name] = None
+        if not dates[name]:
+            return JsonResponse({
+                'success': False,
+                'message': f'{name} must be a date in YYYY-MM-DD format'
+            }, status=400)
+    start, end = dates['start'], dates['end']
+    
+    return JsonResponse({
+        'success': True,
+        'period': period,
+        'start': start,
+        'end': end,
+        'summary': get_summary(start, end),
+        'timeseries': get_sales_timeseries(period, start, end),
+        'topProducts': get_top_products(start, end, 'product'),
+        'topFlavors': get_top_products(start, end, 'flavor'),
+        'pincodes': get_revenue_by_pincode(start, end),
+    })
+
+
 # Admin Authentication Views
 def admin_login_view(request):
     """Admin login page"""
@@ -209,6 +684,7 @@ def admin_logout_view(request):
     return redirect('admin_login')
 
 
+@read_from_replica
 def admin_dashboard_view(request):
     """Admin dashboard - requires authentication"""
     if not request.session.get('is_admin'):
@@ -239,38 +715,82 @@ def admin_dashboard_view(request):
     return render(request, 'admin_dashboard.html', context)
 
 
+@read_from_replica
 def pending_orders_view(request):
     """Pending orders page - requires authentication"""
     if not request.session.get('is_admin'):
         return redirect('admin_login')
     
     # Get all pending orders
-    pending_orders = Order.objects.filter(status='pending').order_by('-created_at')
+    pending_orders = with_card_fields(Order.objects.filter(status='pending').order_by('-created_at'))
     
     context = {
         'admin_username': request.session.get('admin_username', 'Admin'),
         'pending_orders': pending_orders,
+        'zone_groups': group_orders_by_zone(pending_orders),
+        **get_card_context(),
     }
     
     return render(request, 'pending_orders.html', context)
 
 
+@read_from_replica
 def confirmed_orders_view(request):
     """Confirmed orders page - requires authentication"""
     if not request.session.get('is_admin'):
         return redirect('admin_login')
     
     # Get all confirmed orders
-    confirmed_orders = Order.objects.filter(status='confirmed').order_by('-created_at')
+    confirmed_orders = with_card_fields(Order.objects.filter(status='confirmed').order_by('-created_at'))
     
     context = {
         'admin_username': request.session.get('admin_username', 'Admin'),
         'confirmed_orders': confirmed_orders,
+        'zone_groups': group_orders_by_zone(confirmed_orders),
+        **get_card_context(),
     }
     
     return render(request, 'confirmed_orders.html', context)
 
 
+def admin_profiles_view(request):
+    """Recent request profiles with their top functions - requires authentication"""
+    if not request.session.get('is_admin'):
+        return redirect('admin_login')
+    
+    context = {
+        'admin_username': request.session.get('admin_username', 'Admin'),
+        'profiles': get_recent_profiles(settings.PROFILE_KEEP),
+        'sample_rate': settings.PROFILE_SAMPLE_RATE,
+    }
+    
+    return render(request, 'admin_profiles.html', context)
+
+
+def download_profile(request, profile_id, kind):
+    """pstats file or tracemalloc snapshot of a stored profile (admin only)"""
+    if not request.session.get('is_admin'):
+        return JsonResponse({'success': False, 'message': 'Unauthorized'}, status=401)
+    
+    if kind not in ('pstats', 'memory'):
+        return JsonResponse({'success': False, 'message': 'kind must be pstats or memory'}, status=400)
+    try:
+        path = get_profile_path(profile_id, kind)
+        profile_file = open(path, 'rb')
+    except (ValueError, FileNotFoundError):
+        return JsonResponse({'success': False, 'message': 'Profile not found'}, status=404)
+    return FileResponse(profile_file, as_attachment=True, filename=profile_id + PROFILE_FILES[kind])
+
+
+# action -> (new status, new payment status or None to keep it, customer email, email name, message)
+ORDER_ACTIONS = {
+    'accept': ('confirmed', 'verified', send_order_acceptance_email, 'acceptance', 'Order accepted successfully'),
+    'reject': ('cancelled', 'failed', send_order_rejection_email, 'rejection', 'Order rejected successfully'),
+    'deliver': ('delivered', None, send_delivery_confirmation_email, 'delivery confirmation', 'Order marked as delivered successfully'),
+    'cancel': ('cancelled', 'failed', send_cancellation_email, 'cancellation', 'Order cancelled successfully'),
+}
+
+
 @csrf_exempt
 def update_order_status(request, order_id):
     """API endpoint to accept/reject/deliver/cancel orders"""
@@ -283,109 +803,55 @@ def update_order_status(request, order_id):
                     'message': 'Unauthorized'
                 }, status=401)
             
-            # Get order
-            try:
-                order = Order.objects.get(order_id=order_id)
-            except Order.DoesNotExist:
-                return JsonResponse({
-                    'success': False,
-                    'message': 'Order not found'
-                }, status=404)
-            
-            # Parse request data
-            data = json.loads(request.body)
-            action = data.get('action')
+            actor = get_admin_actor(request)
             
-            if action == 'accept':
-                # Update order status to confirmed
-                order.status = 'confirmed'
-                order.payment_status = 'verified'
-                order.save()
-                
-                # Send acceptance email
-                try:
-                    send_order_acceptance_email(order)
-                except Exception as email_error:
-                    print(f"[ERROR] Failed to send acceptance email: {email_error}")
-                
-                return JsonResponse({
-                    'success': True,
-                    'message': 'Order accepted successfully',
-                    'order': {
-                        'order_id': order.order_id,
-                        'status': order.status,
-                        'payment_status': order.payment_status
-                    }
-                })
-                
-            elif action == 'reject':
-                # Update order status to cancelled
-                order.status = 'cancelled'
-                order.payment_status = 'failed'
-                order.save()
-                
-                # Send rejection email with refund information
+            # The order stays locked until the change is committed, so concurrent
+            # updates apply one after another and every event records the status
+            # it really changed from
+            with transaction.atomic():
                 try:
-                    send_order_rejection_email(order)
-                except Exception as email_error:
-                    print(f"[ERROR] Failed to send rejection email: {email_error}")
-                
-                return JsonResponse({
-                    'success': True,
-                    'message': 'Order rejected successfully',
-                    'order': {
-                        'order_id': order.order_id,
-                        'status': order.status,
-                        'payment_status': order.payment_status
-                    }
-                })
+                    order = Order.objects.select_for_update().get(order_id=order_id)
+                except Order.DoesNotExist:
+                    return JsonResponse({
+                        'success': False,
+                        'message': 'Order not found'
+                    }, status=404)
                 
-            elif action == 'deliver':
-                # Mark order as delivered
-                order.status = 'delivered'
-                order.save()
+                # Parse request data
+                data = json.loads(request.body)
+                action = data.get('action')
+                if action not in ORDER_ACTIONS:
+                    return JsonResponse({
+                        'success': False,
+                        'message': 'Invalid action'
+                    }, status=400)
+                new_status, new_payment_status, send_email, email_name, message = ORDER_ACTIONS[action]
                 
-                # Send delivery confirmation email
-                try:
-                    send_delivery_confirmation_email(order)
-                except Exception as email_error:
-                    print(f"[ERROR] Failed to send delivery confirmation email: {email_error}")
-                
-                return JsonResponse({
-                    'success': True,
-                    'message': 'Order marked as delivered successfully',
-                    'order': {
-                        'order_id': order.order_id,
-                        'status': order.status
-                    }
-                })
+                # The order is about to change, so its cached cards on the admin pages are stale
+                invalidate_order_cards(order)
                 
-            elif action == 'cancel':
-                # Cancel confirmed order
-                order.status = 'cancelled'
-                order.payment_status = 'failed'
+                previous_status, previous_payment_status = order.status, order.payment_status
+                order.status = new_status
+                if new_payment_status:
+                    order.payment_status = new_payment_status
                 order.save()
-                
-                # Send cancellation email with refund info
-                try:
-                    send_cancellation_email(order)
-                except Exception as email_error:
-                    print(f"[ERROR] Failed to send cancellation email: {email_error}")
-                
-                return JsonResponse({
-                    'success': True,
-                    'message': 'Order cancelled successfully',
-                    'order': {
-                        'order_id': order.order_id,
-                        'status': order.status,
-                        'payment_status': order.payment_status
-                    }
-                })
-            else:
-                return JsonResponse({
-                    'success': False,
-                    'message': 'Invalid action'
-                }, status=400)
+                refresh_customer_summaries([order])
+                record_status_change(order, previous_status, previous_payment_status, actor)
+            
+            # Email the customer once the change is committed
+            try:
+                send_email(order)
+            except Exception as email_error:
+                print(f"[ERROR] Failed to send {email_name} email: {email_error}")
+            
+            changed = {'order_id': order.order_id, 'status': order.status}
+            if new_payment_status:
+                changed['payment_status'] = order.payment_status
+            return JsonResponse({
+                'success': True,
+                'message': message,
+                'order': changed
+            })
                 
         except Exception as e:
             print(f"[ERROR] Error updating order status: {e}")
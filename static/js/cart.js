@@ -143,5 +143,13 @@ document.addEventListener('DOMContentLoaded', function () {
     // Only display cart if we're on the cart page
     if (document.getElementById('cartItemsContainer')) {
         displayCart();
+
+        // Reprice the cart with the latest menu so checkout matches the server's prices
+        loadMenu(true).then(() => {
+            if (applyMenuToCart()) {
+                displayCart();
+                updateCartCount();
+            }
+        });
     }
 });
@@ -0,0 +1,100 @@
+// ========================
+// Menu prices from the server catalog
+// ========================
+// Prices and availability come from /api/catalog/menu.json (cached by the
+// browser and revalidated with its ETag), so a price change does not need a
+// new script bundle. The prices written in the page are only a fallback.
+const MENU_URL = '/api/catalog/menu.json';
+
+// Product modal on the home page -> product name in the catalog
+const MENU_MODALS = {
+    kulfiModal: 'Kulfi',
+    cupModal: 'Cup Ice Cream',
+    gadbadModal: 'Gadbad',
+    dollyModal: 'Dolly',
+    coneModal: 'Cone',
+    scoopModal: 'Scoop Ice Cream',
+    chocbarModal: 'Chocbar',
+    familyModal: 'Family Pack'
+};
+
+// { product: { flavor: { price, available } } }
+let menuPrices = null;
+
+// Unit price of a flavor, or the fallback if the menu is not loaded (or does not know it)
+function menuPrice(product, flavor, fallback) {
+    const entry = menuPrices && menuPrices[product] && menuPrices[product][flavor];
+    return entry ? entry.price : fallback;
+}
+
+// Fetch the menu; revalidate forces an ETag check instead of trusting a cached copy
+function loadMenu(revalidate) {
+    return fetch(MENU_URL, { cache: revalidate ? 'no-cache' : 'default' })
+        .then(response => response.ok ? response.json() : null)
+        .then(menu => {
+            if (!menu) return null;
+            menuPrices = {};
+            menu.products.forEach(product => {
+                menuPrices[product.name] = {};
+                product.flavors.forEach(flavor => {
+                    menuPrices[product.name][flavor.name] = { price: flavor.price, available: flavor.available };
+                });
+            });
+            return menuPrices;
+        })
+        .catch(error => {
+            console.error('Failed to load menu:', error);
+            return null;
+        });
+}
+
+// Show catalog prices in the product modals and hide unavailable flavors
+function applyMenuToPage() {
+    Object.entries(MENU_MODALS).forEach(([modalId, product]) => {
+        const modal = document.getElementById(modalId);
+        if (!modal || !menuPrices || !menuPrices[product]) return;
+
+        const options = Array.from(modal.querySelectorAll('.flavor-option'));
+        options.forEach(option => {
+            const flavor = option.querySelector('.flavor-name').textContent.trim();
+            const entry = menuPrices[product][flavor];
+            option.style.display = entry && entry.available ? '' : 'none';
+            const priceLabel = option.querySelector('.flavor-price');
+            if (entry && priceLabel) {
+                priceLabel.textContent = '₹' + entry.price;
+            }
+        });
+
+        // Re-select so the modal's unit price and total pick up the catalog price
+        let selected = modal.querySelector('.flavor-option.selected');
+        if (!selected || selected.style.display === 'none') {
+            selected = options.find(option => option.style.display !== 'none');
+        }
+        if (selected) selected.click();
+    });
+}
+
+// Bring cart prices in line with the menu, dropping items that are no longer sold
+function applyMenuToCart() {
+    if (!menuPrices) return false;
+    const cart = JSON.parse(localStorage.getItem('anandIceCreamCart') || '[]');
+    let changed = false;
+    const updated = cart.filter(item => {
+        const entry = menuPrices[item.product] && menuPrices[item.product][item.flavor];
+        if (!entry || !entry.available) {
+            changed = true;
+            return false;
+        }
+        const quantity = item.quantity || 1;
+        if (item.unitPrice !== entry.price || item.price !== entry.price * quantity) {
+            item.unitPrice = entry.price;
+            item.price = entry.price * quantity;
+            changed = true;
+        }
+        return true;
+    });
+    if (changed) {
+        localStorage.setItem('anandIceCreamCart', JSON.stringify(updated));
+    }
+    return changed;
+}
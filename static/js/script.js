@@ -48,7 +48,7 @@ setInterval(() => {
 // Product Page Functionality
 let selectedFlavor = 'Badam';
 let quantity = 1;
-const unitPrice = 30;
+let unitPrice = 30;
 let currentPrice = 30;
 
 // Open Kulfi product page
@@ -66,12 +66,14 @@ function closeProductPage() {
 // Select flavor
 function selectFlavor(element, flavor) {
     // Remove selected class from all flavor options
-    document.querySelectorAll('.flavor-option').forEach(opt => {
+    document.querySelectorAll('#kulfiModal .flavor-option').forEach(opt => {
         opt.classList.remove('selected');
     });
     // Add selected class to clicked option
     element.classList.add('selected');
     selectedFlavor = flavor;
+    unitPrice = menuPrice('Kulfi', flavor, 30);
+    updatePrice();
 }
 
 // Increase quantity
@@ -161,6 +163,9 @@ document.addEventListener('DOMContentLoaded', function () {
     // Update cart count on page load
     updateCartCountDisplay();
 
+    // Replace the prices written in the page with the current menu
+    loadMenu(false).then(applyMenuToPage);
+
     // Kulfi card click
     const kulfiCard = document.querySelector('.ice-cream-card:first-child');
     if (kulfiCard) {
@@ -188,7 +193,7 @@ document.addEventListener('DOMContentLoaded', function () {
 // ========================
 let selectedCupFlavor = 'Vanilla';
 let cupQuantity = 1;
-const cupUnitPrice = 10;
+let cupUnitPrice = 10;
 let cupCurrentPrice = 10;
 
 function openCupPage() {
@@ -207,6 +212,8 @@ function selectCupFlavor(element, flavor) {
     });
     element.classList.add('selected');
     selectedCupFlavor = flavor;
+    cupUnitPrice = menuPrice('Cup Ice Cream', flavor, 10);
+    updateCupPrice();
 }
 
 function increaseCupQuantity() {
@@ -286,7 +293,7 @@ function selectGadbadFlavor(element, flavor, price) {
     });
     element.classList.add('selected');
     selectedGadbadFlavor = flavor;
-    gadbadUnitPrice = price;
+    gadbadUnitPrice = menuPrice('Gadbad', flavor, price);
     updateGadbadPrice();
 }
 
@@ -371,7 +378,7 @@ function closeDollyPage() {
 function selectDollyFlavor(el, flavor, price) {
     document.querySelectorAll('#dollyFlavorGrid .flavor-option').forEach(o => o.classList.remove('selected'));
     el.classList.add('selected');
-    selectedDollyFlavor = flavor; dollyUnitPrice = price; updateDollyPrice();
+    selectedDollyFlavor = flavor; dollyUnitPrice = menuPrice('Dolly', flavor, price); updateDollyPrice();
 }
 function increaseDollyQty() {
     const inp = document.getElementById('dollyQuantity');
@@ -417,7 +424,7 @@ function closeConePage() {
 function selectConeFlavor(el, flavor, price) {
     document.querySelectorAll('#coneFlavorGrid .flavor-option').forEach(o => o.classList.remove('selected'));
     el.classList.add('selected');
-    selectedConeFlavor = flavor; coneUnitPrice = price; updateConePrice();
+    selectedConeFlavor = flavor; coneUnitPrice = menuPrice('Cone', flavor, price); updateConePrice();
 }
 function increaseConeQty() {
     const inp = document.getElementById('coneQuantity');
@@ -463,7 +470,7 @@ function closeScoopPage() {
 function selectScoopFlavor(el, flavor, price) {
     document.querySelectorAll('#scoopFlavorGrid .flavor-option').forEach(o => o.classList.remove('selected'));
     el.classList.add('selected');
-    selectedScoopFlavor = flavor; scoopUnitPrice = price; updateScoopPrice();
+    selectedScoopFlavor = flavor; scoopUnitPrice = menuPrice('Scoop Ice Cream', flavor, price); updateScoopPrice();
 }
 function increaseScoopQty() {
     const inp = document.getElementById('scoopQuantity');
@@ -517,7 +524,7 @@ function closeChocbarPage() {
 function selectChocbarSize(el, size, price) {
     document.querySelectorAll('#chocbarFlavorGrid .flavor-option').forEach(o => o.classList.remove('selected'));
     el.classList.add('selected');
-    selectedChocbarSize = size; chocbarUnitPrice = price; updateChocbarPrice();
+    selectedChocbarSize = size; chocbarUnitPrice = menuPrice('Chocbar', size, price); updateChocbarPrice();
 }
 function increaseChocbarQty() {
     const inp = document.getElementById('chocbarQuantity');
@@ -563,7 +570,7 @@ function closeFamilyPage() {
 function selectFamilySize(el, size, price) {
     document.querySelectorAll('#familyFlavorGrid .flavor-option').forEach(o => o.classList.remove('selected'));
     el.classList.add('selected');
-    selectedFamilySize = size; familyUnitPrice = price; updateFamilyPrice();
+    selectedFamilySize = size; familyUnitPrice = menuPrice('Family Pack', size, price); updateFamilyPrice();
 }
 function increaseFamilyQty() {
     const inp = document.getElementById('familyQuantity');